@@ -0,0 +1,154 @@
+"""Актор комнаты: все изменения комнаты идут через её почтовый ящик.
+
+Каждая комната обслуживается своей задачей. Команда - функция ``command(room)``
+(может быть корутиной); ``RoomActor.submit`` ставит её в ящик и возвращает
+результат команды или пробрасывает её исключение вызывающему. Команды
+применяются строго по очереди. Всё, что накопилось в ящике к моменту, когда
+актор освободился, применяется пачкой, и если версия комнаты изменилась,
+``on_commit(room)`` (рассылка состояния) вызывается один раз на пачку.
+
+Ящик ограничен ``mailbox_size``: когда он полон, ``submit`` ждёт места, и
+читатель WebSocket перестаёт принимать новые команды от клиента.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from game import Room
+
+Command = Callable[[Room], Any]
+_Envelope = Tuple[Command, asyncio.Future]
+
+
+class RoomActor:
+    """Задача, последовательно применяющая команды к одной комнате."""
+
+    # Сколько команд может ждать в ящике, прежде чем отправители начнут ждать
+    mailbox_size = 256
+    # Сколько команд применяется до одной общей рассылки
+    max_batch = 64
+
+    def __init__(self, room: Room, on_commit: Callable[[Room], Awaitable[None]]):
+        self.room = room
+        self.on_commit = on_commit
+        self.closed = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._mailbox: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, command: Command) -> Any:
+        """Применить ``command`` в очереди команд комнаты и вернуть её результат."""
+        if self.closed:
+            raise LookupError("room_not_found")
+        loop = asyncio.get_running_loop()
+        self._ensure_running(loop)
+        if self._loop is not loop:
+            # Команда пришла из другого потока со своим циклом событий
+            future = asyncio.run_coroutine_threadsafe(self._post(command), self._loop)
+            return await asyncio.wrap_future(future)
+        return await self._post(command)
+
+    def close(self):
+        """Остановить актора; команды, ещё лежащие в ящике, отклоняются."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._task is None or self._loop.is_closed():
+            return
+        if _running_loop() is self._loop:
+            self._stop()
+        else:
+            self._loop.call_soon_threadsafe(self._stop)
+
+    def _ensure_running(self, loop: asyncio.AbstractEventLoop):
+        if self._task is not None and not self._task.done() and not self._loop.is_closed():
+            return
+        # Первый запуск или цикл событий прежней задачи уже завершился
+        self._loop = loop
+        self._mailbox = asyncio.Queue(self.mailbox_size)
+        self._task = loop.create_task(self._run())
+
+    async def _post(self, command: Command) -> Any:
+        future = self._loop.create_future()
+        await self._mailbox.put((command, future))
+        return await future
+
+    def _stop(self):
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._reject_pending()
+
+    def _reject_pending(self):
+        while not self._mailbox.empty():
+            _, future = self._mailbox.get_nowait()
+            if not future.done():
+                future.set_exception(LookupError("room_not_found"))
+
+    async def _run(self):
+        while not self.closed:
+            batch: List[_Envelope] = [await self._mailbox.get()]
+            while len(batch) < self.max_batch and not self._mailbox.empty():
+                batch.append(self._mailbox.get_nowait())
+            version = self.room.version
+            for command, future in batch:
+                await self._apply(command, future)
+            if self.room.version != version:
+                try:
+                    await self.on_commit(self.room)
+                except Exception as exc:  # сбой рассылки не должен останавливать актора
+                    print(f"[Actor] Commit of room {self.room.id} failed: {exc!r}")
+        self._reject_pending()
+
+    async def _apply(self, command: Command, future: asyncio.Future):
+        if future.cancelled():
+            # Отправитель уже не ждёт результата (например, отключился)
+            return
+        try:
+            result = command(self.room)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as exc:
+            if not future.done():
+                future.set_exception(exc)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+
+class RoomActors:
+    """Акторы комнат по ``room_id``; создаются при первой команде."""
+
+    def __init__(self, on_commit: Callable[[Room], Awaitable[None]]):
+        self.on_commit = on_commit
+        self._actors: Dict[str, RoomActor] = {}
+
+    def __len__(self) -> int:
+        return len(self._actors)
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._actors
+
+    def get(self, room: Room) -> RoomActor:
+        actor = self._actors.get(room.id)
+        if actor is None or actor.room is not room:
+            if actor is not None:
+                actor.close()
+            actor = self._actors[room.id] = RoomActor(room, self.on_commit)
+        return actor
+
+    async def submit(self, room: Room, command: Command) -> Any:
+        return await self.get(room).submit(command)
+
+    def discard(self, room_id: str):
+        actor = self._actors.pop(room_id, None)
+        if actor is not None:
+            actor.close()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
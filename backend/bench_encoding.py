@@ -0,0 +1,75 @@
+"""Замер кодирования состояния партии на четырёх игроков.
+
+Запуск из каталога backend::
+
+    python bench_encoding.py [--number 2000]
+
+Сравнивает stdlib ``json.dumps`` (так кодировали ``WebSocket.send_json`` и
+``JSONResponse``) с быстрым кодировщиком из ``encoding.py`` на одном и том же
+словаре состояния, а также полный путь "собрать GameState + закодировать".
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+
+from encoding import ENCODER, dumps, msgpack, pack
+from game import Room, VARIANTS
+from models import Player, TableConfig
+
+PLAYER_IDS = ("p1", "p2", "p3", "p4")
+
+
+def _stdlib_dumps(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def make_room() -> Room:
+    """Партия на четверых с первым ходом на столе."""
+    room = Room("bench", "Бенчмарк", VARIANTS["with_draw"], TableConfig(max_players=4))
+    for pid in PLAYER_IDS:
+        room.add_player(Player(id=pid, name=f"Игрок {pid}", avatar_url=f"https://t.me/i/{pid}.jpg"))
+    room.start()
+    leader = room.current_player_id()
+    room.play_cards(leader, [room._hand_cards(leader)[0]])
+    return room
+
+
+def _per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    room = make_room()
+    viewer = PLAYER_IDS[0]
+    payload = room.state_payload(viewer)
+    assert json.loads(dumps(payload)) == json.loads(_stdlib_dumps(payload))
+
+    size = len(dumps(payload).encode())
+    rows = [
+        ("json.dumps(dict)", lambda: _stdlib_dumps(payload)),
+        (f"{ENCODER} dumps(dict)", lambda: dumps(payload)),
+        ("to_state + model_dump + json.dumps", lambda: _stdlib_dumps(room.to_state(viewer).model_dump(by_alias=True))),
+        ("to_state + model_dump_json", lambda: room.to_state(viewer).model_dump_json(by_alias=True)),
+        (f"state_payload + {ENCODER} dumps", lambda: dumps(room.state_payload(viewer))),
+    ]
+    print(f"GameState for 4 players, {size} bytes, encoder: {ENCODER}")
+    compact = room.state_payload(viewer, "compact")
+    if msgpack is not None:
+        rows.append(("msgpack pack(compact dict)", lambda: pack(compact)))
+        print(f"compact state: {len(dumps(compact).encode())} bytes JSON, {len(pack(compact))} bytes MessagePack")
+    baseline = None
+    for title, func in rows:
+        us = _per_call_us(func, args.number)
+        if baseline is None:
+            baseline = us
+        print(f"  {title:<40} {us:8.1f} us/msg  x{baseline / us:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
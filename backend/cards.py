@@ -0,0 +1,169 @@
+"""Compact integer encoding of the 36-card Bura deck.
+
+Every card is a small int ``suit_index * 9 + strength`` where ``strength`` is
+the position of the rank in ``RANK_ORDER``. Inside a suit a higher index is
+therefore always a stronger card. Sets of cards (hands, taken piles) are kept
+as 36-bit integer masks, so membership, removal and counting are single
+integer operations instead of scans over pydantic models.
+
+The masks double as the per-hand indexes: suit and rank counts are
+``mask_count(mask & SUIT_MASKS[i])`` / ``mask_count(mask & RANK_MASKS[r])``
+and pile points are ``mask_points`` (four table lookups). They cost the same
+for any pile size and always agree with the hand, so no separate counters
+are kept next to the masks.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SUITS: Tuple[str, ...] = ("♠", "♥", "♦", "♣")
+RANKS: Tuple[int, ...] = (6, 7, 8, 9, 10, 11, 12, 13, 14)
+
+# Order from weakest to strongest following the game rules where the ten is
+# second only to the ace and trumps beat other suits.
+RANK_ORDER: Tuple[int, ...] = (6, 7, 8, 9, 11, 12, 13, 10, 14)
+RANK_STRENGTH: Dict[int, int] = {rank: idx for idx, rank in enumerate(RANK_ORDER)}
+
+CARD_POINTS: Dict[int, int] = {
+    14: 11,  # Ace
+    10: 10,
+    13: 4,   # King
+    12: 3,   # Queen
+    11: 2,   # Jack
+}
+
+SUIT_SIZE = len(RANK_ORDER)
+DECK_SIZE = len(SUITS) * SUIT_SIZE
+FULL_MASK = (1 << DECK_SIZE) - 1
+SUIT_INDEX: Dict[str, int] = {suit: idx for idx, suit in enumerate(SUITS)}
+
+CARD_SUIT: Tuple[str, ...] = tuple(suit for suit in SUITS for _ in RANK_ORDER)
+CARD_SUIT_INDEX: Tuple[int, ...] = tuple(idx // SUIT_SIZE for idx in range(DECK_SIZE))
+CARD_RANK: Tuple[int, ...] = tuple(rank for _ in SUITS for rank in RANK_ORDER)
+CARD_VALUE: Tuple[int, ...] = tuple(CARD_POINTS.get(rank, 0) for rank in CARD_RANK)
+
+SUIT_MASKS: Tuple[int, ...] = tuple(
+    ((1 << SUIT_SIZE) - 1) << (idx * SUIT_SIZE) for idx in range(len(SUITS))
+)
+RANK_MASKS: Dict[int, int] = {
+    rank: sum(1 << (suit_idx * SUIT_SIZE + strength) for suit_idx in range(len(SUITS)))
+    for strength, rank in enumerate(RANK_ORDER)
+}
+
+# Points of every possible 9-bit suit pattern, so a whole pile is scored with
+# four table lookups.
+_SUIT_PATTERN_POINTS: Tuple[int, ...] = tuple(
+    sum(CARD_VALUE[bit] for bit in range(SUIT_SIZE) if pattern >> bit & 1)
+    for pattern in range(1 << SUIT_SIZE)
+)
+_SUIT_PATTERN = (1 << SUIT_SIZE) - 1
+
+_CARD_BY_SUIT_RANK: Dict[Tuple[str, int], int] = {
+    (CARD_SUIT[idx], CARD_RANK[idx]): idx for idx in range(DECK_SIZE)
+}
+
+
+def card_index(suit: str, rank: int) -> int:
+    try:
+        return _CARD_BY_SUIT_RANK[(suit, rank)]
+    except KeyError:
+        raise ValueError("Unknown card") from None
+
+
+def mask_of(indexes: Iterable[int]) -> int:
+    mask = 0
+    for idx in indexes:
+        mask |= 1 << idx
+    return mask
+
+
+def iter_mask(mask: int) -> Iterator[int]:
+    """Yield card indexes present in ``mask`` in ascending order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_cards(mask: int) -> List[int]:
+    return list(iter_mask(mask))
+
+
+def mask_count(mask: int) -> int:
+    return mask.bit_count()
+
+
+def mask_points(mask: int) -> int:
+    return (
+        _SUIT_PATTERN_POINTS[mask & _SUIT_PATTERN]
+        + _SUIT_PATTERN_POINTS[(mask >> SUIT_SIZE) & _SUIT_PATTERN]
+        + _SUIT_PATTERN_POINTS[(mask >> (2 * SUIT_SIZE)) & _SUIT_PATTERN]
+        + _SUIT_PATTERN_POINTS[(mask >> (3 * SUIT_SIZE)) & _SUIT_PATTERN]
+    )
+
+
+def lowest_cards(mask: int, count: int) -> int:
+    """Return a mask with the ``count`` lowest-indexed cards of ``mask``."""
+    picked = 0
+    while mask and count:
+        low = mask & -mask
+        picked |= low
+        mask ^= low
+        count -= 1
+    return picked
+
+
+# Index used in the per-trump tables when the round has no trump suit.
+NO_TRUMP = len(SUITS)
+
+
+def _build_beaters(trump_index: int) -> Tuple[int, ...]:
+    """For every card, the mask of cards that beat it under ``trump_index``."""
+    rows: List[int] = []
+    for target in range(DECK_SIZE):
+        target_suit = CARD_SUIT_INDEX[target]
+        # Stronger cards of the same suit sit above the target inside its suit block.
+        beaters = SUIT_MASKS[target_suit] & ~((1 << (target + 1)) - 1)
+        if trump_index != NO_TRUMP and target_suit != trump_index:
+            beaters |= SUIT_MASKS[trump_index]
+        rows.append(beaters)
+    return tuple(rows)
+
+
+BEATERS: Tuple[Tuple[int, ...], ...] = tuple(_build_beaters(idx) for idx in range(len(SUITS) + 1))
+
+
+def trump_index(trump: Optional[str]) -> int:
+    return SUIT_INDEX.get(trump, NO_TRUMP) if trump else NO_TRUMP
+
+
+def max_beat_count(challenger: Iterable[int], owner_cards: Sequence[int], trump: int = NO_TRUMP) -> int:
+    """Size of the maximum matching of challenger cards onto owner cards they beat.
+
+    Uses augmenting paths (Kuhn's algorithm) over the precomputed ``BEATERS``
+    table, so the cost is polynomial in the throw size instead of trying every
+    assignment.
+    """
+    beaters = BEATERS[trump]
+    available = mask_of(challenger)
+    options = [beaters[card] & available for card in owner_cards]
+    matched_to: Dict[int, int] = {}
+
+    def augment(owner_pos: int, seen: List[int]) -> bool:
+        candidates = options[owner_pos] & ~seen[0]
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            seen[0] |= low
+            card = low.bit_length() - 1
+            other = matched_to.get(card)
+            if other is None or augment(other, seen):
+                matched_to[card] = owner_pos
+                return True
+        return False
+
+    count = 0
+    for owner_pos, option in enumerate(options):
+        if option and augment(owner_pos, [0]):
+            count += 1
+    return count
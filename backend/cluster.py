@@ -0,0 +1,248 @@
+"""Узлы за балансировщиком без липких сессий.
+
+Каждой комнатой владеет узел, который её создал: только он применяет к ней
+команды (через актора, см. actor.py) и таймеры. ``Cluster`` связывает узлы
+через общий ``RoomStore`` (см. store.py):
+
+* после каждой пачки команд владелец пишет снимок комнаты с версией в
+  хранилище и публикует событие ``room`` (версия, запись лобби, отключённые
+  игроки); удаление комнаты - событие ``room_removed``;
+* узел, к которому подключён игрок чужой комнаты, держит её реплику
+  (``Room.restore`` из снимка) и обновляет её по событиям, а команды
+  игрока пересылает владельцу (``forward``) и ждёт ответа;
+* события комнаты (``room_event``) доходят до сокетов на всех узлах;
+* long-poll состояния чужой комнаты ждёт события ``room`` от владельца
+  (``wait_for_change``), а не изменения реплики;
+* лобби каждого узла показывает и чужие комнаты (``remote_entries``).
+
+С хранилищем по умолчанию (``MemoryStore``) кластер выключен и не делает
+ничего.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from game import Room
+from store import RoomStore
+
+# Исключения, которые передаются между узлами как есть
+_REMOTE_ERRORS = {"ValueError": ValueError, "LookupError": LookupError, "KeyError": KeyError}
+
+
+class Cluster:
+    # Сколько секунд ждать ответа владельца на пересланную команду
+    reply_timeout = 10.0
+
+    def __init__(
+        self,
+        store: RoomStore,
+        node_id: Optional[str] = None,
+        *,
+        on_room_changed: Callable[[str], Awaitable[None]],
+        on_room_event: Callable[[str, dict], Awaitable[None]],
+        on_command: Callable[[str, dict], Awaitable[Any]],
+    ):
+        self.store = store
+        self.node_id = node_id or os.getenv("BURA_NODE_ID") or uuid.uuid4().hex[:12]
+        self.enabled = store.shared
+        self.on_room_changed = on_room_changed
+        self.on_room_event = on_room_event
+        self.on_command = on_command
+        # Комнаты других узлов: room_id -> {"node", "version", "entry", "disconnected"}
+        self.remote: Dict[str, dict] = {}
+        # Реплики чужих комнат, к которым подключены игроки этого узла
+        self.replicas: Dict[str, Room] = {}
+        # Ожидающие изменения чужих комнат (long-poll): room_id -> событие
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tokens = itertools.count()
+        self._commands: Set[asyncio.Task] = set()
+
+    # ------------------------------------------------------------------
+    # Владелец
+    # ------------------------------------------------------------------
+    async def start(self):
+        if not self.enabled:
+            return
+        await self.store.subscribe(self._on_event)
+        # Комнаты, созданные другими узлами до нашего старта
+        for room_id in await self.store.room_ids():
+            stored = await self.store.load_room(room_id)
+            if stored is not None and stored[1]["node"] != self.node_id:
+                version, data = stored
+                self.remote[room_id] = self._remote_info(data["node"], version, data)
+
+    async def room_committed(self, room: Room, disconnected: Iterable[str]):
+        """Записать новую версию комнаты и оповестить остальные узлы."""
+        if not self.enabled:
+            return
+        disconnected = sorted(disconnected)
+        await self.store.save_room(
+            room.id,
+            room.version,
+            {"node": self.node_id, "room": room.snapshot(), "disconnected": disconnected},
+        )
+        await self.store.publish(
+            {
+                "type": "room",
+                "node": self.node_id,
+                "room_id": room.id,
+                "version": room.version,
+                "entry": room.lobby_entry(),
+                "disconnected": disconnected,
+            }
+        )
+
+    async def room_removed(self, room_id: str):
+        if not self.enabled:
+            return
+        await self.store.delete_room(room_id)
+        await self.store.publish({"type": "room_removed", "node": self.node_id, "room_id": room_id})
+
+    async def publish_room_event(self, room_id: str, message: dict):
+        if self.enabled:
+            await self.store.publish(
+                {"type": "room_event", "node": self.node_id, "room_id": room_id, "message": message}
+            )
+
+    # ------------------------------------------------------------------
+    # Чужие комнаты
+    # ------------------------------------------------------------------
+    def owner_of(self, room_id: str) -> Optional[str]:
+        info = self.remote.get(room_id)
+        return info["node"] if info is not None else None
+
+    def remote_entries(self) -> List[dict]:
+        return [info["entry"] for info in self.remote.values()]
+
+    def disconnected_of(self, room_id: str) -> Dict[str, float]:
+        info = self.remote.get(room_id)
+        return dict.fromkeys(info["disconnected"], 0.0) if info is not None else {}
+
+    async def replica(self, room_id: str) -> Optional[Room]:
+        """Реплика чужой комнаты на последней известной версии (или ``None``)."""
+        if not self.enabled:
+            return None
+        info = self.remote.get(room_id)
+        replica = self.replicas.get(room_id)
+        if replica is not None and info is not None and replica.version >= info["version"]:
+            return replica
+        stored = await self.store.load_room(room_id)
+        if stored is None or stored[1]["node"] == self.node_id:
+            return None
+        version, data = stored
+        self.remote[room_id] = self._remote_info(data["node"], version, data)
+        replica = self.replicas[room_id] = Room.restore(data["room"])
+        return replica
+
+    async def wait_for_change(self, room_id: str, since: int, timeout: float) -> bool:
+        """Ждать, пока владелец опубликует версию чужой комнаты больше ``since``.
+
+        Реплики никто не трогает (``Room.touch``), поэтому ожидание идёт по
+        событиям ``room``/``room_removed``; удаление комнаты тоже будит.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while True:
+            info = self.remote.get(room_id)
+            if info is None or info["version"] > since:
+                return True
+            remaining = end - loop.time()
+            if remaining <= 0:
+                return False
+            event = self._changed.get(room_id)
+            if event is None:
+                event = self._changed[room_id] = asyncio.Event()
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify_changed(self, room_id: str):
+        event = self._changed.pop(room_id, None)
+        if event is not None:
+            event.set()
+
+    def drop_replica(self, room_id: str):
+        self.replicas.pop(room_id, None)
+
+    async def forward(self, room_id: str, command: dict) -> Any:
+        """Выполнить команду у владельца комнаты и вернуть её результат."""
+        owner = self.owner_of(room_id)
+        if owner is None:
+            raise LookupError("room_not_found")
+        token = f"{self.node_id}:{next(self._tokens)}"
+        future = self._pending[token] = asyncio.get_running_loop().create_future()
+        try:
+            await self.store.publish(
+                {
+                    "type": "command",
+                    "node": self.node_id,
+                    "to": owner,
+                    "token": token,
+                    "room_id": room_id,
+                    "command": command,
+                }
+            )
+            return await asyncio.wait_for(future, self.reply_timeout)
+        except asyncio.TimeoutError:
+            raise LookupError("room_owner_unavailable") from None
+        finally:
+            self._pending.pop(token, None)
+
+    # ------------------------------------------------------------------
+    # События
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _remote_info(node: str, version: int, data: dict) -> dict:
+        entry = Room.restore(data["room"]).lobby_entry()
+        return {"node": node, "version": version, "entry": entry, "disconnected": data["disconnected"]}
+
+    async def _on_event(self, event: dict):
+        kind = event.get("type")
+        if event.get("node") == self.node_id:
+            return
+        room_id = event.get("room_id")
+        if kind == "room":
+            self.remote[room_id] = {
+                "node": event["node"],
+                "version": event["version"],
+                "entry": event["entry"],
+                "disconnected": event["disconnected"],
+            }
+            self._notify_changed(room_id)
+            await self.on_room_changed(room_id)
+        elif kind == "room_removed":
+            self.remote.pop(room_id, None)
+            self.replicas.pop(room_id, None)
+            self._notify_changed(room_id)
+            await self.on_room_changed(room_id)
+        elif kind == "room_event":
+            await self.on_room_event(room_id, event["message"])
+        elif kind == "command" and event.get("to") == self.node_id:
+            # Команда выполняется отдельной задачей, чтобы не держать приём событий
+            task = asyncio.ensure_future(self._run_command(event))
+            self._commands.add(task)
+            task.add_done_callback(self._commands.discard)
+        elif kind == "reply" and event.get("to") == self.node_id:
+            future = self._pending.get(event["token"])
+            if future is None or future.done():
+                return
+            if "error" in event:
+                error = _REMOTE_ERRORS.get(event["error"], RuntimeError)
+                future.set_exception(error(event["message"]))
+            else:
+                future.set_result(event.get("result"))
+
+    async def _run_command(self, event: dict):
+        reply = {"type": "reply", "node": self.node_id, "to": event["node"], "token": event["token"]}
+        try:
+            reply["result"] = await self.on_command(event["room_id"], event["command"])
+        except Exception as exc:
+            reply["error"] = type(exc).__name__
+            reply["message"] = exc.args[0] if exc.args else ""
+        await self.store.publish(reply)
@@ -0,0 +1,108 @@
+"""Разбор игровых сообщений WebSocket в типизированные команды.
+
+Каждый тип сообщения (``play``/``play_cards``, ``declare``,
+``request_early_turn``) разбирается своим декодером из ``_DECODERS``:
+сначала проверяются типы и размеры полей, и только потом строится команда
+(``NamedTuple``), поэтому испорченное сообщение отклоняется ``ValueError``
+до всякой работы с комнатой. Карты сразу переводятся в номера движка через
+``game.resolve_card`` (id из каталога или suit/rank), без моделей pydantic.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Union
+
+from game import resolve_card
+
+# Больше четырёх карт за ход не кладут (см. Room.play_cards)
+MAX_CARDS = 4
+
+
+class PlayCards(NamedTuple):
+    player_id: str
+    cards: Tuple[int, ...]
+    round_id: Optional[str] = None
+    trick_index: Optional[int] = None
+
+
+class Declare(NamedTuple):
+    player_id: str
+    combo: str
+
+
+class RequestEarlyTurn(NamedTuple):
+    player_id: str
+    cards: Tuple[int, ...]
+    round_id: Optional[str] = None
+
+
+Command = Union[PlayCards, Declare, RequestEarlyTurn]
+
+
+def _player_id(data: dict) -> str:
+    player_id = data.get("player_id")
+    if not isinstance(player_id, str) or not player_id:
+        raise ValueError("Missing player_id")
+    return player_id
+
+
+def _round_id(data: dict) -> Optional[str]:
+    round_id = data.get("roundId")
+    if round_id is not None and not isinstance(round_id, str):
+        raise ValueError("Invalid roundId")
+    return round_id
+
+
+def _cards(cards: Any) -> Tuple[int, ...]:
+    if not isinstance(cards, list) or not cards:
+        raise ValueError("Must play one or more cards")
+    if len(cards) > MAX_CARDS:
+        raise ValueError("Too many cards")
+    return tuple(resolve_card(card) for card in cards)
+
+
+def _play(data: dict) -> PlayCards:
+    player_id = _player_id(data)
+    cards = data.get("cards")
+    if cards is None and data.get("card") is not None:
+        cards = [data["card"]]
+    round_id = _round_id(data)
+    trick_index = data.get("trickIndex")
+    if trick_index is not None and (not isinstance(trick_index, int) or isinstance(trick_index, bool)):
+        raise ValueError("Invalid trickIndex")
+    return PlayCards(player_id, _cards(cards), round_id, trick_index)
+
+
+def _declare(data: dict) -> Declare:
+    player_id = _player_id(data)
+    combo = data.get("combo")
+    if not isinstance(combo, str):
+        raise ValueError("Unknown combination")
+    return Declare(player_id, combo)
+
+
+def _early_turn(data: dict) -> RequestEarlyTurn:
+    player_id = _player_id(data)
+    cards = data.get("cards")
+    if not isinstance(cards, list) or len(cards) != 4:
+        raise ValueError("Нужно выбрать ровно 4 карты")
+    return RequestEarlyTurn(player_id, _cards(cards), _round_id(data))
+
+
+_DECODERS: Dict[str, Callable[[dict], Command]] = {
+    "play": _play,
+    "play_cards": _play,
+    "declare": _declare,
+    "request_early_turn": _early_turn,
+}
+COMMAND_TYPES = frozenset(_DECODERS)
+
+
+def decode_command(data: Any) -> Optional[Command]:
+    """Команда из игрового сообщения; ``None`` - сообщение не игровое."""
+    if not isinstance(data, dict):
+        raise ValueError("Message must be an object")
+    kind = data.get("type")
+    if not isinstance(kind, str):
+        raise ValueError("Invalid message type")
+    decoder = _DECODERS.get(kind)
+    return decoder(data) if decoder is not None else None
@@ -0,0 +1,71 @@
+"""Delta-режим рассылки состояния комнаты по WebSocket.
+
+Клиент включает режим параметром ``?mode=delta`` при подключении к
+``/ws/{room_id}``. Сервер нумерует сообщения (``seq``) и присылает:
+
+* ``{"type": "state", "seq": n, "payload": {...}}`` - полный снимок (при
+  подключении, по запросу ``{"type": "resync"}`` или если клиент слишком
+  долго не подтверждает сообщения);
+* ``{"type": "patch", "seq": n, "base": b, "set": {...}, "unset": [...]}`` -
+  изменения верхнего уровня относительно состояния ``b``, которое клиент
+  подтвердил сообщением ``{"type": "ack", "seq": b}``.
+
+Клиент хранит последние состояния по ``seq``; если состояния ``base`` у него
+нет (разрыв последовательности), он отправляет ``resync``.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+
+def state_patch(old: dict, new: dict) -> dict:
+    """Разница двух состояний на уровне полей верхнего уровня."""
+    changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+    removed: List[str] = [key for key in old if key not in new]
+    return {"set": changed, "unset": removed}
+
+
+def apply_patch(state: dict, patch: dict) -> dict:
+    result = {key: value for key, value in state.items() if key not in patch.get("unset", ())}
+    result.update(patch.get("set", {}))
+    return result
+
+
+class DeltaSession:
+    """Состояние delta-потока одного соединения."""
+
+    # Сколько неподтверждённых сообщений держим, прежде чем слать полный снимок
+    max_pending = 16
+
+    def __init__(self):
+        self.seq = 0
+        self.acked_seq: Optional[int] = None
+        self.acked_payload: Optional[dict] = None
+        self.pending: Dict[int, dict] = {}
+        self.force_full = True
+
+    def next_message(self, payload: dict) -> Optional[dict]:
+        """Сообщение для отправки или ``None``, если с базы ничего не изменилось."""
+        if self.force_full or self.acked_payload is None or len(self.pending) >= self.max_pending:
+            self.force_full = False
+            self.seq += 1
+            self.pending = {self.seq: payload}
+            return {"type": "state", "seq": self.seq, "payload": payload}
+
+        patch = state_patch(self.acked_payload, payload)
+        if not patch["set"] and not patch["unset"] and not self.pending:
+            return None
+        self.seq += 1
+        self.pending[self.seq] = payload
+        return {"type": "patch", "seq": self.seq, "base": self.acked_seq, **patch}
+
+    def ack(self, seq: int):
+        payload = self.pending.get(seq)
+        if payload is None:
+            return
+        self.acked_seq = seq
+        self.acked_payload = payload
+        self.pending = {s: p for s, p in self.pending.items() if s > seq}
+
+    def request_full(self):
+        self.force_full = True
@@ -0,0 +1,105 @@
+"""Быстрое кодирование исходящих JSON-сообщений.
+
+Все ответы REST и сообщения WebSocket кодируются здесь, а не через
+``json.dumps`` из стандартной библиотеки (``WebSocket.send_json``,
+``JSONResponse``). Используется ``orjson``, если он установлен, иначе
+``pydantic_core.to_json``, который уже приходит вместе с pydantic. Оба
+кодировщика сразу отдают UTF-8 байты в компактном формате, совпадающем с
+``json.dumps(..., separators=(",", ":"), ensure_ascii=False)``.
+
+Замер выигрыша на состоянии партии из четырёх игроков: ``python bench_encoding.py``.
+
+Для WebSocket есть двоичный вариант: клиент, запросивший подпротокол
+``MSGPACK_SUBPROTOCOL`` в ``Sec-WebSocket-Protocol``, получает и отправляет
+те же сообщения в MessagePack (см. ``pack``/``unpack``).
+"""
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping, Optional
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+try:  # orjson - необязательная зависимость
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+try:  # без msgpack двоичный подпротокол просто не предлагается
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
+
+if orjson is not None:
+    def _encode(data: Any) -> bytes:
+        # Нестроковые ключи приводятся к строкам, как в json.dumps
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    ENCODER = "orjson"
+else:  # pragma: no cover - зависит от окружения
+    _encode = to_json
+    ENCODER = "pydantic-core"
+
+
+def dumps_bytes(data: Any) -> bytes:
+    """Компактный JSON в UTF-8; pydantic-модели кодируются по алиасам."""
+    if isinstance(data, BaseModel):
+        return data.__pydantic_serializer__.to_json(data, by_alias=True)
+    return _encode(data)
+
+
+def dumps(data: Any) -> str:
+    """JSON-строка для ``WebSocket.send_text``.
+
+    Браузерный клиент ожидает текстовые кадры, поэтому байты декодируются
+    обратно в строку (это дешевле самого кодирования в разы).
+    """
+    return dumps_bytes(data).decode()
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse``, кодирующий тело через :func:`dumps_bytes`."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+# ---------- MessagePack ----------
+MSGPACK_SUBPROTOCOL = "bura.msgpack.v1"
+
+
+def negotiate_subprotocol(offered: Iterable[str]) -> Optional[str]:
+    """Выбранный подпротокол из ``Sec-WebSocket-Protocol`` или ``None`` (JSON)."""
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+def pack(data: Any) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    """Входящее сообщение; некорректные данные - ``ValueError``."""
+    try:
+        return msgpack.unpackb(data, raw=False, strict_map_key=True)
+    except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, TypeError) as exc:
+        raise ValueError("Malformed MessagePack message") from exc
+
+
+def pack_map_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x80 | size,))
+    if size < 1 << 16:
+        return b"\xde" + size.to_bytes(2, "big")
+    return b"\xdf" + size.to_bytes(4, "big")
+
+
+def pack_items(data: Mapping[str, Any]) -> bytes:
+    """Пары ключ-значение словаря без заголовка map.
+
+    Позволяет закодировать общую часть состояния один раз и склеивать её с
+    приватной частью каждого игрока (как ``_splice_object`` для JSON).
+    """
+    return b"".join(pack(key) + pack(value) for key, value in data.items())
@@ -0,0 +1,135 @@
+"""Сколько памяти занимает одна комната.
+
+Отчёт строит по ``count`` комнат каждого вида и меряет через ``tracemalloc``
+прирост памяти, который остаётся после их создания, в пересчёте на одну
+комнату:
+
+* ``lobby`` - стол в лобби, два игрока ждут третьего;
+* ``mid_round_4p`` - четыре игрока, идёт раунд, разыграно несколько взяток;
+* ``finished`` - сыгранный до конца матч.
+
+Для каждого вида отдельно показан размер после того, как комнату
+посмотрели все игроки (в комнате лежат кэши сериализованного состояния).
+Запуск: ``python footprint.py [--count N]``; оценка числа столов в
+контейнере считается по ``--budget-mb`` (по умолчанию 512).
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from cards import iter_mask
+from game import Room, VARIANTS
+from models import Player, TableConfig
+
+_room_ids = iter(range(1, 1 << 62))
+
+
+def _new_room(players: int) -> Room:
+    room_id = f"fp{next(_room_ids)}"
+    room = Room(room_id, f"Table {room_id}", VARIANTS["with_draw"], TableConfig(max_players=4))
+    for seat in range(players):
+        room.add_player(Player(id=f"{room_id}-p{seat}", name=f"Player {seat}", avatar_url=None))
+    return room
+
+
+def _play_turn(room: Room):
+    """Один ход: текущий игрок делает первый допустимый ход (см. ``Room.legal_moves``)."""
+    if room.reveal_until_ts is not None:
+        # Показ взятки (или пауза перед раундом) заканчивается сразу
+        room.reveal_until_ts = time.time() - 1
+        room.advance_timers()
+        return
+    player_id = room.current_player_id()
+    _, cards, _ = room.legal_moves(player_id)[0]
+    room.play_cards(player_id, list(iter_mask(cards)))
+
+
+def _started(room: Room) -> Room:
+    room.start()
+    # Результат матча в базу не пишется
+    room.match_id = None
+    return room
+
+
+def lobby_room() -> Room:
+    return _new_room(2)
+
+
+def mid_round_room() -> Room:
+    room = _started(_new_room(4))
+    while room.trick_index < 3:
+        _play_turn(room)
+    return room
+
+
+def finished_room() -> Room:
+    room = _started(_new_room(2))
+    while not room.match_over:
+        _play_turn(room)
+    return room
+
+
+SCENARIOS: Dict[str, Callable[[], Room]] = {
+    "lobby": lobby_room,
+    "mid_round_4p": mid_round_room,
+    "finished": finished_room,
+}
+
+
+def _view(room: Room):
+    for player in room.players:
+        room.state_payload(player.id)
+
+
+def room_footprint(build: Callable[[], Room], count: int = 200, *, viewed: bool = False) -> int:
+    """Средний прирост памяти (байт) на комнату, построенную ``build``."""
+    build()  # прогрев: ленивые кэши модулей не должны попасть в замер
+    gc.collect()
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        rooms: List[Room] = []
+        for _ in range(count):
+            room = build()
+            if viewed:
+                _view(room)
+            rooms.append(room)
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del rooms
+    return grown // count
+
+
+def report(count: int = 200) -> Dict[str, Dict[str, int]]:
+    return {
+        name: {
+            "bytes": room_footprint(build, count),
+            "viewed_bytes": room_footprint(build, count, viewed=True),
+        }
+        for name, build in SCENARIOS.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на одну комнату (tracemalloc)")
+    parser.add_argument("--count", type=int, default=200, help="комнат каждого вида в замере")
+    parser.add_argument("--budget-mb", type=int, default=512, help="память контейнера для оценки числа столов")
+    args = parser.parse_args()
+    budget = args.budget_mb * 1024 * 1024
+    print(f"{'room':<14}{'bytes':>10}{'viewed':>10}{'tables/' + str(args.budget_mb) + 'MB':>16}")
+    for name, sizes in report(args.count).items():
+        print(f"{name:<14}{sizes['bytes']:>10}{sizes['viewed_bytes']:>10}{budget // sizes['viewed_bytes']:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,38 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import itertools
+import json
 import random
 import time
 import uuid
-from collections import Counter
 from dataclasses import dataclass, field
-from typing import Dict, Iterable, List, Optional, Sequence
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 from typing import Literal
 
+from cards import (
+    BEATERS,
+    CARD_SUIT,
+    CARD_SUIT_INDEX,
+    RANK_MASKS,
+    RANK_ORDER,
+    SUIT_INDEX,
+    SUIT_MASKS,
+    SUITS,
+    card_index,
+    iter_mask,
+    lowest_cards,
+    mask_count,
+    mask_of,
+    mask_points,
+    max_beat_count,
+    trump_index,
+)
 from models import (
+    CARD_BACK_IMAGE_URL,
+    CARD_IMAGE_BASE,
     Announcement,
     BoardCard,
     BoardState,
@@ -24,26 +48,10 @@ from models import (
     TrickState,
 )
 
-SUITS = ["♠", "♥", "♦", "♣"]
-RANKS = [6, 7, 8, 9, 10, 11, 12, 13, 14]
 RANK_IMAGE_CODES = {6: "6", 7: "7", 8: "8", 9: "9", 10: "0", 11: "J", 12: "Q", 13: "K", 14: "A"}
 SUIT_IMAGE_CODES = {"♠": "S", "♣": "C", "♦": "D", "♥": "H"}
 
 REVEAL_DELAY_SECONDS = 5
-CARD_BACK_IMAGE_URL = "https://deckofcardsapi.com/static/img/back.png"
-
-CARD_POINTS: Dict[int, int] = {
-    14: 11,  # Ace
-    10: 10,
-    13: 4,   # King
-    12: 3,   # Queen
-    11: 2,   # Jack
-}
-
-# Order from weakest to strongest following the game rules where the ten is
-# second only to the ace and trumps beat other suits.
-RANK_ORDER = [6, 7, 8, 9, 11, 12, 13, 10, 14]
-RANK_STRENGTH: Dict[int, int] = {rank: idx for idx, rank in enumerate(RANK_ORDER)}
 
 COMBINATION_NAMES = {
     "bura": "Бура",
@@ -52,6 +60,9 @@ COMBINATION_NAMES = {
     "four_ends": "4 конца",
 }
 
+# Four-card throws made only of tens and aces need at least one ace.
+_TEN_ACE_MASK = RANK_MASKS[10] | RANK_MASKS[14]
+
 
 def _card_color(suit: str) -> Literal["red", "black"]:
     return "red" if suit in ("♥", "♦") else "black"
@@ -62,13 +73,14 @@ def _card_image_url(suit: str, rank: int) -> Optional[str]:
     rank_code = RANK_IMAGE_CODES.get(rank)
     if not suit_code or not rank_code:
         return None
-    return f"https://deckofcardsapi.com/static/img/{rank_code}{suit_code}.png"
+    return f"{CARD_IMAGE_BASE}/{rank_code}{suit_code}.png"
 
 
 def _make_deck() -> List[Card]:
+    """Build wire models for the whole deck, indexed by engine card number."""
     deck: List[Card] = []
     for suit in SUITS:
-        for rank in RANKS:
+        for rank in RANK_ORDER:
             deck.append(
                 Card(
                     id=f"c_{RANK_IMAGE_CODES[rank].lower()}{SUIT_IMAGE_CODES[suit].lower()}",
@@ -82,23 +94,129 @@ def _make_deck() -> List[Card]:
     return deck
 
 
-@dataclass
+# Общий неизменяемый каталог: 36 моделей создаются один раз при импорте,
+# комнаты ссылаются на них по индексу карты и не копируют.
+CARD_MODELS: Tuple[Card, ...] = tuple(_make_deck())
+CARD_CATALOG: Mapping[str, Card] = MappingProxyType({card.id: card for card in CARD_MODELS})
+# id карты -> номер карты движка; по нему разбираются карты в командах
+CARD_INDEX: Mapping[str, int] = MappingProxyType({card.id: idx for idx, card in enumerate(CARD_MODELS)})
+SORTED_CARD_MODELS: Tuple[Card, ...] = tuple(sorted(CARD_MODELS, key=lambda card: card.id))
+# Готовые словари для сериализации рук; только для чтения.
+CARD_PAYLOADS: Tuple[dict, ...] = tuple(card.model_dump(by_alias=True) for card in CARD_MODELS)
+_UNSHUFFLED_DECK: Tuple[int, ...] = tuple(range(len(CARD_MODELS)))
+
+# Каталог карт отдаётся отдельно (GET /api/cards/catalog); версия меняется
+# только вместе с составом колоды или картинками.
+_CATALOG_BODY = {
+    "backImageUrl": CARD_BACK_IMAGE_URL,
+    "cards": [card.model_dump(by_alias=True) for card in SORTED_CARD_MODELS],
+}
+CARD_CATALOG_VERSION = hashlib.sha1(
+    json.dumps(_CATALOG_BODY, sort_keys=True, ensure_ascii=False).encode("utf-8")
+).hexdigest()[:12]
+CARD_CATALOG_PAYLOAD: dict = {"version": CARD_CATALOG_VERSION, **_CATALOG_BODY}
+# Тот же список карт входит в полное состояние каждой комнаты (поле ``cards``);
+# комнаты ссылаются на него, а не сериализуют колоду заново.
+_CATALOG_CARD_PAYLOADS: List[dict] = _CATALOG_BODY["cards"]
+
+StateFormat = Literal["full", "compact"]
+
+
+def resolve_card(payload: int | str | dict | Card) -> int:
+    """Номер карты движка для карты из команды (без моделей pydantic).
+
+    Карта задаётся номером, id из каталога (компактная форма), словарём с
+    ``id`` или с ``suit``/``rank`` (полная форма клиента) или моделью ``Card``.
+    """
+    if isinstance(payload, str):
+        idx = CARD_INDEX.get(payload)
+    elif isinstance(payload, dict):
+        card_id = payload.get("id")
+        if card_id is not None and not isinstance(card_id, str):
+            raise ValueError("Unknown card")
+        idx = CARD_INDEX.get(card_id)
+        if idx is None:
+            suit, rank = payload.get("suit"), payload.get("rank")
+            if not isinstance(suit, str) or not isinstance(rank, int):
+                raise ValueError("Unknown card")
+            idx = card_index(suit, rank)
+    elif isinstance(payload, Card):
+        idx = card_index(payload.suit, payload.rank)
+    elif isinstance(payload, int) and not isinstance(payload, bool) and 0 <= payload < len(CARD_MODELS):
+        idx = payload
+    else:
+        idx = None
+    if idx is None:
+        raise ValueError("Unknown card")
+    return idx
+
+
+def _card_ids(cards: List[dict]) -> List[str]:
+    return [card["id"] for card in cards]
+
+
+def _public_card_refs(cards: List[dict]) -> List[dict]:
+    return [{"cardId": card["cardId"], "faceUp": card["faceUp"]} for card in cards]
+
+
+def compact_state(payload: dict) -> dict:
+    """Компактная форма сериализованного состояния.
+
+    Карты передаются только по id (описание - в каталоге карт), сам каталог
+    заменяется его версией ``cardsVersion``. Работает и с частью состояния:
+    преобразуются только присутствующие поля.
+    """
+    result = dict(payload)
+    if "cards" in result:
+        del result["cards"]
+        result["cardsVersion"] = CARD_CATALOG_VERSION
+    if result.get("trump_card"):
+        result["trump_card"] = result["trump_card"]["id"]
+    if result.get("hands") is not None:
+        result["hands"] = _card_ids(result["hands"])
+    if "discard_pile" in result:
+        result["discard_pile"] = _card_ids(result["discard_pile"])
+    if "announcements" in result:
+        result["announcements"] = [
+            {**item, "cards": _card_ids(item["cards"])} for item in result["announcements"]
+        ]
+    if "table_cards" in result:
+        result["table_cards"] = _public_card_refs(result["table_cards"])
+    if result.get("trick"):
+        trick = result["trick"]
+        result["trick"] = {
+            **trick,
+            "plays": [{**play, "cards": _public_card_refs(play["cards"])} for play in trick["plays"]],
+        }
+    if result.get("board"):
+        board = result["board"]
+        result["board"] = {
+            **board,
+            "attacker": _public_card_refs(board["attacker"]),
+            "defender": _public_card_refs(board["defender"]),
+        }
+    return result
+
+
+# Внутреннее состояние комнаты хранится в компактных структурах со __slots__
+# (карты - байтовые строки и маски); модели pydantic строятся только для API.
+@dataclass(slots=True)
 class _TrickPlayInternal:
     player_id: str
     seat: int
-    cards: List[Card]
+    cards: bytes
     outcome: Literal["lead", "beat", "partial", "discard"]
     owner: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class _TrickInternal:
     leader_id: str
     leader_seat: int
     required_count: int
     owner_id: str
     owner_seat: int
-    owner_cards: List[Card]
+    owner_cards: bytes
     trick_index: int
     plays: List[_TrickPlayInternal] = field(default_factory=list)
 
@@ -111,7 +229,8 @@ class _TrickInternal:
                 or play.player_id == viewer_id
             )
             public_cards: List[PublicCard] = []
-            for card in play.cards:
+            for idx in play.cards:
+                card = CARD_MODELS[idx]
                 if show_cards:
                     public_cards.append(
                         PublicCard(
@@ -145,26 +264,101 @@ class _TrickInternal:
         )
 
 
+class _Seat:
+    """Игрок за столом; наружу отдаётся как ``Player`` (``to_model``)."""
+
+    __slots__ = ("id", "name", "avatar_url", "seat")
+
+    def __init__(self, id: str, name: str, avatar_url: Optional[str] = None, seat: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.avatar_url = avatar_url
+        self.seat = seat
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "_Seat":
+        return cls(data["id"], data["name"], data.get("avatar_url"), data.get("seat"))
+
+    def to_dict(self) -> dict:
+        # Те же поля, что в Player.model_dump()
+        return {"id": self.id, "name": self.name, "avatar_url": self.avatar_url, "seat": self.seat, "disconnected": None}
+
+    def to_model(self) -> Player:
+        return Player(id=self.id, name=self.name, avatar_url=self.avatar_url, seat=self.seat)
+
+
+# Биты объявленных комбинаций в ``Room.declared_combos``
+_COMBO_BITS: Dict[str, int] = {key: 1 << idx for idx, key in enumerate(COMBINATION_NAMES)}
+
+
+class _Announcement(NamedTuple):
+    """Объявленная комбинация; карты - маска, наружу - ``Announcement``."""
+
+    player_id: str
+    combo: str
+    mask: int
+
+    @property
+    def cards(self) -> List[Card]:
+        return [CARD_MODELS[idx] for idx in iter_mask(self.mask)]
+
+    def to_model(self) -> Announcement:
+        return Announcement(player_id=self.player_id, combo=self.combo, cards=self.cards)
+
+    def to_payload(self) -> dict:
+        return {
+            "player_id": self.player_id,
+            "combo": self.combo,
+            "cards": [CARD_PAYLOADS[idx] for idx in iter_mask(self.mask)],
+        }
+
+
+# Порядковые номера комнат: по ним листается GET /api/rooms
+_ROOM_SEQ = itertools.count(1)
+
+
 class Room:
+    # Без __dict__: комнат в процессе тысячи, а полей у каждой под пятьдесят
+    __slots__ = (
+        "id", "seq", "name", "variant", "config", "players", "started",
+        "_player_pos", "_player_ids_by_name", "_registry",
+        "deck", "trump", "trump_card", "hands", "taken_cards", "discard_pile",
+        "announcements", "declared_combos",
+        "turn_idx", "turn_deadline", "current_trick", "last_trick_winner_id", "dealer_idx",
+        "round_number", "round_id", "round_active", "round_summary", "trick_index",
+        "reveal_snapshot", "reveal_until_ts", "pending_turn_resume", "pending_round_start",
+        "winner_id", "match_over", "winners", "losers",
+        "scores", "game_wins", "current_round_start_idx", "next_round_start_idx",
+        "match_id", "match_started_at",
+        "version", "last_active", "_cache_version", "_public_payloads", "_viewer_payloads",
+        "_move_payloads", "_change_event", "_lobby_entry",
+    )
+
     def __init__(self, room_id: str, room_name: str, variant: GameVariant, config: Optional[TableConfig] = None):
         self.id = room_id
+        self.seq = next(_ROOM_SEQ)
         self.name = room_name
         self.variant = variant
         self.config = config or TableConfig()
-        self.players: List[Player] = []
+        self.players: List[_Seat] = []
         self.started = False
-
-        self.deck: List[Card] = []
-        # Инициализируем каталог карт сразу для предзагрузки на клиенте
-        full_deck = _make_deck()
-        self.card_catalog: Dict[str, Card] = {card.id: card for card in full_deck}
+        # Индексы игроков: id -> позиция в players, имя -> id
+        self._player_pos: Dict[str, int] = {}
+        self._player_ids_by_name: Dict[str, str] = {}
+        # Реестр (ROOMS), индексы которого нужно обновлять при смене состава
+        self._registry: Optional[RoomRegistry] = None
+
+        # Карты движка - целые 0..35 (см. cards.py): колода и сброс - байтовые
+        # массивы, руки и взятки - битовые маски, объявленные комбинации - биты
+        # ``_COMBO_BITS``
+        self.deck: bytearray = bytearray()
         self.trump: Optional[str] = None
-        self.trump_card: Optional[Card] = None
-        self.hands: Dict[str, List[Card]] = {}
-        self.taken_cards: Dict[str, List[Card]] = {}
-        self.discard_pile: List[Card] = []
-        self.announcements: List[Announcement] = []
-        self.declared_combos: Dict[str, set[str]] = {}
+        self.trump_card: Optional[int] = None
+        self.hands: Dict[str, int] = {}
+        self.taken_cards: Dict[str, int] = {}
+        self.discard_pile: bytearray = bytearray()
+        self.announcements: List[_Announcement] = []
+        self.declared_combos: Dict[str, int] = {}
 
         self.turn_idx: int = 0
         self.turn_deadline: Optional[float] = None
@@ -196,14 +390,87 @@ class Room:
         self.match_id: Optional[str] = None
         self.match_started_at: Optional[float] = None
 
+        # Версия растёт при каждом изменении комнаты; по ней кэшируется состояние
+        self.version: int = 0
+        # Время последнего изменения (time.time()); по нему убираются простаивающие комнаты
+        self.last_active: float = time.time()
+        self._cache_version: int = -1
+        self._public_payloads: Dict[str, dict] = {}
+        self._viewer_payloads: Dict[Tuple[Optional[str], str], dict] = {}
+        # Подсказки ходов по игрокам (см. moves_payload); создаются по запросу
+        self._move_payloads: Optional[Dict[Optional[str], dict]] = None
+        # Будит long-poll запросы состояния при следующем изменении
+        self._change_event: Optional[asyncio.Event] = None
+        # Запись комнаты в списке лобби; меняется только с числом игроков и стартом
+        self._lobby_entry: Optional[Tuple[Tuple[int, bool], dict]] = None
+
+    def touch(self):
+        """Отметить изменение комнаты (инвалидирует кэш состояния)."""
+        self.version += 1
+        self.last_active = time.time()
+        if self._change_event is not None:
+            self._change_event.set()
+            self._change_event = None
+
+    def next_timer_at(self) -> Optional[float]:
+        """Ближайший момент (time.time()), когда сработает таймер хода или показа."""
+        turn_deadline = self.turn_deadline if self.round_active and self.players else None
+        deadlines = [ts for ts in (turn_deadline, self.reveal_until_ts) if ts]
+        return min(deadlines) if deadlines else None
+
+    async def wait_for_change(self, since: int, timeout: float) -> bool:
+        """Ждать, пока ``version`` станет больше ``since`` (не дольше ``timeout`` секунд).
+
+        Переходы по таймерам применяет планировщик (scheduler.py), и они тоже
+        вызывают ``touch``, поэтому ожидание не опрашивает дедлайны комнаты.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while self.version <= since:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                return False
+            if self._change_event is None:
+                self._change_event = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._change_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return True
+
     # ------------------------------------------------------------------
     # Lobby management
     # ------------------------------------------------------------------
+    def player(self, player_id: Optional[str]) -> Optional[_Seat]:
+        pos = self._player_pos.get(player_id)
+        return self.players[pos] if pos is not None else None
+
+    def _player_model(self, player_id: Optional[str]) -> Optional[Player]:
+        seat = self.player(player_id)
+        return seat.to_model() if seat is not None else None
+
+    def is_open(self) -> bool:
+        """Стол ждёт игроков: партия не начата и есть свободные места."""
+        max_players = self.config.max_players or self.variant.players_max
+        return not self.started and len(self.players) < max_players
+
+    def _players_changed(self):
+        self._player_pos = {player.id: idx for idx, player in enumerate(self.players)}
+        self._player_ids_by_name = {}
+        for player in self.players:
+            # При совпадении имён, как и раньше, находится первый игрок
+            self._player_ids_by_name.setdefault(player.name, player.id)
+        self._membership_changed()
+
+    def _membership_changed(self):
+        if self._registry is not None:
+            self._registry.reindex(self)
+
     def add_player(self, p: Player):
         # Проверяем, есть ли игрок уже в комнате (для переподключения)
         # Проверяем как по ID, так и по имени (nickname)
-        existing_by_id = next((x for x in self.players if x.id == p.id), None)
-        existing_by_name = next((x for x in self.players if x.name == p.name), None)
+        existing_by_id = self.player(p.id)
+        existing_by_name = self.player(self._player_ids_by_name.get(p.name))
 
         if existing_by_id:
             # Игрок уже в комнате с тем же ID - это переподключение
@@ -232,6 +499,8 @@ class Room:
             if old_id in self.game_wins:
                 self.game_wins[p.id] = self.game_wins.pop(old_id)
 
+            self._players_changed()
+            self.touch()
             return
 
         # Если игра уже началась и это новый игрок - запрещаем
@@ -242,14 +511,16 @@ class Room:
         if len(self.players) >= max_players:
             raise ValueError("Room full")
 
-        p.seat = len(self.players)
-        self.players.append(p)
-        self.hands.setdefault(p.id, [])
+        self.players.append(_Seat(p.id, p.name, p.avatar_url, len(self.players)))
+        self.hands.setdefault(p.id, 0)
         self.scores.setdefault(p.id, 0)
         self.game_wins.setdefault(p.id, 0)
+        self._players_changed()
+        self.touch()
 
     def remove_player(self, player_id: str):
         self.players = [p for p in self.players if p.id != player_id]
+        self._players_changed()
         self.hands.pop(player_id, None)
         self.taken_cards.pop(player_id, None)
         self.scores.pop(player_id, None)
@@ -260,6 +531,8 @@ class Room:
         else:
             self.started = False
             self.round_active = False
+            self._membership_changed()
+        self.touch()
 
     # ------------------------------------------------------------------
     # Match lifecycle
@@ -273,6 +546,7 @@ class Room:
         if len(self.players) < min_players:
             raise ValueError("Not enough players")
         self.started = True
+        self._membership_changed()
         self.match_over = False
         self.round_summary = {}
         self.winners = []
@@ -297,17 +571,15 @@ class Room:
         self.round_number += 1
         self.round_id = f"r_{self.round_number}"
         self.round_active = True
-        base_deck = _make_deck()
-        self.card_catalog = {card.id: card for card in base_deck}
-        self.deck = list(base_deck)
+        self.deck = bytearray(_UNSHUFFLED_DECK)
         random.shuffle(self.deck)
         self.trump_card = self.deck[-1] if self.deck else None
-        self.trump = self.trump_card.suit if self.trump_card else None
-        self.discard_pile = []
+        self.trump = CARD_SUIT[self.trump_card] if self.trump_card is not None else None
+        self.discard_pile = bytearray()
         self.announcements = []
-        self.declared_combos = {p.id: set() for p in self.players}
-        self.taken_cards = {p.id: [] for p in self.players}
-        self.hands = {p.id: [] for p in self.players}
+        self.declared_combos = {p.id: 0 for p in self.players}
+        self.taken_cards = {p.id: 0 for p in self.players}
+        self.hands = {p.id: 0 for p in self.players}
         self.current_trick = None
         self.trick_index = 0
         self.reveal_snapshot = None
@@ -320,7 +592,7 @@ class Room:
         for _ in range(4):
             for pl in self.players:
                 if self.deck:
-                    self.hands[pl.id].append(self.deck.pop(0))
+                    self.hands[pl.id] |= 1 << self.deck.pop(0)
 
         if self.next_round_start_idx is None:
             if initial:
@@ -339,16 +611,13 @@ class Room:
     # Helpers
     # ------------------------------------------------------------------
     def _player_index(self, player_id: str) -> int:
-        for idx, player in enumerate(self.players):
-            if player.id == player_id:
-                return idx
-        raise ValueError("Unknown player")
+        pos = self._player_pos.get(player_id)
+        if pos is None:
+            raise ValueError("Unknown player")
+        return pos
 
     def _player_seat(self, player_id: str) -> int:
-        for player in self.players:
-            if player.id == player_id:
-                return player.seat or 0
-        raise ValueError("Unknown player")
+        return self.players[self._player_index(player_id)].seat or 0
 
     def current_player_id(self) -> Optional[str]:
         if not self.players:
@@ -356,6 +625,7 @@ class Room:
         return self.players[self.turn_idx].id
 
     def _refresh_deadline(self):
+        self.touch()
         if not self.round_active:
             self.turn_deadline = None
             return
@@ -374,6 +644,10 @@ class Room:
         penalties[offender] = 6
         self.round_summary = {p.id: 0 for p in self.players}
         self._finalize_round(penalties, [])
+        if self.pending_round_start:
+            # Пауза перед следующим раундом, как после последней взятки;
+            # по её окончании _check_reveal раздаёт новый раунд
+            self.reveal_until_ts = time.time() + REVEAL_DELAY_SECONDS
 
     def _check_reveal(self):
         if self.reveal_until_ts is None:
@@ -382,6 +656,7 @@ class Room:
             return
         self.reveal_until_ts = None
         self.reveal_snapshot = None
+        self.touch()
         if self.pending_round_start and not self.match_over:
             self.pending_round_start = False
             self._start_new_round(initial=False)
@@ -390,33 +665,11 @@ class Room:
             self.pending_turn_resume = False
             self._refresh_deadline()
 
-    def _beats(self, a: Card, b: Card) -> bool:
-        if a.suit == b.suit:
-            return RANK_STRENGTH[a.rank] > RANK_STRENGTH[b.rank]
-        if a.suit == self.trump and b.suit != self.trump:
-            return True
-        return False
-
-    def _max_beat_count(self, challenger: Sequence[Card], owner_cards: Sequence[Card]) -> int:
-        owner_list = list(owner_cards)
-        challenger_list = list(challenger)
-        used = [False] * len(challenger_list)
-
-        def helper(owner_idx: int) -> int:
-            if owner_idx >= len(owner_list):
-                return 0
-            best = helper(owner_idx + 1)
-            owner_card = owner_list[owner_idx]
-            for idx, card in enumerate(challenger_list):
-                if used[idx]:
-                    continue
-                if self._beats(card, owner_card):
-                    used[idx] = True
-                    best = max(best, 1 + helper(owner_idx + 1))
-                    used[idx] = False
-            return best
+    def _beats(self, a: int, b: int) -> bool:
+        return bool(BEATERS[trump_index(self.trump)][b] >> a & 1)
 
-        return helper(0)
+    def _max_beat_count(self, challenger: Sequence[int], owner_cards: Sequence[int]) -> int:
+        return max_beat_count(challenger, owner_cards, trump_index(self.trump))
 
     def _draw_up_from_deck(self, winner_id: str):
         if not self.deck:
@@ -429,21 +682,21 @@ class Room:
                 if not self.deck:
                     break
                 pid = self.players[(start_idx + offset) % total_players].id
-                if len(self.hands[pid]) >= 4:
+                if mask_count(self.hands[pid]) >= 4:
                     continue
-                self.hands[pid].append(self.deck.pop(0))
+                self.hands[pid] |= 1 << self.deck.pop(0)
                 drew_any = True
             if not drew_any:
                 break
 
     def _round_finished(self) -> bool:
-        return all(len(hand) == 0 for hand in self.hands.values()) and not self.deck
+        return not any(self.hands.values()) and not self.deck
 
     def _calculate_round_result(self) -> Dict[str, int]:
-        return {
-            pid: sum(CARD_POINTS.get(card.rank, 0) for card in cards)
-            for pid, cards in self.taken_cards.items()
-        }
+        return {pid: mask_points(taken) for pid, taken in self.taken_cards.items()}
+
+    def _resolve_cards(self, cards_payload: Iterable[int | str | dict | Card]) -> List[int]:
+        return [resolve_card(payload) for payload in cards_payload]
 
     # ------------------------------------------------------------------
     # Public API
@@ -458,67 +711,69 @@ class Room:
             raise ValueError("Unknown combination")
         if combo_key == "four_ends" and not self.config.enable_four_ends:
             raise ValueError("Combination not enabled")
-        allowed = self.declared_combos.setdefault(player_id, set())
-        if combo_key in allowed:
+        declared = self.declared_combos.get(player_id, 0)
+        if declared & _COMBO_BITS[combo_key]:
             raise ValueError("Combination already declared")
         cards = self._find_combination_cards(player_id, combo_key)
         if not cards:
             raise ValueError("Combination cards not present")
-        announcement = Announcement(player_id=player_id, combo=combo_key, cards=cards)
-        self.announcements.append(announcement)
-        allowed.add(combo_key)
+        self.announcements.append(_Announcement(player_id, combo_key, cards))
+        self.declared_combos[player_id] = declared | _COMBO_BITS[combo_key]
+        self.touch()
 
-    def _find_combination_cards(self, player_id: str, combo_key: str) -> List[Card]:
-        hand = list(self.hands.get(player_id) or [])
+    def _find_combination_cards(self, player_id: str, combo_key: str) -> int:
+        hand = self.hands.get(player_id) or 0
         if not hand:
-            return []
+            return 0
         if combo_key == "bura" and self.trump:
-            trumps = [card for card in hand if card.suit == self.trump]
-            if len(trumps) >= 4:
-                return trumps[:4]
-            return []
+            trumps = hand & SUIT_MASKS[SUIT_INDEX[self.trump]]
+            if mask_count(trumps) >= 4:
+                return lowest_cards(trumps, 4)
+            return 0
         if combo_key == "molodka":
-            for suit in SUITS:
-                same_suit = [card for card in hand if card.suit == suit]
-                if len(same_suit) >= 4:
-                    return same_suit[:4]
-            return []
+            for suit_mask in SUIT_MASKS:
+                same_suit = hand & suit_mask
+                if mask_count(same_suit) >= 4:
+                    return lowest_cards(same_suit, 4)
+            return 0
         if combo_key == "moscow":
-            aces = [card for card in hand if card.rank == 14]
-            if len(aces) >= 3 and any(card.suit == self.trump for card in aces):
-                return aces[:3]
-            return []
+            aces = hand & RANK_MASKS[14]
+            trump_mask = SUIT_MASKS[SUIT_INDEX[self.trump]] if self.trump else 0
+            if mask_count(aces) >= 3 and aces & trump_mask:
+                return lowest_cards(aces, 3)
+            return 0
         if combo_key == "four_ends":
-            tens = [card for card in hand if card.rank == 10]
-            if len(tens) == 4:
+            tens = hand & RANK_MASKS[10]
+            if mask_count(tens) == 4:
                 return tens
-            aces = [card for card in hand if card.rank == 14]
-            if len(aces) == 4:
+            aces = hand & RANK_MASKS[14]
+            if mask_count(aces) == 4:
                 return aces
-            return []
-        return []
+            return 0
+        return 0
 
-    def _is_valid_four_card_combo(self, cards: Sequence[Card]) -> bool:
-        if len(cards) != 4:
+    def _is_single_suit(self, cards: int) -> bool:
+        if not cards:
+            return False
+        lowest = (cards & -cards).bit_length() - 1
+        return not cards & ~SUIT_MASKS[CARD_SUIT_INDEX[lowest]]
+
+    def _is_valid_four_card_combo(self, cards: int) -> bool:
+        if mask_count(cards) != 4:
             return False
-        suits = {card.suit for card in cards}
-        if len(suits) == 1:
+        if self._is_single_suit(cards):
             return True
-        rank_counts = Counter(card.rank for card in cards)
-        aces = rank_counts.get(14, 0)
-        tens = rank_counts.get(10, 0)
-        if set(rank_counts.keys()) - {10, 14}:
+        if cards & ~_TEN_ACE_MASK:
             return False
-        allowed_patterns = {(1, 3), (2, 2), (3, 1), (4, 0)}
-        return (aces, tens) in allowed_patterns
+        return bool(cards & RANK_MASKS[14])
 
-    def _is_valid_four_card_throw(self, cards: Sequence[Card]) -> bool:
+    def _is_valid_four_card_throw(self, cards: int) -> bool:
         return self._is_valid_four_card_combo(cards)
 
     def request_early_turn(
         self,
         player_id: str,
-        cards_payload: Sequence[dict | Card],
+        cards_payload: Sequence[int | str | dict | Card],
         *,
         round_id: Optional[str] = None,
     ) -> List[Card]:
@@ -540,41 +795,26 @@ class Room:
             or len(cards_payload) != 4
         ):
             raise ValueError("Нужно выбрать ровно 4 карты")
-        hand = list(self.hands.get(player_id) or [])
+        hand = self.hands.get(player_id) or 0
         if not hand:
             raise ValueError("Hand not available")
 
-        chosen: List[Card] = []
-        used_indexes: set[int] = set()
-
-        for payload in cards_payload:
-            card = payload if isinstance(payload, Card) else Card.model_validate(payload)
-            match_index: Optional[int] = None
-            for idx, hand_card in enumerate(hand):
-                if idx in used_indexes:
-                    continue
-                if card.id and hand_card.id == card.id:
-                    match_index = idx
-                    break
-                if hand_card.suit == card.suit and hand_card.rank == card.rank:
-                    match_index = idx
-                    break
-            if match_index is None:
-                raise ValueError("Card not in hand")
-            used_indexes.add(match_index)
-            chosen.append(hand[match_index])
+        chosen = self._resolve_cards(cards_payload)
+        chosen_mask = mask_of(chosen)
+        if mask_count(chosen_mask) != len(chosen) or chosen_mask & ~hand:
+            raise ValueError("Card not in hand")
 
-        if not self._is_valid_four_card_combo(chosen):
+        if not self._is_valid_four_card_combo(chosen_mask):
             raise ValueError("Недопустимый набор для досрочного хода")
 
         self.turn_idx = self._player_index(player_id)
         self._refresh_deadline()
-        return chosen
+        return [CARD_MODELS[idx] for idx in chosen]
 
     def play_cards(
         self,
         player_id: str,
-        cards_payload: List[dict | Card],
+        cards_payload: Sequence[int | str | dict | Card],
         *,
         round_id: Optional[str] = None,
         trick_index: Optional[int] = None,
@@ -589,28 +829,27 @@ class Room:
             raise ValueError("Not your turn")
         if round_id is not None and self.round_id is not None and round_id != self.round_id:
             raise ValueError("Round mismatch")
-        if not isinstance(cards_payload, list) or not cards_payload:
+        if not isinstance(cards_payload, (list, tuple)) or not cards_payload:
             raise ValueError("Must play one or more cards")
 
-        hand = self.hands.get(player_id, [])
-        cards = [card if isinstance(card, Card) else Card.model_validate(card) for card in cards_payload]
-
-        for card in cards:
-            if not any(c.suit == card.suit and c.rank == card.rank for c in hand):
-                raise ValueError("Card not in hand")
+        hand = self.hands.get(player_id, 0)
+        cards = self._resolve_cards(cards_payload)
+        played = mask_of(cards)
+        if mask_count(played) != len(cards) or played & ~hand:
+            raise ValueError("Card not in hand")
 
         seat = self._player_seat(player_id)
 
         if self.current_trick is None:
             if len(cards) == 4:
-                if not self._is_valid_four_card_throw(cards):
+                if not self._is_valid_four_card_throw(played):
                     raise ValueError("Нельзя скинуть выбранные 4 карты")
             else:
                 if len(cards) not in (1, 2, 3):
                     raise ValueError("Leader must play 1, 2 or 3 cards")
-                if len({card.suit for card in cards}) != 1:
+                if not self._is_single_suit(played):
                     raise ValueError("Leader cards must share suit")
-            min_available = min(len(self.hands[p.id]) for p in self.players)
+            min_available = min(mask_count(self.hands[p.id]) for p in self.players)
             if len(cards) > min_available:
                 raise ValueError("Other players do not have enough cards")
             self.trick_index += 1
@@ -620,14 +859,14 @@ class Room:
                 required_count=len(cards),
                 owner_id=player_id,
                 owner_seat=seat,
-                owner_cards=list(cards),
+                owner_cards=bytes(cards),
                 trick_index=self.trick_index,
             )
             trick.plays.append(
                 _TrickPlayInternal(
                     player_id=player_id,
                     seat=seat,
-                    cards=list(cards),
+                    cards=bytes(cards),
                     outcome="lead",
                     owner=True,
                 )
@@ -646,7 +885,7 @@ class Room:
                     play.owner = False
                 trick.owner_id = player_id
                 trick.owner_seat = seat
-                trick.owner_cards = list(cards)
+                trick.owner_cards = bytes(cards)
                 owner_flag = True
             elif beat_count > 0:
                 outcome = "partial"
@@ -658,15 +897,13 @@ class Room:
                 _TrickPlayInternal(
                     player_id=player_id,
                     seat=seat,
-                    cards=list(cards),
+                    cards=bytes(cards),
                     outcome=outcome,
                     owner=owner_flag,
                 )
             )
 
-        for card in cards:
-            idx = next(i for i, owned in enumerate(hand) if owned.suit == card.suit and owned.rank == card.rank)
-            hand.pop(idx)
+        self.hands[player_id] = hand & ~played
 
         self.turn_idx = (self.turn_idx + 1) % len(self.players)
 
@@ -675,16 +912,17 @@ class Room:
         else:
             self._refresh_deadline()
 
-    def play(self, player_id: str, cards_payload: List[dict | Card]):
+    def play(self, player_id: str, cards_payload: Sequence[int | str | dict | Card]):
         self.play_cards(player_id, cards_payload)
 
     def _complete_trick(self):
         trick = self.current_trick
         if not trick:
             return
+        self.touch()
         winner_id = trick.owner_id
         cards_for_winner = [card for play in trick.plays for card in play.cards]
-        self.taken_cards[winner_id].extend(cards_for_winner)
+        self.taken_cards[winner_id] = self.taken_cards.get(winner_id, 0) | mask_of(cards_for_winner)
         self.discard_pile.extend(cards_for_winner)
         self.last_trick_winner_id = winner_id
         self.reveal_snapshot = trick
@@ -731,6 +969,7 @@ class Room:
         return penalties, leaders if has_unique_winner else []
 
     def _finalize_round(self, penalties: Dict[str, int], leaders: List[str]):
+        self.touch()
         for pid, value in penalties.items():
             self.scores[pid] = self.scores.get(pid, 0) + value
         for pid in leaders:
@@ -746,6 +985,8 @@ class Room:
             self.winner_id = self.winners[0] if len(self.winners) == 1 else None
             self.pending_round_start = False
             self.started = False
+            # Сыгранный стол со свободными местами снова открыт в реестре
+            self._membership_changed()
 
             # Сохраняем результаты матча в БД
             self._save_match_to_db()
@@ -759,7 +1000,6 @@ class Room:
             return
 
         # Импортируем здесь, чтобы избежать циклических зависимостей
-        import asyncio
         from database import save_match
 
         participants = []
@@ -788,8 +1028,7 @@ class Room:
         totals: List[PlayerTotals] = []
         for player in self.players:
             pid = player.id
-            taken_cards = self.taken_cards.get(pid, [])
-            points = sum(CARD_POINTS.get(card.rank, 0) for card in taken_cards)
+            points = mask_points(self.taken_cards.get(pid, 0))
             totals.append(
                 PlayerTotals(
                     player_id=pid,
@@ -800,28 +1039,21 @@ class Room:
             )
         return totals
 
-    def to_state(self, me_id: Optional[str]) -> GameState:
-        self._check_timeout()
-        self._check_reveal()
-        trick_source = self.current_trick
-        reveal_active = False
-        if trick_source is None and self.reveal_snapshot is not None and self.reveal_until_ts:
-            trick_source = self.reveal_snapshot
-            reveal_active = True
-        trick_public = (
-            trick_source.to_public(
-                viewer_id=me_id,
-                discard_visibility=self.config.discard_visibility,
-            )
-            if trick_source
-            else None
+    def _reveal_active(self) -> bool:
+        return self.current_trick is None and self.reveal_snapshot is not None and bool(self.reveal_until_ts)
+
+    def _trick_views(self, viewer_id: Optional[str]) -> tuple[Optional[TrickState], Optional[BoardState]]:
+        reveal_active = self._reveal_active()
+        trick_source = self.reveal_snapshot if reveal_active else self.current_trick
+        if trick_source is None:
+            return None, None
+        trick_public = trick_source.to_public(
+            viewer_id=viewer_id,
+            discard_visibility=self.config.discard_visibility,
         )
-        discard_cards = list(self.discard_pile) if self.config.discard_visibility == "open" else []
-        hands = self.hands.get(me_id)
-        hand_counts = {pid: len(hand) for pid, hand in self.hands.items()}
 
         def _board_entry(card: PublicCard) -> BoardCard:
-            catalog_card = self.card_catalog.get(card.card_id)
+            catalog_card = CARD_CATALOG.get(card.card_id)
             return BoardCard(
                 cardId=card.card_id,
                 faceUp=card.face_up,
@@ -833,10 +1065,10 @@ class Room:
             )
 
         board_state: Optional[BoardState] = None
-        if trick_public and trick_public.plays:
+        if trick_public.plays:
             leader_play = next((play for play in trick_public.plays if play.outcome in ("lead", "beat")), trick_public.plays[0])
             defender_play = None
-            if trick_public.plays and len(trick_public.plays) > 1:
+            if len(trick_public.plays) > 1:
                 defender_play = next((play for play in trick_public.plays if play is not leader_play), None)
             attacker_cards = leader_play.cards if leader_play else []
             defender_cards = defender_play.cards if defender_play else []
@@ -845,7 +1077,10 @@ class Room:
                 defender=[_board_entry(card) for card in defender_cards],
                 reveal_until_ts=self.reveal_until_ts if reveal_active else None,
             )
+        return trick_public, board_state
 
+    def _table_clocks(self) -> List[PlayerClock]:
+        reveal_active = self._reveal_active()
         active_player_id = self.current_player_id() if self.round_active else None
         table_players = []
         now_ts = time.time()
@@ -862,24 +1097,35 @@ class Room:
                     is_active=is_active,
                 )
             )
+        return table_players
 
-        cards_catalog = list(self.card_catalog.values())
-        cards_catalog.sort(key=lambda c: c.id)
-
+    def _hand_cards(self, player_id: Optional[str]) -> Optional[List[Card]]:
+        hand_mask = self.hands.get(player_id)
+        if hand_mask is None:
+            return None
+        return [CARD_MODELS[idx] for idx in iter_mask(hand_mask)]
+
+    def _build_state(self, me_id: Optional[str]) -> GameState:
+        trick_public, board_state = self._trick_views(me_id)
+        discard_cards = (
+            [CARD_MODELS[idx] for idx in self.discard_pile]
+            if self.config.discard_visibility == "open"
+            else []
+        )
         return GameState(
             room_id=self.id,
             room_name=self.name,
             started=self.started,
             variant=self.variant,
             config=self.config,
-            players=self.players,
-            me=next((p for p in self.players if p.id == me_id), None),
+            players=[seat.to_model() for seat in self.players],
+            me=self._player_model(me_id),
             trump=self.trump,
-            trump_card=self.trump_card,
+            trump_card=CARD_MODELS[self.trump_card] if self.trump_card is not None else None,
             table_cards=[card for play in (trick_public.plays if trick_public else []) for card in play.cards],
             deck_count=len(self.deck),
-            hands=list(hands) if hands is not None else None,
-            hand_counts=hand_counts,
+            hands=self._hand_cards(me_id),
+            hand_counts={pid: mask_count(hand) for pid, hand in self.hands.items()},
             turn_player_id=self.players[self.turn_idx].id if self.players and self.round_active else None,
             winner_id=self.winner_id,
             scores=self.scores,
@@ -887,9 +1133,9 @@ class Room:
             trick_index=self.trick_index,
             discard_pile=discard_cards,
             discard_count=len(self.discard_pile),
-            taken_counts={pid: len(cards) for pid, cards in self.taken_cards.items()},
+            taken_counts={pid: mask_count(cards) for pid, cards in self.taken_cards.items()},
             round_points=dict(self.round_summary),
-            announcements=list(self.announcements),
+            announcements=[item.to_model() for item in self.announcements],
             turn_deadline_ts=self.turn_deadline,
             round_number=self.round_number,
             round_id=self.round_id,
@@ -898,13 +1144,419 @@ class Room:
             losers=list(self.losers),
             last_trick_winner_id=self.last_trick_winner_id,
             player_totals=self._collect_player_totals(),
-            cards=cards_catalog,
+            cards=list(SORTED_CARD_MODELS),
             board=board_state,
-            tablePlayers=table_players,
+            tablePlayers=self._table_clocks(),
+        )
+
+    # ------------------------------------------------------------------
+    # Legal moves
+    # ------------------------------------------------------------------
+    def legal_moves(self, player_id: Optional[str]) -> List[Tuple[str, int, str]]:
+        """Допустимые сейчас ходы игрока: ``(вид, маска карт, исход)``.
+
+        Виды: ``lead`` - заход 1-3 картами одной масти, ``throw`` - заход
+        четырьмя картами, ``response`` - ответ на взятку, ``early_turn`` -
+        досрочный ход четырьмя картами не в свою очередь. Исход ответа
+        считается как в ``play_cards`` (``beat``/``partial``/``discard``), у
+        заходов он ``lead``. Проверки те же, что в ``play_cards`` и
+        ``request_early_turn``, поэтому ход из списка будет принят.
+        """
+        hand = self.hands.get(player_id) or 0
+        if not hand or not self.started or not self.round_active or self.reveal_until_ts is not None:
+            return []
+        cards = list(iter_mask(hand))
+        moves: List[Tuple[str, int, str]] = []
+        trick = self.current_trick
+        if player_id != self.current_player_id():
+            if trick is None:
+                for combo in itertools.combinations(cards, 4):
+                    mask = mask_of(combo)
+                    if self._is_valid_four_card_combo(mask):
+                        moves.append(("early_turn", mask, "lead"))
+            return moves
+        if trick is None:
+            min_available = min(mask_count(self.hands[p.id]) for p in self.players)
+            for count in range(1, min(3, min_available) + 1):
+                for combo in itertools.combinations(cards, count):
+                    mask = mask_of(combo)
+                    if self._is_single_suit(mask):
+                        moves.append(("lead", mask, "lead"))
+            if min_available >= 4:
+                for combo in itertools.combinations(cards, 4):
+                    mask = mask_of(combo)
+                    if self._is_valid_four_card_throw(mask):
+                        moves.append(("throw", mask, "lead"))
+            return moves
+        for combo in itertools.combinations(cards, trick.required_count):
+            beat_count = self._max_beat_count(combo, trick.owner_cards)
+            if beat_count == trick.required_count:
+                outcome = "beat"
+            elif beat_count > 0:
+                outcome = "partial"
+            else:
+                outcome = "discard"
+            moves.append(("response", mask_of(combo), outcome))
+        return moves
+
+    def declarable_combos(self, player_id: Optional[str]) -> List[str]:
+        """Комбинации, которые игрок может объявить сейчас (см. ``declare_combination``)."""
+        if not self.round_active or self.trick_index > 0 or self.current_trick is not None:
+            return []
+        declared = self.declared_combos.get(player_id, 0)
+        return [
+            combo
+            for combo, bit in _COMBO_BITS.items()
+            if not declared & bit
+            and (combo != "four_ends" or self.config.enable_four_ends)
+            and self._find_combination_cards(player_id, combo)
+        ]
+
+    def moves_payload(self, player_id: Optional[str]) -> dict:
+        """Подсказка ходов для ``player_id``; кэшируется по ``version``."""
+        self._sync_state_cache()
+        if self._move_payloads is None:
+            self._move_payloads = {}
+        cached = self._move_payloads.get(player_id)
+        if cached is None:
+            cached = {
+                "version": self.version,
+                "round_id": self.round_id,
+                "trick_index": self.current_trick.trick_index if self.current_trick is not None else None,
+                "moves": [
+                    {"kind": kind, "cards": [CARD_MODELS[idx].id for idx in iter_mask(mask)], "outcome": outcome}
+                    for kind, mask, outcome in self.legal_moves(player_id)
+                ],
+                "declarable": self.declarable_combos(player_id),
+            }
+            self._move_payloads[player_id] = cached
+        return cached
+
+    def advance_timers(self):
+        """Применить истёкшие таймеры хода и показа взятки."""
+        self._check_timeout()
+        self._check_reveal()
+
+    def to_state(self, me_id: Optional[str]) -> GameState:
+        """Состояние для ``me_id``; чтение не применяет таймеры (см. scheduler.py)."""
+        return self._build_state(me_id)
+
+    # ------------------------------------------------------------------
+    # Cached serialized state
+    # ------------------------------------------------------------------
+    def _viewer_fields(self) -> frozenset[str]:
+        """Поля GameState, зависящие от зрителя (остальное общее для всех)."""
+        if self.config.discard_visibility == "open":
+            return _VIEWER_FIELDS
+        return _VIEWER_FIELDS | _HIDDEN_TRICK_FIELDS
+
+    def _sync_state_cache(self):
+        if self._cache_version != self.version:
+            self._cache_version = self.version
+            self._public_payloads = {}
+            self._viewer_payloads = {}
+            self._move_payloads = None
+
+    def public_payload(self, fmt: StateFormat = "full") -> dict:
+        """Сериализованная общая часть состояния (без полей зрителя)."""
+        self._sync_state_cache()
+        cached = self._public_payloads.get(fmt)
+        if cached is None:
+            if fmt == "compact":
+                cached = compact_state(self.public_payload("full"))
+            else:
+                exclude = self._viewer_fields() | _SHARED_CARD_FIELDS | {"table_players"}
+                cached = self._build_state(None).model_dump(by_alias=True, exclude=exclude)
+                # Карты берутся из общих словарей модуля (CARD_PAYLOADS), а не
+                # сериализуются заново в каждой комнате
+                cached["trump_card"] = CARD_PAYLOADS[self.trump_card] if self.trump_card is not None else None
+                cached["discard_pile"] = (
+                    [CARD_PAYLOADS[idx] for idx in self.discard_pile]
+                    if self.config.discard_visibility == "open"
+                    else []
+                )
+                cached["announcements"] = [item.to_payload() for item in self.announcements]
+                cached["cards"] = _CATALOG_CARD_PAYLOADS
+            self._public_payloads[fmt] = cached
+        return cached
+
+    def viewer_payload(self, me_id: Optional[str], fmt: StateFormat = "full") -> dict:
+        """Сериализованные поля, которые видит только ``me_id``."""
+        self._sync_state_cache()
+        cached = self._viewer_payloads.get((me_id, fmt))
+        if cached is not None:
+            return cached
+        if fmt == "compact":
+            payload = compact_state(self.viewer_payload(me_id, "full"))
+            self._viewer_payloads[(me_id, fmt)] = payload
+            return payload
+        me = self.player(me_id)
+        hand_mask = self.hands.get(me_id)
+        payload: dict = {
+            "me": me.to_dict() if me else None,
+            "hands": [CARD_PAYLOADS[idx] for idx in iter_mask(hand_mask)] if hand_mask is not None else None,
+        }
+        if self.config.discard_visibility != "open":
+            trick_public, board_state = self._trick_views(me_id)
+            payload["trick"] = trick_public.model_dump(by_alias=True) if trick_public else None
+            payload["table_cards"] = (
+                [card.model_dump(by_alias=True) for play in trick_public.plays for card in play.cards]
+                if trick_public
+                else []
+            )
+            payload["board"] = board_state.model_dump(by_alias=True) if board_state else None
+        self._viewer_payloads[(me_id, fmt)] = payload
+        return payload
+
+    def lobby_entry(self) -> dict:
+        """Запись комнаты для ``list_rooms_summary`` (кэшируется, только для чтения)."""
+        key = (len(self.players), self.started)
+        if self._lobby_entry is None or self._lobby_entry[0] != key:
+            payload = {
+                "room_id": self.id,
+                "name": self.name,
+                "variant": self.variant.model_dump(),
+                "players": key[0],
+                "players_max": self.config.max_players if self.config else self.variant.players_max,
+                "started": self.started,
+            }
+            if self.config:
+                payload["config"] = self.config.model_dump(by_alias=True)
+            self._lobby_entry = (key, payload)
+        return self._lobby_entry[1]
+
+    def clocks_payload(self) -> List[dict]:
+        return [clock.model_dump(by_alias=True) for clock in self._table_clocks()]
+
+    def state_payload(self, me_id: Optional[str], fmt: StateFormat = "full") -> dict:
+        """Состояние для ``me_id`` в виде ``to_state(me_id).model_dump(by_alias=True)``
+        (или его компактной формы, см. ``compact_state``).
+
+        Общая и приватная части кэшируются по ``version``, поэтому повторные
+        запросы без изменений комнаты не пересобирают GameState. Таймеры хода
+        зависят от текущего времени и считаются на каждый вызов.
+        """
+        return {
+            **self.public_payload(fmt),
+            **self.viewer_payload(me_id, fmt),
+            "tablePlayers": self.clocks_payload(),
+        }
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+    def snapshot(self) -> dict:
+        """Полное состояние комнаты в JSON-совместимом виде (см. ``restore``)."""
+        data = {name: getattr(self, name) for name in _SNAPSHOT_FIELDS}
+        data.update(
+            id=self.id,
+            name=self.name,
+            variant=self.variant.model_dump(),
+            config=self.config.model_dump(),
+            players=[player.to_dict() for player in self.players],
+            hands=dict(self.hands),
+            taken_cards=dict(self.taken_cards),
+            deck=list(self.deck),
+            discard_pile=list(self.discard_pile),
+            announcements=[
+                {"player_id": item.player_id, "combo": item.combo, "cards": list(iter_mask(item.mask))}
+                for item in self.announcements
+            ],
+            declared_combos={
+                pid: [combo for combo, bit in _COMBO_BITS.items() if declared & bit]
+                for pid, declared in self.declared_combos.items()
+            },
+            current_trick=_trick_snapshot(self.current_trick),
+            reveal_snapshot=_trick_snapshot(self.reveal_snapshot),
+            round_summary=dict(self.round_summary),
+            winners=list(self.winners),
+            losers=list(self.losers),
+            scores=dict(self.scores),
+            game_wins=dict(self.game_wins),
+            # Когда снят образ: по нему restore_rooms отсчитывает простой сервера
+            saved_at=time.time(),
         )
+        return data
+
+    def shift_deadlines(self, delay: float):
+        """Сдвинуть дедлайн хода и конец показа на ``delay`` секунд.
+
+        Часы дедлайнов настенные, поэтому после простоя сервера комната
+        сдвигает их на время простоя: иначе ход игрока истёк бы, пока
+        сервер лежал, и ему достался бы штраф за таймаут.
+        """
+        if delay <= 0:
+            return
+        if self.turn_deadline is not None:
+            self.turn_deadline += delay
+        if self.reveal_until_ts is not None:
+            self.reveal_until_ts += delay
+
+    @classmethod
+    def restore(cls, data: Mapping) -> "Room":
+        """Комната из ``snapshot()``; в реестр не добавляется."""
+        room = cls(data["id"], data["name"], GameVariant(**data["variant"]), TableConfig(**data["config"]))
+        for name in _SNAPSHOT_FIELDS:
+            setattr(room, name, data[name])
+        room.players = [_Seat.from_dict(player) for player in data["players"]]
+        room.hands = dict(data["hands"])
+        room.taken_cards = dict(data["taken_cards"])
+        room.deck = bytearray(data["deck"])
+        room.discard_pile = bytearray(data["discard_pile"])
+        room.announcements = [
+            _Announcement(item["player_id"], item["combo"], mask_of(map(_snapshot_card, item["cards"])))
+            for item in data["announcements"]
+        ]
+        room.declared_combos = {
+            pid: sum(_COMBO_BITS[combo] for combo in combos) for pid, combos in data["declared_combos"].items()
+        }
+        room.current_trick = _trick_restore(data["current_trick"])
+        room.reveal_snapshot = _trick_restore(data["reveal_snapshot"])
+        room.round_summary = dict(data["round_summary"])
+        room.winners = list(data["winners"])
+        room.losers = list(data["losers"])
+        room.scores = dict(data["scores"])
+        room.game_wins = dict(data["game_wins"])
+        room._players_changed()
+        return room
+
+
+# Поля Room, которые входят в снимок как есть (скаляры)
+_SNAPSHOT_FIELDS = (
+    "started",
+    "trump",
+    "trump_card",
+    "turn_idx",
+    "turn_deadline",
+    "last_trick_winner_id",
+    "dealer_idx",
+    "round_number",
+    "round_id",
+    "round_active",
+    "trick_index",
+    "reveal_until_ts",
+    "pending_turn_resume",
+    "pending_round_start",
+    "winner_id",
+    "match_over",
+    "current_round_start_idx",
+    "next_round_start_idx",
+    "match_id",
+    "match_started_at",
+    "version",
+)
+
+
+def _snapshot_card(card: int | Mapping) -> int:
+    # Снимки прежних версий хранили карты объявлений моделями Card
+    return card if isinstance(card, int) else card_index(card["suit"], card["rank"])
+
+
+def _trick_snapshot(trick: Optional[_TrickInternal]) -> Optional[dict]:
+    if trick is None:
+        return None
+    return {
+        "leader_id": trick.leader_id,
+        "leader_seat": trick.leader_seat,
+        "required_count": trick.required_count,
+        "owner_id": trick.owner_id,
+        "owner_seat": trick.owner_seat,
+        "owner_cards": list(trick.owner_cards),
+        "trick_index": trick.trick_index,
+        "plays": [
+            {
+                "player_id": play.player_id,
+                "seat": play.seat,
+                "cards": list(play.cards),
+                "outcome": play.outcome,
+                "owner": play.owner,
+            }
+            for play in trick.plays
+        ],
+    }
+
+
+def _trick_restore(data: Optional[Mapping]) -> Optional[_TrickInternal]:
+    if data is None:
+        return None
+    plays = [_TrickPlayInternal(**{**play, "cards": bytes(play["cards"])}) for play in data["plays"]]
+    return _TrickInternal(**{**data, "owner_cards": bytes(data["owner_cards"]), "plays": plays})
+
+
+_VIEWER_FIELDS = frozenset({"me", "hands"})
+# Поля общей части, карты которых подставляются из общих словарей модуля
+_SHARED_CARD_FIELDS = frozenset({"trump_card", "discard_pile", "announcements", "cards"})
+# При закрытом сбросе игрок видит свои карты во взятке, остальные - рубашки.
+_HIDDEN_TRICK_FIELDS = frozenset({"trick", "table_cards", "board"})
+
+
+class RoomRegistry(Dict[str, Room]):
+    """Словарь комнат с индексом открытых столов (не начаты, есть места) по варианту.
+
+    Комната сообщает реестру о смене состава и старте через
+    ``Room._membership_changed``, поэтому индекс обновляется за O(1).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._open_by_variant: Dict[str, Dict[str, Room]] = {}
+        # Вариант, под которым открытая комната лежит в индексе
+        self._open_variant: Dict[str, str] = {}
+
+    def __setitem__(self, room_id: str, room: Room):
+        if room_id in self:
+            self._unindex(room_id)
+        super().__setitem__(room_id, room)
+        room._registry = self
+        self.reindex(room)
+
+    def __delitem__(self, room_id: str):
+        room = self[room_id]
+        self._unindex(room_id)
+        room._registry = None
+        super().__delitem__(room_id)
+
+    def pop(self, room_id: str, *default):
+        if room_id not in self:
+            if default:
+                return default[0]
+            raise KeyError(room_id)
+        room = self[room_id]
+        del self[room_id]
+        return room
+
+    def clear(self):
+        for room_id in list(self):
+            del self[room_id]
+
+    def reindex(self, room: Room):
+        if self.get(room.id) is not room:
+            return
+        self._unindex(room.id)
+        if room.is_open():
+            self._open_by_variant.setdefault(room.variant.key, {})[room.id] = room
+            self._open_variant[room.id] = room.variant.key
+
+    def _unindex(self, room_id: str):
+        open_variant = self._open_variant.pop(room_id, None)
+        if open_variant is None:
+            return
+        open_rooms = self._open_by_variant[open_variant]
+        open_rooms.pop(room_id, None)
+        if not open_rooms:
+            del self._open_by_variant[open_variant]
+
+    def open_rooms(self, variant: Optional[str] = None) -> List[Room]:
+        """Открытые столы (все или одного варианта) в порядке создания."""
+        if variant is not None:
+            rooms = list(self._open_by_variant.get(variant, {}).values())
+        else:
+            rooms = [room for group in self._open_by_variant.values() for room in group.values()]
+        rooms.sort(key=lambda room: room.seq)
+        return rooms
 
 
-ROOMS: Dict[str, Room] = {}
+ROOMS: RoomRegistry = RoomRegistry()
 
 
 def list_variants() -> List[GameVariant]:
@@ -912,20 +1564,7 @@ def list_variants() -> List[GameVariant]:
 
 
 def list_rooms_summary():
-    res = []
-    for r in ROOMS.values():
-        payload = {
-            "room_id": r.id,
-            "name": r.name,
-            "variant": r.variant.model_dump(),
-            "players": len(r.players),
-            "players_max": r.config.max_players if r.config else r.variant.players_max,
-            "started": r.started,
-        }
-        if r.config:
-            payload["config"] = r.config.model_dump(by_alias=True)
-        res.append(payload)
-    return res
+    return [r.lobby_entry() for r in ROOMS.values()]
 
 
 VARIANTS: Dict[str, GameVariant] = {
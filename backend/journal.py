@@ -0,0 +1,242 @@
+"""Журнал комнат на диске: восстановление партий после перезапуска.
+
+После каждой пачки команд актора (см. ``commit_room`` в main.py) в журнал
+попадает образ комнаты (``Room.snapshot()``) с её версией, при удалении
+комнаты - запись об удалении. Команды не журналируются как есть: раздача
+и таймеры зависят от случайности и часов, поэтому повтор команд не
+воспроизвёл бы партию, а образ после пачки воспроизводит её точно.
+
+Запись не стоит на пути хода: ``record`` только отмечает комнату
+изменённой. Раз в ``group_window`` цикл событий снимает образ каждой
+отмеченной комнаты (несколько изменений за окно дают один образ; снимать
+его можно только здесь - комнаты меняются в цикле событий) и кладёт в
+буфер, а отдельный поток-писатель кодирует накопившиеся записи, дописывает
+их в ``journal.jsonl`` и делает один ``fsync`` на группу (group commit). Раз в
+``snapshot_interval`` секунд (или когда журнал вырос больше
+``snapshot_bytes``) писатель сохраняет компактный снимок - последний образ
+каждой живой комнаты - в ``snapshot.jsonl`` и начинает журнал заново.
+
+При старте ``open()`` читает снимок, затем журнал (записи со старой
+версией пропускаются, оборванная последняя строка игнорируется) и
+возвращает образы комнат. Журнал включается переменной ``BURA_JOURNAL_DIR``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from encoding import dumps_bytes
+from game import Room
+
+JOURNAL_FILE = "journal.jsonl"
+SNAPSHOT_FILE = "snapshot.jsonl"
+
+
+class RoomJournal:
+    # Сколько секунд писатель ждёт, собирая группу записей перед fsync
+    group_window = 0.005
+    # Как часто журнал сворачивается в снимок, секунд
+    snapshot_interval = 60.0
+    # Размер журнала, после которого снимок делается раньше срока
+    snapshot_bytes = 64 * 1024 * 1024
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.enabled = directory is not None
+        self._pending: List[dict] = []
+        # Комнаты, изменившиеся с последнего снятия образов (см. _collect)
+        self._dirty: Dict[str, Room] = {}
+        self._collect_handle: Optional[asyncio.TimerHandle] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._writing = False
+        self._thread: Optional[threading.Thread] = None
+        # Последний закодированный образ каждой живой комнаты - из них состоит снимок
+        self._latest: Dict[str, bytes] = {}
+        self._journal = None
+        self._journal_size = 0
+        self._snapshot_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Цикл событий
+    # ------------------------------------------------------------------
+    def record(self, room: Room):
+        """Отметить комнату изменённой; образ снимет ``_collect`` в конце окна."""
+        if not self.enabled:
+            return
+        self._dirty[room.id] = room
+        if self._collect_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне цикла событий (утилиты, тесты) образ снимается сразу
+            self._collect()
+            return
+        self._collect_handle = loop.call_later(self.group_window, self._collect)
+
+    def removed(self, room_id: str):
+        if self.enabled:
+            # Не снятый ещё образ удалённой комнаты писать незачем
+            self._dirty.pop(room_id, None)
+            self._push([{"room_id": room_id, "deleted": True}])
+
+    def _collect(self):
+        """Снять образы комнат, изменившихся за окно, и отдать их писателю."""
+        if self._collect_handle is not None:
+            self._collect_handle.cancel()
+            self._collect_handle = None
+        dirty, self._dirty = self._dirty, {}
+        if dirty:
+            self._push(
+                [{"room_id": room_id, "version": room.version, "room": room.snapshot()} for room_id, room in dirty.items()]
+            )
+
+    def _push(self, records: List[dict]):
+        with self._cond:
+            self._pending.extend(records)
+            self._cond.notify()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться, пока всё записанное окажется на диске."""
+        self._collect()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._writing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ------------------------------------------------------------------
+    # Старт и остановка
+    # ------------------------------------------------------------------
+    def open(self) -> List[dict]:
+        """Прочитать снимок и журнал, запустить писателя; вернуть образы комнат."""
+        if not self.enabled:
+            return []
+        os.makedirs(self.directory, exist_ok=True)
+        images: Dict[str, dict] = {}
+        for name in (SNAPSHOT_FILE, JOURNAL_FILE):
+            for record in self._read(os.path.join(self.directory, name)):
+                room_id = record["room_id"]
+                if record.get("deleted"):
+                    images.pop(room_id, None)
+                    self._latest.pop(room_id, None)
+                    continue
+                current = images.get(room_id)
+                if current is not None and current["version"] > record["version"]:
+                    continue
+                images[room_id] = record
+                self._latest[room_id] = dumps_bytes(record)
+        # Восстановленное состояние сразу сворачивается в новый снимок
+        self._write_snapshot()
+        self._thread = threading.Thread(target=self._run, name="room-journal", daemon=True)
+        self._thread.start()
+        return [images[room_id]["room"] for room_id in images]
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._collect()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+        self._journal.close()
+
+    @staticmethod
+    def _read(path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Оборванная запись в конце журнала (сбой посреди записи)
+                    print(f"[Journal] Skipping torn record in {path}")
+                    return
+
+    # ------------------------------------------------------------------
+    # Поток-писатель
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed and not self._snapshot_due():
+                    # Пустой журнал сворачивать незачем - ждём только записей
+                    self._cond.wait(self._until_snapshot() if self._journal_size else None)
+                if self._closed and not self._pending:
+                    return
+            if self._pending:
+                # Группа: всё, что пришло за окно, уходит на диск одним fsync
+                time.sleep(self.group_window)
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._writing = True
+            try:
+                if batch:
+                    self._append(batch)
+                if self._snapshot_due():
+                    self._write_snapshot()
+            except OSError as exc:
+                print(f"[Journal] Write failed: {exc!r}")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _until_snapshot(self) -> float:
+        return max(0.0, self._snapshot_at + self.snapshot_interval - time.monotonic())
+
+    def _snapshot_due(self) -> bool:
+        return self._journal_size > 0 and (
+            self._journal_size >= self.snapshot_bytes or self._until_snapshot() == 0.0
+        )
+
+    def _append(self, batch: List[dict]):
+        lines = []
+        for record in batch:
+            line = dumps_bytes(record)
+            if record.get("deleted"):
+                self._latest.pop(record["room_id"], None)
+            else:
+                self._latest[record["room_id"]] = line
+            lines.append(line + b"\n")
+        data = b"".join(lines)
+        self._journal.write(data)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal_size += len(data)
+
+    def _write_snapshot(self):
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            for line in self._latest.values():
+                fh.write(line + b"\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+        self._fsync_dir()
+        # Снимок на диске - журнал можно начать заново
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(os.path.join(self.directory, JOURNAL_FILE), "wb")
+        os.fsync(self._journal.fileno())
+        self._journal_size = 0
+        self._snapshot_at = time.monotonic()
+
+    def _fsync_dir(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
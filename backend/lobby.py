@@ -0,0 +1,95 @@
+"""Фильтры, инкрементальные события и постраничная выдача списка комнат.
+
+Подписчик ``/ws/lobby?mode=events`` получает снимок ``{"type": "rooms", ...}``,
+а затем только изменения:
+
+* ``{"type": "room_added", "payload": {...}}`` - комната появилась или стала
+  подходить под фильтр;
+* ``{"type": "room_updated", "payload": {...}}`` - изменилась запись комнаты;
+* ``{"type": "room_removed", "room_id": "..."}`` - комната удалена или
+  перестала подходить под фильтр.
+
+Фильтры (``variant``, ``free_seats``, ``not_started``) одинаковы для
+WebSocket и ``GET /api/rooms``.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from game import Room
+
+# (room_id, запись до изменения, запись после); None - комнаты не было / больше нет
+RoomChange = Tuple[str, Optional[dict], Optional[dict]]
+
+
+@dataclass(frozen=True)
+class LobbyFilter:
+    variant: Optional[str] = None
+    free_seats: bool = False
+    not_started: bool = False
+
+    def matches(self, entry: Optional[dict]) -> bool:
+        if entry is None:
+            return False
+        if self.variant is not None and entry["variant"]["key"] != self.variant:
+            return False
+        if self.free_seats and entry["players"] >= entry["players_max"]:
+            return False
+        if self.not_started and entry["started"]:
+            return False
+        return True
+
+    def apply(self, entries: Iterable[dict]) -> List[dict]:
+        return [entry for entry in entries if self.matches(entry)]
+
+    def events(self, changes: Iterable[RoomChange]) -> List[dict]:
+        """События лобби для подписчика с этим фильтром."""
+        events: List[dict] = []
+        for room_id, old, new in changes:
+            was, now = self.matches(old), self.matches(new)
+            if now:
+                events.append({"type": "room_updated" if was else "room_added", "payload": new})
+            elif was:
+                events.append({"type": "room_removed", "room_id": room_id})
+        return events
+
+
+def room_changes(old: Dict[str, dict], new: Dict[str, dict]) -> List[RoomChange]:
+    """Изменения между двумя снимками ``room_id -> запись``."""
+    changes: List[RoomChange] = []
+    for room_id, entry in new.items():
+        previous = old.get(room_id)
+        if previous is not entry and previous != entry:
+            changes.append((room_id, previous, entry))
+    for room_id, entry in old.items():
+        if room_id not in new:
+            changes.append((room_id, entry, None))
+    return changes
+
+
+def page_rooms(
+    rooms: Iterable[Room],
+    lobby_filter: LobbyFilter,
+    *,
+    cursor: Optional[int] = None,
+    limit: int,
+) -> Tuple[List[dict], Optional[int]]:
+    """Страница комнат в порядке создания и курсор следующей страницы.
+
+    Курсор - порядковый номер ``Room.seq`` последней выданной комнаты, поэтому
+    удаление комнат между запросами не сдвигает страницы.
+    """
+    page: List[dict] = []
+    page_cursor = cursor
+    for room in rooms:
+        if cursor is not None and room.seq <= cursor:
+            continue
+        entry = room.lobby_entry()
+        if not lobby_filter.matches(entry):
+            continue
+        if len(page) == limit:
+            return page, page_cursor
+        page.append(entry)
+        page_cursor = room.seq
+    return page, None
@@ -2,10 +2,9 @@ from __future__ import annotations
 
 import os
 import json
-import uuid
 import time
 import asyncio
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple
 
 from fastapi import (
     FastAPI,
@@ -13,15 +12,46 @@ from fastapi import (
     WebSocketDisconnect,
     Header,
     Query,
+    Depends,
     HTTPException,
     Form,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 
 from models import CreateGameRequest, JoinGameRequest, Player, GameVariant, TableConfig
-from game import ROOMS, Room, list_variants, VARIANTS, list_rooms_summary
+from game import (
+    CARD_CATALOG_PAYLOAD,
+    CARD_CATALOG_VERSION,
+    ROOMS,
+    Room,
+    StateFormat,
+    VARIANTS,
+    list_rooms_summary,
+    list_variants,
+)
+from actor import RoomActors
 from auth import verify_init_data
+from cluster import Cluster
+from commands import Command, Declare, PlayCards, RequestEarlyTurn, decode_command
+from delta import DeltaSession
+from journal import RoomJournal
+from reaper import RoomReaper
+from lobby import LobbyFilter, page_rooms, room_changes
+from outbox import STATE_KEY, Outbox
+from scheduler import RoomTimers, TimingWheel
+from sharding import STATE_LONG_POLL_MAX_SEC, new_room_id, shard_config_from_env
+from store import store_from_env
+from encoding import (
+    FastJSONResponse,
+    dumps,
+    negotiate_subprotocol,
+    pack,
+    pack_items,
+    pack_map_header,
+    unpack,
+)
 from database import init_database, get_leaderboard, get_player_stats, get_player_history
 
 # ---------- CORS with multiple origins ----------
@@ -35,17 +65,23 @@ def _parse_origins(raw: str) -> list[str]:
 ORIGIN_ENV = os.getenv("ORIGIN", "")
 ALLOWED_ORIGINS = ["http://localhost:5173"] + _parse_origins(ORIGIN_ENV)
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=["ETag", "X-Room-Version", "X-Next-Cursor"],
 )
 
 print("[CORS] allow_origins:", ALLOWED_ORIGINS)
 
+# Шардированный режим: этот процесс владеет частью комнат (см. sharding.py)
+SHARD = shard_config_from_env()
+if SHARD is not None:
+    print(f"[Shard] worker {SHARD.index} of {len(SHARD.urls)}")
+
 # ---------- API models ----------
 class VerifyResult(BaseModel):
     ok: bool
@@ -58,9 +94,43 @@ class VerifyResult(BaseModel):
 async def variants():
     return [v.model_dump() for v in list_variants()]
 
+# Максимальный размер страницы GET /api/rooms
+ROOMS_PAGE_MAX = 100
+
+
+def _lobby_filter(
+    variant: Optional[str] = Query(None),
+    free_seats: bool = Query(False),
+    not_started: bool = Query(False),
+) -> LobbyFilter:
+    return LobbyFilter(variant=variant, free_seats=free_seats, not_started=not_started)
+
+
 @app.get("/api/rooms")
-async def rooms():
-    return list_rooms_summary()
+async def rooms(
+    response: Response,
+    lobby_filter: LobbyFilter = Depends(_lobby_filter),
+    cursor: Optional[int] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=ROOMS_PAGE_MAX),
+):
+    """Список комнат с фильтрами лобби.
+
+    С ``limit`` или ``cursor`` отдаёт одну страницу; курсор следующей
+    страницы приходит в заголовке ``X-Next-Cursor``.
+    """
+    if lobby_filter.free_seats and lobby_filter.not_started:
+        # Открытые столы берутся из индекса реестра, без обхода всех комнат
+        candidates = ROOMS.open_rooms(lobby_filter.variant)
+    else:
+        candidates = ROOMS.values()
+    if cursor is None and limit is None:
+        entries = [room.lobby_entry() for room in candidates]
+        # Комнаты других узлов кластера (страницы листают только свои)
+        return lobby_filter.apply(entries + cluster.remote_entries())
+    page, next_cursor = page_rooms(candidates, lobby_filter, cursor=cursor, limit=limit or ROOMS_PAGE_MAX)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return page
 
 @app.post("/api/auth/verify")
 async def auth_verify(init_data: str = Form(...)):
@@ -90,10 +160,12 @@ async def create_game(
             players_max=config.max_players,
             description="Игра с настраиваемыми параметрами",
         )
-    room_id = str(uuid.uuid4())[:8]
+    room_id = new_room_id(SHARD.owns) if SHARD is not None else new_room_id()
     r = Room(room_id, req.room_name, variant, config)
-    ROOMS[room_id] = r
+    # Комната ещё никому не видна, поэтому создатель садится без актора
     r.add_player(Player(id=x_user_id, name=x_user_name, avatar_url=x_user_avatar))
+    ROOMS[room_id] = r
+    await commit_room(r)
     await broadcast_lobby()
     return {"room_id": room_id}
 
@@ -104,17 +176,16 @@ async def join_game(
     x_user_name: str = Header("Player"),
     x_user_avatar: str = Header(""),
 ):
-    r = ROOMS.get(req.room_id)
-    if not r:
+    player = Player(id=x_user_id, name=x_user_name, avatar_url=x_user_avatar)
+    try:
+        await room_command(req.room_id, {"type": "join", "player": player.model_dump()}, client=False)
+    except LookupError:
         return {"error": "room_not_found"}
-    r.add_player(Player(id=x_user_id, name=x_user_name, avatar_url=x_user_avatar))
-    await broadcast_room(req.room_id)
-    await broadcast_lobby()
     return {"ok": True}
 
 
-def _get_room_or_404(room_id: str) -> Room:
-    room = ROOMS.get(room_id)
+async def _get_room_or_404(room_id: str) -> Room:
+    room = ROOMS.get(room_id) or await cluster.replica(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="room_not_found")
     return room
@@ -122,21 +193,83 @@ def _get_room_or_404(room_id: str) -> Room:
 
 @app.post("/api/game/start/{room_id}")
 async def start_game(room_id: str):
-    room = _get_room_or_404(room_id)
-    room.start()
-    await broadcast_room(room_id)
+    try:
+        await room_command(room_id, {"type": "start"}, client=False)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="room_not_found")
     return {"ok": True}
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
 @app.get("/api/game/state/{room_id}")
-async def game_state(room_id: str, x_user_id: Optional[str] = Header(None)):
-    r = _get_room_or_404(room_id)
-    state = r.to_state(x_user_id)
-    # Помечаем отключенных игроков
-    for player in state.players:
-        if hub.is_player_disconnected(room_id, player.id):
-            player.disconnected = True
-    return state.model_dump(by_alias=True)
+async def game_state(
+    room_id: str,
+    x_user_id: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    fmt: Literal["full", "compact"] = Query("full", alias="format"),
+    since: Optional[int] = Query(None),
+    wait: float = Query(0.0, ge=0),
+):
+    """Состояние комнаты для игрока ``x-user-id``.
+
+    Ответ помечается слабым ETag по версии комнаты (таймеры хода в нём не
+    учитываются) и отвечает 304 на совпадающий ``If-None-Match``. С
+    ``?since=<version>&wait=<sec>`` запрос ждёт изменения комнаты после
+    указанной версии и отвечает 304, если за ``wait`` секунд ничего не изменилось.
+    """
+    r = await _get_room_or_404(room_id)
+    if since is not None and wait > 0 and r.version <= since:
+        timeout = min(wait, STATE_LONG_POLL_MAX_SEC)
+        if ROOMS.get(room_id) is r:
+            await r.wait_for_change(since, timeout)
+        else:
+            # Реплику чужой комнаты никто не трогает - ждём события владельца
+            await cluster.wait_for_change(room_id, since, timeout)
+        # Реплика при обновлении заменяется новой, поэтому комната берётся заново
+        r = await _get_room_or_404(room_id)
+    changed = since is None or r.version > since
+
+    etag = f'W/"{r.version}-{fmt}"'
+    headers = {"ETag": etag, "X-Room-Version": str(r.version), "Vary": "X-User-Id"}
+    if not changed or _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    payload = hub.mark_disconnected(room_id, r.state_payload(x_user_id, fmt))
+    return FastJSONResponse(payload, headers=headers)
+
+
+@app.get("/api/game/moves/{room_id}")
+async def game_moves(
+    room_id: str,
+    x_user_id: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Допустимые ходы игрока ``x-user-id`` с предсказанным исходом.
+
+    Список строит ``Room.legal_moves`` и кэширует по версии комнаты; ETag тот
+    же, что у состояния, поэтому запрос повторяют только после изменения.
+    """
+    r = await _get_room_or_404(room_id)
+    etag = f'W/"{r.version}-moves"'
+    headers = {"ETag": etag, "X-Room-Version": str(r.version), "Vary": "X-User-Id"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(r.moves_payload(x_user_id), headers=headers)
+
+
+@app.get("/api/cards/catalog")
+async def cards_catalog(if_none_match: Optional[str] = Header(None)):
+    """Каталог 36 карт для компактного формата состояния (карты по id)."""
+    etag = f'"{CARD_CATALOG_VERSION}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(CARD_CATALOG_PAYLOAD, headers=headers)
 
 
 # ---------- Players API ----------
@@ -163,232 +296,783 @@ async def player_history(player_id: str, limit: int = 20):
     return {"matches": history}
 
 # ---------- WebSockets hub ----------
+# Начало сообщения {"type": "state", "payload": <map>} в MessagePack
+_MSGPACK_STATE_HEAD = pack_map_header(2) + pack("type") + pack("state") + pack("payload")
+
+
+def _splice_object(head: str, tail_json: str) -> str:
+    """Склеивает открытый JSON-объект ``head`` (без ``}``) с полями объекта ``tail_json``."""
+    if tail_json == "{}":
+        return head + "}}"
+    return head + "," + tail_json[1:] + "}"
+
+
 class Hub:
-    def __init__(self):
-        self.rooms: Dict[str, List[WebSocket]] = {}
-        self.lobby: List[WebSocket] = []
+    def __init__(self, timers: Optional[TimingWheel] = None):
+        # Колесо таймеров для сроков переподключения (общее с комнатами)
+        self.timers = timers if timers is not None else TimingWheel()
+        # Сокеты комнаты и лобби; словари используются как упорядоченные множества
+        self.rooms: Dict[str, Dict[WebSocket, None]] = {}
+        self.lobby: Dict[WebSocket, None] = {}
         self.ws_player: Dict[WebSocket, str] = {}
         self.ws_room: Dict[WebSocket, str] = {}
-        # Отслеживание отключенных игроков: (room_id, player_id) -> timestamp отключения
-        self.disconnected_players: Dict[Tuple[str, str], float] = {}
+        # Соединения в delta-режиме (см. delta.py)
+        self.ws_delta: Dict[WebSocket, DeltaSession] = {}
+        # Формат состояния для соединения: "full" (по умолчанию) или "compact"
+        self.ws_format: Dict[WebSocket, StateFormat] = {}
+        # Соединения с подпротоколом MessagePack (остальные говорят JSON)
+        self.ws_msgpack: Set[WebSocket] = set()
+        # Исходящие очереди соединений (см. outbox.py): рассылка не ждёт отправки
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        # Подписка лобби: фильтр и режим событий (см. lobby.py)
+        self.lobby_subs: Dict[WebSocket, Tuple[LobbyFilter, bool]] = {}
+        # Отложенная рассылка лобби, снимок последней рассылки (room_id -> запись)
+        # и кэш закодированных списков комнат по (фильтр, двоичный протокол)
+        self._lobby_flush: Optional[asyncio.Task] = None
+        self._lobby_pushed: Optional[Dict[str, dict]] = None
+        self._lobby_rooms: Optional[List[dict]] = None
+        self._lobby_frames: Dict[Tuple[LobbyFilter, bool], str | bytes] = {}
+        # Отфильтрованные списки: один на фильтр для JSON- и MessagePack-кадров
+        self._lobby_payloads: Dict[LobbyFilter, List[dict]] = {}
+        # Отслеживание отключенных игроков: room_id -> {player_id: timestamp отключения};
+        # срок переподключения каждого - таймер ("reconnect", room_id, player_id)
+        self.disconnected_players: Dict[str, Dict[str, float]] = {}
         # Константа таймаута переподключения (30 секунд)
         self.reconnect_timeout_sec = 30.0
 
-    async def connect_room(self, room_id: str, player_id: str, ws: WebSocket):
-        await ws.accept()
+    async def connect_room(
+        self,
+        room_id: str,
+        player_id: str,
+        ws: WebSocket,
+        *,
+        delta: bool = False,
+        fmt: StateFormat = "full",
+    ):
+        await self.accept(ws)
+        if ws in self.ws_msgpack:
+            # Двоичный протокол всегда передаёт карты по id
+            fmt = "compact"
+        if delta:
+            self.ws_delta[ws] = DeltaSession()
+        if fmt != "full":
+            self.ws_format[ws] = fmt
+
+        self.rooms.setdefault(room_id, {})[ws] = None
+        self.ws_player[ws] = player_id
+        self.ws_room[ws] = room_id
+        try:
+            await room_command(room_id, {"type": "player_returned", "player_id": player_id}, client=False)
+        except LookupError:
+            pass
 
+    def _player_returned(self, room: Room, player_id: str):
+        room_id = room.id
+        changed = False
         # Проверяем, был ли игрок отключен (по текущему ID)
-        disconnect_key = (room_id, player_id)
-        if disconnect_key in self.disconnected_players:
+        if self._clear_disconnected(room_id, player_id):
             # Игрок переподключается - восстанавливаем его
-            del self.disconnected_players[disconnect_key]
+            changed = True
             print(f"[Reconnect] Player {player_id} reconnected to room {room_id} (same ID)")
 
         # Также проверяем переподключение по старому ID (если игрок переподключается с новым ID)
         # Это происходит когда игрок переподключается после перезагрузки страницы
         # В этом случае add_player уже обновил ID игрока, но в disconnected_players остался старый ID
-        if room_id in ROOMS:
-            room = ROOMS[room_id]
+        room_disconnected = self.disconnected_players.get(room_id)
+        if room_disconnected:
             # Ищем других отключенных игроков в этой комнате
             # Если игрок переподключился с новым ID, старый ключ нужно удалить
-            keys_to_remove = []
-            for (r_id, old_player_id), disconnect_time in self.disconnected_players.items():
-                if r_id == room_id and old_player_id != player_id:
-                    # Проверяем, есть ли игрок с таким ID в комнате
-                    if not any(p.id == old_player_id for p in room.players):
-                        # Старый ID больше не используется - удаляем из disconnected_players
-                        keys_to_remove.append((r_id, old_player_id))
-                        print(f"[Reconnect] Removing stale disconnect entry for {old_player_id} in room {r_id}")
-
-            for key in keys_to_remove:
-                del self.disconnected_players[key]
-
-        self.rooms.setdefault(room_id, []).append(ws)
-        self.ws_player[ws] = player_id
-        self.ws_room[ws] = room_id
+            stale = [
+                old_player_id
+                for old_player_id in room_disconnected
+                if old_player_id != player_id and room.player(old_player_id) is None
+            ]
+            for old_player_id in stale:
+                # Старый ID больше не используется - удаляем из disconnected_players
+                print(f"[Reconnect] Removing stale disconnect entry for {old_player_id} in room {room_id}")
+                self._clear_disconnected(room_id, old_player_id)
+                changed = True
+        if changed:
+            # Флаги отключения входят в состояние, поэтому меняют версию комнаты
+            room.touch()
 
     async def disconnect(self, ws: WebSocket):
         pid = self.ws_player.pop(ws, None)
         rid = self.ws_room.pop(ws, None)
-        if rid and ws in self.rooms.get(rid, []):
-            self.rooms[rid].remove(ws)
-
-        if rid and pid and rid in ROOMS:
-            room = ROOMS[rid]
-            # Проверяем, началась ли игра
-            if room.started:
-                # Если игра началась, даем 30 секунд на переподключение
-                disconnect_key = (rid, pid)
-                self.disconnected_players[disconnect_key] = time.time()
-                print(f"[Reconnect] Player {pid} disconnected from room {rid}, waiting {self.reconnect_timeout_sec}s for reconnection")
-                await broadcast_room_safe(rid)
-            else:
-                # Если игра не началась, удаляем игрока сразу
-                room.remove_player(pid)
-                if len(room.players) == 0:
-                    # авто-удаление пустой комнаты
-                    ROOMS.pop(rid, None)
-                await broadcast_room_safe(rid)
-                await broadcast_lobby()
-
-    async def cleanup_disconnected_players(self):
-        """Фоновая задача для удаления игроков, которые не переподключились за 30 секунд"""
-        while True:
+        self.ws_delta.pop(ws, None)
+        self.ws_format.pop(ws, None)
+        self.ws_msgpack.discard(ws)
+        self._close_outbox(ws)
+        if rid is not None:
+            self._discard_socket(self.rooms, rid, ws)
+
+        if rid and pid:
             try:
-                await asyncio.sleep(5)  # Проверяем каждые 5 секунд
-                current_time = time.time()
-                to_remove = []
-
-                for (room_id, player_id), disconnect_time in self.disconnected_players.items():
-                    if current_time - disconnect_time > self.reconnect_timeout_sec:
-                        to_remove.append((room_id, player_id))
-
-                for room_id, player_id in to_remove:
-                    del self.disconnected_players[(room_id, player_id)]
-                    if room_id in ROOMS:
-                        print(f"[Reconnect] Player {player_id} timeout, removing from room {room_id}")
-                        ROOMS[room_id].remove_player(player_id)
-                        if len(ROOMS[room_id].players) == 0:
-                            ROOMS.pop(room_id, None)
-                        await broadcast_room_safe(room_id)
-                        await broadcast_lobby()
-            except Exception as e:
-                print(f"[Reconnect] Error in cleanup task: {e}")
+                await room_command(rid, {"type": "player_left", "player_id": pid}, client=False)
+            except LookupError:
+                pass
+        if rid is not None and rid not in self.rooms:
+            # На узле больше никто не смотрит чужую комнату
+            cluster.drop_replica(rid)
+
+    async def _player_left(self, room: Room, pid: str):
+        # Проверяем, началась ли игра
+        if room.started:
+            # Если игра началась, даем 30 секунд на переподключение
+            self._mark_disconnected(room.id, pid)
+            room.touch()
+            print(f"[Reconnect] Player {pid} disconnected from room {room.id}, waiting {self.reconnect_timeout_sec}s for reconnection")
+        else:
+            # Если игра не началась, удаляем игрока сразу
+            room.remove_player(pid)
+            if len(room.players) == 0:
+                # авто-удаление пустой комнаты
+                ROOMS.pop(room.id, None)
+            await broadcast_lobby()
+
+    @staticmethod
+    def _discard_socket(index: Dict[str, Dict[WebSocket, None]], key: str, ws: WebSocket):
+        sockets = index.get(key)
+        if sockets is not None:
+            sockets.pop(ws, None)
+            if not sockets:
+                del index[key]
+
+    def _mark_disconnected(self, room_id: str, player_id: str):
+        self.disconnected_players.setdefault(room_id, {})[player_id] = time.time()
+        self.timers.arm(
+            ("reconnect", room_id, player_id),
+            self.reconnect_timeout_sec,
+            lambda: self.reconnect_expired(room_id, player_id),
+        )
+
+    def _clear_disconnected(self, room_id: str, player_id: str) -> bool:
+        room_disconnected = self.disconnected_players.get(room_id)
+        if not room_disconnected or player_id not in room_disconnected:
+            return False
+        del room_disconnected[player_id]
+        if not room_disconnected:
+            del self.disconnected_players[room_id]
+        self.timers.cancel(("reconnect", room_id, player_id))
+        return True
+
+    async def reconnect_expired(self, room_id: str, player_id: str):
+        """Игрок не переподключился за ``reconnect_timeout_sec`` - убираем его из комнаты."""
+        room = ROOMS.get(room_id)
+        if room is None:
+            self._clear_disconnected(room_id, player_id)
+            return
+        try:
+            await actors.submit(room, lambda r: self._reconnect_timed_out(r, player_id))
+        except LookupError:
+            self._clear_disconnected(room_id, player_id)
+
+    async def _reconnect_timed_out(self, room: Room, player_id: str):
+        # Игрок мог переподключиться, пока команда ждала в ящике
+        if not self._clear_disconnected(room.id, player_id):
+            return
+        print(f"[Reconnect] Player {player_id} timeout, removing from room {room.id}")
+        room.remove_player(player_id)
+        if len(room.players) == 0:
+            ROOMS.pop(room.id, None)
+        await broadcast_lobby()
 
     def is_player_disconnected(self, room_id: str, player_id: str) -> bool:
         """Проверяет, отключен ли игрок"""
-        return (room_id, player_id) in self.disconnected_players
+        return player_id in self.disconnected_players.get(room_id, ())
 
-    async def connect_lobby(self, ws: WebSocket):
-        await ws.accept()
-        self.lobby.append(ws)
+    def mark_disconnected(self, room_id: str, payload: dict) -> dict:
+        """Помечает отключенных игроков в сериализованном состоянии.
 
-    async def send_room_state(self, room_id: str):
-        room = ROOMS.get(room_id)
+        Кэшированные словари комнаты не изменяются: затронутые записи копируются.
+        """
+        # У реплики чужой комнаты флаги приходят от узла-владельца
+        disconnected = self.disconnected_players.get(room_id) or cluster.disconnected_of(room_id)
+        if not disconnected:
+            return payload
+
+        def _flag(player: dict) -> dict:
+            if player["id"] in disconnected:
+                return {**player, "disconnected": True}
+            return player
+
+        players = payload.get("players")
+        if players and any(p["id"] in disconnected for p in players):
+            payload = {**payload, "players": [_flag(p) for p in players]}
+        me = payload.get("me")
+        if me and me["id"] in disconnected:
+            payload = {**payload, "me": _flag(me)}
+        return payload
+
+    async def accept(self, ws: WebSocket):
+        """Принимает соединение, согласуя подпротокол из ``Sec-WebSocket-Protocol``."""
+        subprotocol = negotiate_subprotocol(ws.scope.get("subprotocols", []))
+        await ws.accept(subprotocol=subprotocol)
+        if subprotocol is not None:
+            self.ws_msgpack.add(ws)
+        self.outboxes[ws] = Outbox(ws, self.evict)
+
+    async def connect_lobby(
+        self,
+        ws: WebSocket,
+        *,
+        lobby_filter: LobbyFilter = LobbyFilter(),
+        events: bool = False,
+    ):
+        await self.accept(ws)
+        self.lobby[ws] = None
+        self.lobby_subs[ws] = (lobby_filter, events)
+        if self._lobby_pushed is None:
+            self._lobby_pushed = {entry["room_id"]: entry for entry in lobby_rooms()}
+
+    def disconnect_lobby(self, ws: WebSocket):
+        self.lobby.pop(ws, None)
+        self.lobby_subs.pop(ws, None)
+        self.ws_msgpack.discard(ws)
+        self._close_outbox(ws)
+
+    def _close_outbox(self, ws: WebSocket):
+        outbox = self.outboxes.pop(ws, None)
+        if outbox is not None:
+            outbox.close()
+
+    async def evict(self, ws: WebSocket):
+        """Отключает соединение, которое не успевает принимать сообщения."""
+        print(f"[Hub] Evicting stalled connection (room={self.ws_room.get(ws)}, player={self.ws_player.get(ws)})")
+        await self._close(ws, 1013)
+
+    async def drop_room(self, room_id: str):
+        """Убирает следы удалённой комнаты: сроки переподключения и её сокеты."""
+        for player_id in self.disconnected_players.pop(room_id, {}):
+            self.timers.cancel(("reconnect", room_id, player_id))
+        sockets = list(self.rooms.get(room_id, ()))
+        if sockets:
+            await asyncio.gather(*(self._close(ws, 1008, "room_closed") for ws in sockets))
+
+    async def _close(self, ws: WebSocket, code: int, reason: str = ""):
+        if ws in self.ws_room:
+            await self.disconnect(ws)
+        else:
+            self.disconnect_lobby(ws)
+        try:
+            await asyncio.wait_for(ws.close(code=code, reason=reason), timeout=1.0)
+        except Exception:
+            pass
+
+    def encode(self, ws: WebSocket, message: dict) -> str | bytes:
+        return pack(message) if ws in self.ws_msgpack else dumps(message)
+
+    def send_message(self, ws: WebSocket, message: dict):
+        self._enqueue(ws, self.encode(ws, message))
+
+    def _enqueue(self, ws: WebSocket, frame: str | bytes, *, key: Optional[str] = None):
+        outbox = self.outboxes.get(ws)
+        if outbox is not None:
+            outbox.push(frame, key=key)
+
+    async def receive_message(self, ws: WebSocket) -> dict:
+        """Входящая команда; ``ValueError``, если сообщение не разобрать."""
+        if ws not in self.outboxes:
+            # Соединение вытеснено, см. evict
+            raise WebSocketDisconnect(code=1013)
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(code=message.get("code", 1000), reason=message.get("reason"))
+        # Кадр не того вида (текст в MessagePack-соединении и наоборот) -
+        # такая же ошибка протокола, как испорченное сообщение
+        if ws in self.ws_msgpack:
+            if message.get("bytes") is None:
+                raise ValueError("Expected binary MessagePack frame")
+            data = unpack(message["bytes"])
+        else:
+            if message.get("text") is None:
+                raise ValueError("Expected text JSON frame")
+            data = json.loads(message["text"])
+        if not isinstance(data, dict):
+            raise ValueError("Malformed message")
+        return data
+
+    def ack_state(self, ws: WebSocket, seq: int):
+        session = self.ws_delta.get(ws)
+        if session is not None:
+            session.ack(seq)
+
+    async def resync_state(self, ws: WebSocket):
+        session = self.ws_delta.get(ws)
+        room_id = self.ws_room.get(ws)
+        if session is None or room_id is None:
+            return
+        session.request_full()
+        await self.send_room_state(room_id, only=ws)
+
+    async def send_room_state(self, room_id: str, *, only: Optional[WebSocket] = None):
+        """Раскладывает состояние комнаты по очередям соединений, не дожидаясь отправки."""
+        room = room_view(room_id)
         if not room:
             return
-        for ws in list(self.rooms.get(room_id, [])):
+        sockets = [only] if only is not None else list(self.rooms.get(room_id, []))
+        if not sockets:
+            return
+        # Общая часть кодируется один раз на рассылку (для каждого формата),
+        # каждому сокету дописывается только его приватная часть (me, hands, ...)
+        clocks = room.clocks_payload()
+        shared: Dict[str, dict] = {}
+        heads: Dict[str, str] = {}
+        private_json: Dict[Tuple[Optional[str], str], str] = {}
+        packed_shared: Dict[str, bytes] = {}
+        packed_private: Dict[Tuple[Optional[str], str], Tuple[int, bytes]] = {}
+
+        def shared_for(fmt: StateFormat) -> dict:
+            if fmt not in shared:
+                shared[fmt] = self.mark_disconnected(
+                    room_id, {**room.public_payload(fmt), "tablePlayers": clocks}
+                )
+            return shared[fmt]
+
+        for ws in sockets:
             player_id = self.ws_player.get(ws)
-            try:
-                state = room.to_state(player_id)
-                # Помечаем отключенных игроков
-                for player in state.players:
-                    if self.is_player_disconnected(room_id, player.id):
-                        player.disconnected = True
-                payload = state.model_dump(by_alias=True)
-                await ws.send_json({"type": "state", "payload": payload})
-            except RuntimeError:
-                pass
+            fmt = self.ws_format.get(ws, "full")
+            session = self.ws_delta.get(ws)
+            if session is not None:
+                private = self.mark_disconnected(room_id, room.viewer_payload(player_id, fmt))
+                message = session.next_message({**shared_for(fmt), **private})
+                if message is not None:
+                    # Патч считается от подтверждённой базы, поэтому неотправленный
+                    # патч можно заменить более новым; полный снимок - нельзя
+                    key = STATE_KEY if message["type"] == "patch" else None
+                    self._enqueue(ws, self.encode(ws, message), key=key)
+                continue
+            if ws in self.ws_msgpack:
+                if fmt not in packed_shared:
+                    packed_shared[fmt] = pack_items(shared_for(fmt))
+                key = (player_id, fmt)
+                if key not in packed_private:
+                    private = self.mark_disconnected(room_id, room.viewer_payload(player_id, fmt))
+                    packed_private[key] = (len(private), pack_items(private))
+                private_size, private_items = packed_private[key]
+                frame = (
+                    _MSGPACK_STATE_HEAD
+                    + pack_map_header(len(shared[fmt]) + private_size)
+                    + packed_shared[fmt]
+                    + private_items
+                )
+                self._enqueue(ws, frame, key=STATE_KEY)
+                continue
+            if fmt not in heads:
+                heads[fmt] = '{"type":"state","payload":' + dumps(shared_for(fmt))[:-1]
+            key = (player_id, fmt)
+            if key not in private_json:
+                private = self.mark_disconnected(room_id, room.viewer_payload(player_id, fmt))
+                private_json[key] = dumps(private)
+            self._enqueue(ws, _splice_object(heads[fmt], private_json[key]), key=STATE_KEY)
+
+    async def _broadcast(self, sockets: List[WebSocket], message: dict):
+        # Сообщение кодируется один раз на каждый используемый протокол
+        encoded: Dict[bool, str | bytes] = {}
+        for ws in sockets:
+            binary = ws in self.ws_msgpack
+            if binary not in encoded:
+                encoded[binary] = pack(message) if binary else dumps(message)
+            self._enqueue(ws, encoded[binary])
 
     async def send_room_event(self, room_id: str, message: dict):
-        for ws in list(self.rooms.get(room_id, [])):
-            try:
-                await ws.send_json(message)
-            except RuntimeError:
-                pass
+        await self._broadcast(list(self.rooms.get(room_id, [])), message)
+
+    def _set_lobby_rooms(self, rooms: List[dict]):
+        """Новый список комнат лобби; кадры ``rooms`` сбрасываются, только если он изменился."""
+        if rooms != self._lobby_rooms:
+            self._lobby_rooms = rooms
+            self._lobby_frames = {}
+            self._lobby_payloads = {}
+
+    def lobby_frame(self, lobby_filter: LobbyFilter, binary: bool) -> str | bytes:
+        """Закодированное сообщение ``rooms`` по последнему списку комнат.
 
-    async def send_lobby(self, message: dict):
+        Список обновляют ``send_lobby`` (раз за рассылку) и ``send_rooms``,
+        поэтому кадр кодируется один раз на фильтр и протокол.
+        """
+        if self._lobby_rooms is None:
+            self._set_lobby_rooms(lobby_rooms())
+        key = (lobby_filter, binary)
+        frame = self._lobby_frames.get(key)
+        if frame is None:
+            payload = self._lobby_payloads.get(lobby_filter)
+            if payload is None:
+                payload = self._lobby_payloads[lobby_filter] = lobby_filter.apply(self._lobby_rooms)
+            message = {"type": "rooms", "payload": payload}
+            frame = self._lobby_frames[key] = pack(message) if binary else dumps(message)
+        return frame
+
+    def send_rooms(self, ws: WebSocket):
+        """Начальный список комнат для подписчика лобби."""
+        lobby_filter, events = self.lobby_subs.get(ws, (LobbyFilter(), False))
+        if events:
+            # Снимок на момент последней рассылки: следующие события считаются от него
+            snapshot = lobby_filter.apply((self._lobby_pushed or {}).values())
+            self.send_message(ws, {"type": "rooms", "payload": snapshot})
+        else:
+            self._set_lobby_rooms(lobby_rooms())
+            self._enqueue(ws, self.lobby_frame(lobby_filter, ws in self.ws_msgpack), key=STATE_KEY)
+
+    def schedule_lobby(self):
+        """Запланировать рассылку лобби; изменения за окно собираются в одну."""
+        if self._lobby_flush is None or self._lobby_flush.done():
+            self._lobby_flush = asyncio.get_running_loop().create_task(self._flush_lobby())
+
+    async def _flush_lobby(self):
+        await asyncio.sleep(LOBBY_BROADCAST_DELAY_SEC)
+        self.send_lobby()
+
+    def send_lobby(self):
+        """Разослать изменения лобби с прошлой рассылки.
+
+        Подписчики в режиме событий получают только ``room_*`` события,
+        остальные - полный (отфильтрованный) список, если их часть изменилась.
+        События и кадры считаются один раз на фильтр и протокол.
+        """
+        rooms = lobby_rooms()
+        current = {entry["room_id"]: entry for entry in rooms}
+        changes = room_changes(self._lobby_pushed or {}, current)
+        self._lobby_pushed = current
+        if not changes:
+            return
+        # Список строится один раз на рассылку, кадры подписчиков берутся из кэша
+        self._set_lobby_rooms(rooms)
+        filter_events: Dict[LobbyFilter, List[dict]] = {}
+        event_frames: Dict[Tuple[LobbyFilter, bool], List[str | bytes]] = {}
         for ws in list(self.lobby):
-            try:
-                await ws.send_json(message)
-            except RuntimeError:
-                pass
+            lobby_filter, events = self.lobby_subs.get(ws, (LobbyFilter(), False))
+            if lobby_filter not in filter_events:
+                filter_events[lobby_filter] = lobby_filter.events(changes)
+            if not filter_events[lobby_filter]:
+                continue
+            binary = ws in self.ws_msgpack
+            if not events:
+                self._enqueue(ws, self.lobby_frame(lobby_filter, binary), key=STATE_KEY)
+                continue
+            key = (lobby_filter, binary)
+            if key not in event_frames:
+                encode = pack if binary else dumps
+                event_frames[key] = [encode(event) for event in filter_events[lobby_filter]]
+            for frame in event_frames[key]:
+                self._enqueue(ws, frame)
+
+# Окно, за которое изменения комнат собираются в одну рассылку лобби, секунд
+LOBBY_BROADCAST_DELAY_SEC = 0.1
+
+# Единое колесо таймеров: дедлайны комнат и сроки переподключения
+timers = TimingWheel()
 
 # Создаем hub
-hub = Hub()
+hub = Hub(timers)
 
 # Инициализация базы данных при старте
 @app.on_event("startup")
 async def startup_event():
     await init_database()
-    # Запускаем фоновую задачу для очистки отключенных игроков
-    asyncio.create_task(hub.cleanup_disconnected_players())
+    restore_rooms()
+    await cluster.start()
     print("[Main] Application started")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Дописать на диск всё, что ещё в буфере журнала
+    journal.close()
+
+
+def restore_rooms():
+    """Поднять комнаты из журнала после перезапуска (см. journal.py)."""
+    now = time.time()
+    for data in journal.open():
+        room = Room.restore(data)
+        # Пока сервер не работал, время хода не шло
+        room.shift_deadlines(now - data.get("saved_at", now))
+        ROOMS[room.id] = room
+        room_timers.arm(room)
+        reaper.track(room)
+        if room.started:
+            # Сокеты остались у прежнего процесса: игрокам даётся обычный
+            # срок на переподключение
+            for player in room.players:
+                hub._mark_disconnected(room.id, player.id)
+    if ROOMS:
+        print(f"[Main] Restored {len(ROOMS)} rooms from journal")
+
 # ---------- broadcasters ----------
 async def broadcast_room(room_id: str):
+    # Каждое изменение комнаты рассылается отсюда, поэтому здесь же
+    # перевзводится таймер её ближайшего дедлайна
+    room = ROOMS.get(room_id)
+    if room is not None:
+        room_timers.arm(room)
     await hub.send_room_state(room_id)
 
-async def broadcast_room_safe(room_id: Optional[str]):
-    if room_id and room_id in ROOMS:
-        await broadcast_room(room_id)
+
+async def fire_room_timers(room_id: str):
+    """Срабатывание дедлайна: штраф за таймаут хода, конец показа, новый раунд."""
+    room = ROOMS.get(room_id)
+    if room is None:
+        return
+    try:
+        await actors.submit(room, _advance_room_timers)
+    except LookupError:
+        pass
+
+
+def _advance_room_timers(room: Room):
+    version = room.version
+    room.advance_timers()
+    if room.version != version:
+        # Рассылку и новый таймер сделает commit_room
+        return
+    timer_at = room.next_timer_at()
+    if timer_at is not None and timer_at > time.time():
+        # Сработали чуть раньше дедлайна - ждём его снова
+        room_timers.arm(room)
+
+
+async def commit_room(room: Room):
+    """Итог пачки команд актора: одна рассылка на все изменения пачки."""
+    if ROOMS.get(room.id) is not room:
+        # Комната удалена (ушёл последний игрок или её убрал reaper) -
+        # актор, таймеры и записи хаба больше не нужны
+        room_timers.cancel(room.id)
+        reaper.forget(room.id)
+        actors.discard(room.id)
+        journal.removed(room.id)
+        await hub.drop_room(room.id)
+        await cluster.room_removed(room.id)
+        return
+    journal.record(room)
+    reaper.track(room)
+    await broadcast_room(room.id)
+    await cluster.room_committed(room, hub.disconnected_players.get(room.id, ()))
+
+
+room_timers = RoomTimers(timers, fire_room_timers)
+# Акторы комнат: все изменения комнат идут через их почтовые ящики (см. actor.py)
+actors = RoomActors(commit_room)
+# Журнал комнат на диске; без BURA_JOURNAL_DIR выключен
+journal = RoomJournal(os.getenv("BURA_JOURNAL_DIR"))
+
+
+async def evict_room(room_id: str, reason: str):
+    """Убрать комнату по решению reaper (простой, конец матча, лимит числа комнат)."""
+    room = ROOMS.get(room_id)
+    if room is None:
+        return
+    print(f"[Reaper] Evicting room {room_id} ({reason})")
+    try:
+        await actors.submit(room, _evict_room)
+    except LookupError:
+        pass
+
+
+async def _evict_room(room: Room):
+    ROOMS.pop(room.id, None)
+    # Удаление доводит до конца commit_room
+    room.touch()
+    await broadcast_lobby()
+
+
+# Сроки простоя комнат, секунд, и необязательный лимит числа комнат (0 - без лимита)
+reaper = RoomReaper(
+    ROOMS,
+    timers,
+    evict_room,
+    has_sockets=lambda room_id: room_id in hub.rooms,
+    lobby_ttl=float(os.getenv("BURA_ROOM_LOBBY_TTL", "1800")),
+    finished_ttl=float(os.getenv("BURA_ROOM_FINISHED_TTL", "600")),
+    orphan_ttl=float(os.getenv("BURA_ROOM_ORPHAN_TTL", "300")),
+    max_rooms=int(os.getenv("BURA_MAX_ROOMS", "0")),
+)
+
+
+# ---------- commands ----------
+def room_view(room_id: str) -> Optional[Room]:
+    """Своя комната или реплика чужой (только для чтения)."""
+    return ROOMS.get(room_id) or cluster.replicas.get(room_id)
+
+
+def lobby_rooms() -> List[dict]:
+    """Записи лобби: свои комнаты и комнаты других узлов кластера."""
+    rooms = list_rooms_summary()
+    if cluster.remote:
+        rooms.extend(cluster.remote_entries())
+    return rooms
+
+
+async def room_command(room_id: str, command: dict, *, client: bool = True, forward: bool = True) -> Any:
+    """Выполнить команду комнаты: через её актора или у узла-владельца.
+
+    ``client`` - команда пришла от игрока по WebSocket (``_room_command``),
+    иначе это служебная команда сервера (``_server_command``). Сообщение
+    игрока разбирается (см. commands.py) до пересылки и до актора, поэтому
+    испорченное сообщение сразу отклоняется ``ValueError``.
+    """
+    decoded = decode_command(command) if client else None
+    if client and decoded is None:
+        return None
+    room = ROOMS.get(room_id)
+    if room is None:
+        if not forward:
+            raise LookupError("room_not_found")
+        return await cluster.forward(room_id, {"client": client, "command": command})
+    if client:
+        fn = _room_command(room_id, decoded)
+    else:
+        fn = _server_command(command)
+    await actors.submit(room, fn)
+
+
+async def run_forwarded_command(room_id: str, envelope: dict) -> None:
+    """Команда, пересланная другим узлом кластера владельцу комнаты."""
+    await room_command(room_id, envelope["command"], client=envelope["client"], forward=False)
+
+
+def _server_command(command: dict):
+    kind = command["type"]
+    if kind == "join":
+        player = Player(**command["player"])
+
+        async def join(room: Room):
+            room.add_player(player)
+            await broadcast_lobby()
+
+        return join
+    if kind == "start":
+
+        async def start(room: Room):
+            room.start()
+            await broadcast_lobby()
+
+        return start
+    if kind == "player_left":
+        return lambda room: hub._player_left(room, command["player_id"])
+    if kind == "player_returned":
+        return lambda room: hub._player_returned(room, command["player_id"])
+    raise ValueError(f"Unknown room command: {kind}")
+
+
+async def send_room_event(room_id: str, message: dict):
+    """Событие комнаты для сокетов на всех узлах."""
+    await hub.send_room_event(room_id, message)
+    await cluster.publish_room_event(room_id, message)
+
+
+async def remote_room_changed(room_id: str):
+    """Узел-владелец изменил или удалил свою комнату."""
+    hub.schedule_lobby()
+    if room_id in hub.rooms and await cluster.replica(room_id) is not None:
+        await hub.send_room_state(room_id)
+
+
+# Хранилище и шина событий между узлами (см. store.py, cluster.py);
+# по умолчанию - память процесса, кластер выключен
+store = store_from_env()
+cluster = Cluster(
+    store,
+    on_room_changed=remote_room_changed,
+    on_room_event=hub.send_room_event,
+    on_command=run_forwarded_command,
+)
 
 async def broadcast_lobby():
-    await hub.send_lobby({"type": "rooms", "payload": list_rooms_summary()})
+    hub.schedule_lobby()
 
 # ---------- WS endpoints ----------
+# Маршрут лобби объявлен раньше /ws/{room_id}, иначе "lobby" попадает в room_id
+@app.websocket("/ws/lobby")
+async def ws_lobby(
+    ws: WebSocket,
+    mode: Optional[str] = Query(None),
+    lobby_filter: LobbyFilter = Depends(_lobby_filter),
+):
+    await hub.connect_lobby(ws, lobby_filter=lobby_filter, events=mode == "events")
+    try:
+        hub.send_rooms(ws)
+        while True:
+            # Входящие сообщения лобби (ping) игнорируются, в любом протоколе
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+    except WebSocketDisconnect:
+        hub.disconnect_lobby(ws)
+
 @app.websocket("/ws/{room_id}")
-async def ws_room(ws: WebSocket, room_id: str, player_id: str = Query(...)):
-    if room_id not in ROOMS:
+async def ws_room(
+    ws: WebSocket,
+    room_id: str,
+    player_id: str = Query(...),
+    mode: Optional[str] = Query(None),
+    fmt: Optional[str] = Query(None, alias="format"),
+):
+    if room_id not in ROOMS and await cluster.replica(room_id) is None:
         await ws.close(code=1008, reason="room_not_found")
         return
 
-    await hub.connect_room(room_id, player_id, ws)
+    await hub.connect_room(
+        room_id,
+        player_id,
+        ws,
+        delta=mode == "delta",
+        fmt="compact" if fmt == "compact" else "full",
+    )
     try:
         await broadcast_room(room_id)
         while True:
-            data = await ws.receive_json()
+            try:
+                data = await hub.receive_message(ws)
+            except ValueError as exc:
+                hub.send_message(ws, {"type": "error", "error": str(exc)})
+                continue
             t = data.get("type")
-            room = ROOMS.get(room_id)
-            if room is None:
+            if t == "ack":
+                if isinstance(data.get("seq"), int):
+                    hub.ack_state(ws, data["seq"])
+                continue
+            if t == "resync":
+                await hub.resync_state(ws)
+                continue
+            try:
+                await room_command(room_id, data)
+            except ValueError as exc:
+                hub.send_message(ws, {"type": "error", "error": str(exc)})
+            except LookupError:
                 await ws.close(code=1011, reason="room_not_found")
-                await hub.disconnect(ws)
                 break
-            if t in {"play", "play_cards"}:
-                cards = data.get("cards")
-                card = data.get("card")
-                if cards is None and card is not None:
-                    cards = [card]
-                kwargs = {}
-                if "roundId" in data:
-                    kwargs["round_id"] = data["roundId"]
-                if "trickIndex" in data:
-                    kwargs["trick_index"] = data["trickIndex"]
-                try:
-                    room.play_cards(data["player_id"], cards or [], **kwargs)
-                except ValueError as exc:
-                    await ws.send_json({"type": "error", "error": str(exc)})
-                else:
-                    await broadcast_room(room_id)
-            elif t == "declare":
-                try:
-                    room.declare_combination(data["player_id"], data["combo"])
-                except ValueError as exc:
-                    await ws.send_json({"type": "error", "error": str(exc)})
-                else:
-                    await broadcast_room(room_id)
-            elif t == "request_early_turn":
-                cards_payload = data.get("cards")
-                try:
-                    cards = room.request_early_turn(
-                        data["player_id"], cards_payload or [], round_id=data.get("roundId")
-                    )
-                except ValueError as exc:
-                    await ws.send_json({"type": "error", "error": str(exc)})
-                else:
-                    suits = {card.suit for card in cards}
-                    same_suit = suits.pop() if len(suits) == 1 else None
-                    await hub.send_room_event(
-                        room_id,
-                        {
-                            "type": "EARLY_TURN_GRANTED",
-                            "playerId": data["player_id"],
-                            "suit": same_suit,
-                            "cardIds": [card.id for card in cards],
-                            "ranks": [card.rank for card in cards],
-                        },
-                    )
-                    await broadcast_room(room_id)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Сокет снимается с хаба при любом выходе из обработчика
         await hub.disconnect(ws)
 
-@app.websocket("/ws/lobby")
-async def ws_lobby(ws: WebSocket):
-    await hub.connect_lobby(ws)
-    try:
-        await ws.send_json({"type": "rooms", "payload": list_rooms_summary()})
-        while True:
-            await ws.receive_text()
-    except WebSocketDisconnect:
-        if ws in hub.lobby:
-            hub.lobby.remove(ws)
+
+def _room_command(room_id: str, command: Command):
+    """Команда актора для разобранного игрового сообщения WebSocket."""
+    if isinstance(command, PlayCards):
+        return lambda room: room.play_cards(
+            command.player_id, command.cards, round_id=command.round_id, trick_index=command.trick_index
+        )
+    if isinstance(command, Declare):
+        return lambda room: room.declare_combination(command.player_id, command.combo)
+    if isinstance(command, RequestEarlyTurn):
+        async def early_turn(room: Room):
+            cards = room.request_early_turn(command.player_id, command.cards, round_id=command.round_id)
+            suits = {card.suit for card in cards}
+            same_suit = suits.pop() if len(suits) == 1 else None
+            # Событие уходит раньше состояния, которое разошлёт commit_room
+            await send_room_event(
+                room_id,
+                {
+                    "type": "EARLY_TURN_GRANTED",
+                    "playerId": command.player_id,
+                    "suit": same_suit,
+                    "cardIds": [card.id for card in cards],
+                    "ranks": [card.rank for card in cards],
+                },
+            )
+
+        return early_turn
+    return None
@@ -31,12 +31,17 @@ SUIT_IMAGE_CODES: Dict[Suit, str] = {
 }
 
 
+# Картинки карт лежат во frontend/public/cards и отдаются вместе с клиентом
+CARD_IMAGE_BASE = "/cards"
+CARD_BACK_IMAGE_URL = f"{CARD_IMAGE_BASE}/back.png"
+
+
 def _image_url(suit: Suit, rank: int) -> Optional[str]:
     suit_code = SUIT_IMAGE_CODES.get(suit)
     rank_code = RANK_IMAGE_CODES.get(rank)
     if not suit_code or not rank_code:
         return None
-    return f"https://deckofcardsapi.com/static/img/{rank_code}{suit_code}.png"
+    return f"{CARD_IMAGE_BASE}/{rank_code}{suit_code}.png"
 
 
 class Card(BaseModel):
@@ -47,7 +52,8 @@ class Card(BaseModel):
     image_url: Optional[str] = Field(default=None, alias="imageUrl")
     back_image_url: Optional[str] = Field(default=None, alias="backImageUrl")
 
-    model_config = ConfigDict(populate_by_name=True, extra="ignore")
+    # frozen: игровые карты - общие неизменяемые экземпляры (см. game.CARD_MODELS)
+    model_config = ConfigDict(populate_by_name=True, extra="ignore", frozen=True)
 
     @model_validator(mode="before")
     @classmethod
@@ -68,7 +74,7 @@ class Card(BaseModel):
                     if rank_code and suit_code:
                         value = {**value, "id": f"c_{rank_code.lower()}{suit_code.lower()}"}
             if value.get("backImageUrl") is None and value.get("back_image_url") is None:
-                value = {**value, "backImageUrl": "https://deckofcardsapi.com/static/img/back.png"}
+                value = {**value, "backImageUrl": CARD_BACK_IMAGE_URL}
         return value
 
 
@@ -135,7 +141,7 @@ class BoardCard(BaseModel):
                     if image:
                         value = {**value, "imageUrl": image}
             if value.get("backImageUrl") is None and value.get("back_image_url") is None:
-                value = {**value, "backImageUrl": "https://deckofcardsapi.com/static/img/back.png"}
+                value = {**value, "backImageUrl": CARD_BACK_IMAGE_URL}
         return value
 
 
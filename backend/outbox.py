@@ -0,0 +1,120 @@
+"""Исходящая очередь WebSocket-соединения.
+
+Каждое соединение получает свою ограниченную очередь и отдельную задачу-
+писателя, поэтому рассылка только раскладывает готовые кадры по очередям и
+не ждёт медленных клиентов. Состояние комнаты коалесцируется: в очереди
+держится только последний неотправленный кадр состояния. Соединение, у
+которого очередь переполнилась или отправка зависла дольше ``send_timeout``,
+вытесняется: писатель останавливается и вызывается ``on_evict``.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, Union
+
+from starlette.websockets import WebSocket
+
+Frame = Union[str, bytes]
+
+# Ключ коалесцирования для кадров состояния комнаты
+STATE_KEY = "state"
+
+
+class Outbox:
+    """Очередь кадров одного соединения и её писатель."""
+
+    # Сколько кадров может ждать отправки, прежде чем клиент считается зависшим
+    max_pending = 64
+    # Сколько секунд может длиться отправка одного кадра
+    send_timeout = 10.0
+
+    def __init__(self, ws: WebSocket, on_evict: Callable[[WebSocket], Awaitable[None]]):
+        self.ws = ws
+        self.on_evict = on_evict
+        self.queue: Deque[Tuple[Optional[str], Frame]] = deque()
+        self.closed = False
+        self._evict_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    def push(self, frame: Frame, *, key: Optional[str] = None) -> bool:
+        """Ставит кадр в очередь; ``False``, если соединение закрыто или вытеснено.
+
+        Кадр с ``key`` заменяет ещё не отправленный кадр с тем же ключом;
+        новый кадр встаёт в конец, чтобы не обогнать события, поставленные
+        раньше него.
+        """
+        if self.closed:
+            return False
+        if key is not None:
+            for pos, (pending_key, _) in enumerate(self.queue):
+                if pending_key == key:
+                    del self.queue[pos]
+                    break
+        if len(self.queue) >= self.max_pending:
+            self._evict()
+            return False
+        self.queue.append((key, frame))
+        self._notify()
+        return True
+
+    def close(self):
+        """Останавливает писателя; неотправленные кадры отбрасываются."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if not self._task.done() and self._task is not _current_task():
+            self._task.cancel()
+
+    def _in_loop(self, callback: Callable[[], object]):
+        if _running_loop() is self._loop:
+            callback()
+        else:
+            # Кадр пришёл из другого потока со своим циклом событий
+            self._loop.call_soon_threadsafe(callback)
+
+    def _notify(self):
+        self._in_loop(self._wake.set)
+
+    def _evict(self):
+        if self.closed:
+            return
+        self.close()
+        self._in_loop(self._start_evict)
+
+    def _start_evict(self):
+        self._evict_task = self._loop.create_task(self.on_evict(self.ws))
+
+    async def _run(self):
+        while not self.closed:
+            if not self.queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            _, frame = self.queue.popleft()
+            try:
+                if isinstance(frame, bytes):
+                    send = self.ws.send_bytes(frame)
+                else:
+                    send = self.ws.send_text(frame)
+                await asyncio.wait_for(send, self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Таймаут, закрытый сокет или обрыв соединения
+                self._evict()
+                return
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _current_task() -> Optional[asyncio.Task]:
+    return asyncio.current_task() if _running_loop() is not None else None
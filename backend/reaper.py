@@ -0,0 +1,126 @@
+"""Уборка простаивающих, сыгранных и брошенных комнат.
+
+Комната живёт в ``ROOMS``, пока из неё не уйдёт последний игрок, поэтому
+сыгранные матчи и брошенные столы со всеми руками, взятками и объявлениями
+копятся в памяти. ``RoomReaper`` держит для каждой комнаты таймер
+``("idle", room_id)`` в общем колесе (см. scheduler.py) и удаляет комнату,
+которая не менялась дольше своего срока:
+
+* ``lobby_ttl`` - стол в лобби (игра не начата);
+* ``finished_ttl`` - матч сыгран (``match_over``, ``started=False``);
+* ``orphan_ttl`` - игра идёт, но к комнате не подключён ни один сокет.
+
+Идущая игра с подключёнными игроками не удаляется по сроку. Если задан
+``max_rooms``, при превышении удаляются комнаты, которые дольше всех не
+менялись (LRU). Срок продлевается в ``track`` после каждого изменения
+комнаты; таймер перевзводится, только если срок стал ближе, а при
+срабатывании срок проверяется заново.
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Mapping, Optional, Set
+
+from game import Room
+from scheduler import TimingWheel
+
+
+class RoomReaper:
+    def __init__(
+        self,
+        rooms: Mapping[str, Room],
+        wheel: TimingWheel,
+        on_evict: Callable[[str, str], Awaitable[None]],
+        *,
+        has_sockets: Callable[[str], bool],
+        lobby_ttl: float = 1800.0,
+        finished_ttl: float = 600.0,
+        orphan_ttl: float = 300.0,
+        max_rooms: int = 0,
+    ):
+        self.rooms = rooms
+        self.wheel = wheel
+        self.on_evict = on_evict
+        self.has_sockets = has_sockets
+        self.lobby_ttl = lobby_ttl
+        self.finished_ttl = finished_ttl
+        self.orphan_ttl = orphan_ttl
+        # 0 - без ограничения числа комнат
+        self.max_rooms = max_rooms
+        # Порядок последних изменений: в начале - дольше всех не менявшиеся
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self._evicting: Set[str] = set()
+
+    def ttl(self, room: Room) -> Optional[tuple[float, str]]:
+        """Срок простоя комнаты и причина удаления; ``None`` - не удалять."""
+        if room.match_over and not room.started:
+            return self.finished_ttl, "finished"
+        if not room.started:
+            return self.lobby_ttl, "lobby_idle"
+        if not self.has_sockets(room.id):
+            return self.orphan_ttl, "orphaned"
+        return None
+
+    def track(self, room: Room):
+        """Комната изменилась: поднять её в LRU и продлить срок."""
+        # Ожидавшая вытеснения комната снова активна (её таймер перевзведётся)
+        self._evicting.discard(room.id)
+        self._recent[room.id] = None
+        self._recent.move_to_end(room.id)
+        self._arm(room)
+        if self.max_rooms and len(self._recent) - len(self._evicting) > self.max_rooms:
+            self._evict_over_cap(keep=room.id)
+
+    def forget(self, room_id: str):
+        """Комната удалена - её таймер и место в LRU больше не нужны."""
+        self._recent.pop(room_id, None)
+        self.wheel.cancel(("idle", room_id))
+
+    def _arm(self, room: Room):
+        key = ("idle", room.id)
+        limit = self.ttl(room)
+        if limit is None:
+            self.wheel.cancel(key)
+            return
+        delay = room.last_active + limit[0] - time.time()
+        remaining = self.wheel.remaining(key)
+        if remaining is not None and remaining <= delay:
+            # Таймер сработает раньше и проверит срок заново
+            return
+        room_id = room.id
+        self.wheel.arm(key, delay, lambda: self._fire(room_id))
+
+    def _fire(self, room_id: str):
+        room = self.rooms.get(room_id)
+        if room is None:
+            self.forget(room_id)
+            return None
+        limit = self.ttl(room)
+        if limit is None:
+            return None
+        ttl, reason = limit
+        if room.last_active + ttl > time.time():
+            # Комната менялась после взвода таймера - ждём новый срок
+            self._arm(room)
+            return None
+        return self._evict(room_id, reason)
+
+    def _evict_over_cap(self, keep: str):
+        excess = len(self._recent) - len(self._evicting) - self.max_rooms
+        for room_id in list(self._recent):
+            if excess <= 0:
+                break
+            if room_id == keep or room_id in self._evicting:
+                continue
+            excess -= 1
+            self.wheel.arm(("idle", room_id), 0, lambda victim=room_id: self._evict(victim, "capacity"))
+            # Пока удаление не выполнено, комната не считается в лимите
+            self._evicting.add(room_id)
+
+    async def _evict(self, room_id: str, reason: str):
+        self._evicting.add(room_id)
+        try:
+            await self.on_evict(room_id, reason)
+        finally:
+            self._evicting.discard(room_id)
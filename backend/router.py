@@ -0,0 +1,387 @@
+"""Роутер шардированного режима (см. sharding.py).
+
+Принимает весь внешний трафик и раздаёт его воркерам:
+
+* запросы комнаты (``/api/game/join``, ``/api/game/<action>/<room_id>``,
+  ``/ws/<room_id>``) уходят владельцу комнаты по кольцу шардов;
+* ``/api/game/create`` - любому воркеру по кругу (воркер сам выбирает id,
+  который принадлежит ему);
+* ``/api/rooms`` и ``/ws/lobby`` собираются со всех шардов;
+* остальное (варианты, авторизация, статистика) - любому воркеру.
+
+Запуск: ``BURA_SHARDS=... uvicorn router:app`` или ``python sharding.py``.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+import websockets
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+from fastapi import Depends, FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+
+from encoding import FastJSONResponse, dumps, negotiate_subprotocol, pack
+from lobby import LobbyFilter, RoomChange, room_changes
+from outbox import STATE_KEY, Outbox
+from sharding import STATE_LONG_POLL_MAX_SEC, ShardConfig, shard_config_from_env
+
+# Таймаут запроса к воркеру: с запасом на самый долгий long-poll состояния
+UPSTREAM_TIMEOUT = httpx.Timeout(STATE_LONG_POLL_MAX_SEC + 5.0, connect=5.0)
+# Пауза перед повторным подключением к лобби упавшего воркера, секунд
+LOBBY_RECONNECT_DELAY_SEC = 1.0
+# Максимальный размер страницы GET /api/rooms (как у воркера)
+ROOMS_PAGE_MAX = 100
+
+# Заголовки соединения не пересылаются; тело уже раскодировано httpx
+_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+    "content-encoding",
+}
+
+
+def _forward_headers(headers) -> List[Tuple[str, str]]:
+    return [(key, value) for key, value in headers.items() if key.lower() not in _HOP_HEADERS]
+
+
+def _ws_url(base_url: str) -> str:
+    return "ws" + base_url[len("http"):] if base_url.startswith("http") else base_url
+
+
+class LobbyAggregator:
+    """Общее лобби всех шардов.
+
+    На каждый шард открыта одна подписка ``/ws/lobby?mode=events``; записи
+    комнат хранятся по шардам, а подписчики роутера получают снимок и
+    события (или полный список) так же, как от одного воркера.
+    """
+
+    def __init__(self, shard_count: int):
+        self.entries: List[Dict[str, dict]] = [{} for _ in range(shard_count)]
+        self.subs: Dict[WebSocket, Tuple[LobbyFilter, bool]] = {}
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        self.binary: Set[WebSocket] = set()
+        self._followers: List[Optional[asyncio.Task]] = [None] * shard_count
+
+    def rooms(self) -> List[dict]:
+        return [entry for shard in self.entries for entry in shard.values()]
+
+    def apply(self, shard: int, message: dict) -> List[RoomChange]:
+        """Применить сообщение лобби шарда и вернуть изменения комнат."""
+        entries = self.entries[shard]
+        kind = message.get("type")
+        if kind == "rooms":
+            snapshot = {entry["room_id"]: entry for entry in message.get("payload", [])}
+            changes = room_changes(entries, snapshot)
+            self.entries[shard] = snapshot
+            return changes
+        if kind in {"room_added", "room_updated"}:
+            entry = message["payload"]
+            previous = entries.get(entry["room_id"])
+            entries[entry["room_id"]] = entry
+            return [(entry["room_id"], previous, entry)]
+        if kind == "room_removed":
+            previous = entries.pop(message["room_id"], None)
+            return [(message["room_id"], previous, None)] if previous is not None else []
+        return []
+
+    def publish(self, changes: List[RoomChange]):
+        if not changes:
+            return
+        filter_events: Dict[LobbyFilter, List[dict]] = {}
+        rooms: Optional[List[dict]] = None
+        for ws, (lobby_filter, events) in list(self.subs.items()):
+            if lobby_filter not in filter_events:
+                filter_events[lobby_filter] = lobby_filter.events(changes)
+            if not filter_events[lobby_filter]:
+                continue
+            if events:
+                for event in filter_events[lobby_filter]:
+                    self._send(ws, event)
+            else:
+                if rooms is None:
+                    rooms = self.rooms()
+                self._send(ws, {"type": "rooms", "payload": lobby_filter.apply(rooms)}, key=STATE_KEY)
+
+    def _send(self, ws: WebSocket, message: dict, *, key: Optional[str] = None):
+        outbox = self.outboxes.get(ws)
+        if outbox is not None:
+            outbox.push(pack(message) if ws in self.binary else dumps(message), key=key)
+
+    async def subscribe(self, ws: WebSocket, lobby_filter: LobbyFilter, events: bool, urls: Sequence[str]):
+        subprotocol = negotiate_subprotocol(ws.scope.get("subprotocols", []))
+        await ws.accept(subprotocol=subprotocol)
+        if subprotocol is not None:
+            self.binary.add(ws)
+        self.outboxes[ws] = Outbox(ws, self.evict)
+        self.subs[ws] = (lobby_filter, events)
+        self._send(ws, {"type": "rooms", "payload": lobby_filter.apply(self.rooms())})
+        for shard, url in enumerate(urls):
+            follower = self._followers[shard]
+            if follower is None or follower.done():
+                self._followers[shard] = asyncio.get_running_loop().create_task(self._follow(shard, url))
+
+    def unsubscribe(self, ws: WebSocket):
+        self.subs.pop(ws, None)
+        self.binary.discard(ws)
+        outbox = self.outboxes.pop(ws, None)
+        if outbox is not None:
+            outbox.close()
+
+    async def evict(self, ws: WebSocket):
+        self.unsubscribe(ws)
+        try:
+            await asyncio.wait_for(ws.close(code=1013), timeout=1.0)
+        except Exception:
+            pass
+
+    async def _follow(self, shard: int, base_url: str):
+        url = _ws_url(base_url) + "/ws/lobby?mode=events"
+        while self.subs:
+            try:
+                async with websockets.connect(url) as upstream:
+                    async for frame in upstream:
+                        self.publish(self.apply(shard, json.loads(frame)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[Router] Lobby of shard {shard} unavailable: {exc!r}")
+            # Пока шард недоступен, его комнаты не показываются
+            self.publish(self.apply(shard, {"type": "rooms", "payload": []}))
+            await asyncio.sleep(LOBBY_RECONNECT_DELAY_SEC)
+
+
+class Router:
+    """HTTP-клиенты воркеров и правила маршрутизации."""
+
+    def __init__(
+        self,
+        shards: ShardConfig,
+        transports: Optional[Sequence[httpx.AsyncBaseTransport]] = None,
+    ):
+        self.shards = shards
+        self.clients = [
+            httpx.AsyncClient(
+                base_url=url,
+                timeout=UPSTREAM_TIMEOUT,
+                transport=transports[idx] if transports is not None else None,
+            )
+            for idx, url in enumerate(shards.urls)
+        ]
+        self.lobby = LobbyAggregator(len(shards.urls))
+        self._round_robin = itertools.cycle(range(len(shards.urls)))
+
+    def any_shard(self) -> int:
+        return next(self._round_robin)
+
+    async def forward(self, request: Request, shard: int, body: Optional[bytes] = None) -> Response:
+        if body is None:
+            body = await request.body()
+        try:
+            upstream = await self.clients[shard].request(
+                request.method,
+                request.url.path,
+                params=request.query_params,
+                headers=_forward_headers(request.headers),
+                content=body,
+            )
+        except httpx.HTTPError as exc:
+            print(f"[Router] Shard {shard} request failed: {exc!r}")
+            return FastJSONResponse({"detail": "shard_unavailable"}, status_code=502)
+        return Response(
+            upstream.content,
+            status_code=upstream.status_code,
+            headers=dict(_forward_headers(upstream.headers)),
+        )
+
+    async def rooms_page(
+        self,
+        params: List[Tuple[str, str]],
+        headers,
+        cursor: Optional[str],
+        limit: Optional[int],
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Список комнат со всех шардов.
+
+        Страницы идут по шардам подряд; курсор роутера - ``"<шард>:<курсор шарда>"``.
+        """
+        headers = _forward_headers(headers)
+        if cursor is None and limit is None:
+            replies = await asyncio.gather(
+                *(client.get("/api/rooms", params=params, headers=headers) for client in self.clients),
+                return_exceptions=True,
+            )
+            rooms: List[dict] = []
+            for shard, reply in enumerate(replies):
+                if isinstance(reply, Exception) or reply.status_code != 200:
+                    print(f"[Router] Rooms of shard {shard} unavailable: {reply!r}")
+                    continue
+                rooms.extend(reply.json())
+            return rooms, None
+
+        shard, shard_cursor = _parse_cursor(cursor)
+        limit = limit or ROOMS_PAGE_MAX
+        page: List[dict] = []
+        while shard < len(self.clients):
+            query = [*params, ("limit", str(limit - len(page))), ("cursor", str(shard_cursor))]
+            reply = await self.clients[shard].get("/api/rooms", params=query, headers=headers)
+            reply.raise_for_status()
+            page.extend(reply.json())
+            next_cursor = reply.headers.get("X-Next-Cursor")
+            if next_cursor is not None:
+                return page, f"{shard}:{next_cursor}"
+            shard, shard_cursor = shard + 1, 0
+            if len(page) == limit:
+                return page, f"{shard}:0" if shard < len(self.clients) else None
+        return page, None
+
+
+def _parse_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    if not cursor:
+        return 0, 0
+    shard, _, seq = cursor.partition(":")
+    try:
+        return int(shard), int(seq or 0)
+    except ValueError:
+        return 0, 0
+
+
+def _lobby_filter(
+    variant: Optional[str] = Query(None),
+    free_seats: bool = Query(False),
+    not_started: bool = Query(False),
+) -> LobbyFilter:
+    return LobbyFilter(variant=variant, free_seats=free_seats, not_started=not_started)
+
+
+def create_app(router: Router) -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.state.router = router
+
+    @app.get("/api/rooms")
+    async def rooms(
+        request: Request,
+        cursor: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=ROOMS_PAGE_MAX),
+    ):
+        params = [(key, value) for key, value in request.query_params.multi_items() if key not in {"cursor", "limit"}]
+        try:
+            page, next_cursor = await router.rooms_page(params, request.headers, cursor, limit)
+        except httpx.HTTPError as exc:
+            print(f"[Router] Rooms page failed: {exc!r}")
+            return FastJSONResponse({"detail": "shard_unavailable"}, status_code=502)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        return FastJSONResponse(page, headers=headers)
+
+    @app.post("/api/game/create")
+    async def create_game(request: Request):
+        return await router.forward(request, router.any_shard())
+
+    @app.post("/api/game/join")
+    async def join_game(request: Request):
+        body = await request.body()
+        try:
+            room_id = json.loads(body).get("room_id")
+        except (ValueError, AttributeError):
+            room_id = None
+        shard = router.shards.shard_of(room_id) if isinstance(room_id, str) else router.any_shard()
+        return await router.forward(request, shard, body)
+
+    @app.api_route("/api/game/{action}/{room_id}", methods=["GET", "POST"])
+    async def room_request(request: Request, action: str, room_id: str):
+        return await router.forward(request, router.shards.shard_of(room_id))
+
+    @app.websocket("/ws/lobby")
+    async def ws_lobby(
+        ws: WebSocket,
+        mode: Optional[str] = Query(None),
+        lobby_filter: LobbyFilter = Depends(_lobby_filter),
+    ):
+        await router.lobby.subscribe(ws, lobby_filter, mode == "events", router.shards.urls)
+        try:
+            while True:
+                message = await ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+        finally:
+            router.lobby.unsubscribe(ws)
+
+    @app.websocket("/ws/{room_id}")
+    async def ws_room(ws: WebSocket, room_id: str):
+        url = f"{_ws_url(router.shards.url_of(room_id))}/ws/{room_id}"
+        if ws.url.query:
+            url += "?" + ws.url.query
+        offered = ws.scope.get("subprotocols") or None
+        try:
+            upstream = await websockets.connect(url, subprotocols=offered)
+        except InvalidHandshake:
+            # Воркер отклонил подключение (комнаты нет)
+            await ws.close(code=1008, reason="room_not_found")
+            return
+        except OSError:
+            await ws.close(code=1011, reason="shard_unavailable")
+            return
+        await ws.accept(subprotocol=upstream.subprotocol)
+        await _pipe(ws, upstream)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"])
+    async def passthrough(request: Request, path: str):
+        return await router.forward(request, router.any_shard())
+
+    return app
+
+
+async def _pipe(ws: WebSocket, upstream):
+    """Пересылать кадры в обе стороны, пока одна из сторон не закроется."""
+
+    async def from_client():
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                await upstream.send(message["bytes"])
+            elif message.get("text") is not None:
+                await upstream.send(message["text"])
+
+    async def from_shard():
+        async for frame in upstream:
+            if isinstance(frame, bytes):
+                await ws.send_bytes(frame)
+            else:
+                await ws.send_text(frame)
+
+    tasks = [asyncio.ensure_future(from_client()), asyncio.ensure_future(from_shard())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await upstream.close()
+        code = upstream.close_code or 1000
+        try:
+            await ws.close(code=code if code != 1006 else 1011)
+        except (RuntimeError, WebSocketDisconnect, ConnectionClosed):
+            # Клиент уже закрыл соединение
+            pass
+
+
+def __getattr__(name: str):
+    # ``router:app`` собирается при первом обращении, чтобы модуль можно было
+    # импортировать без BURA_SHARDS (тесты, create_app с другими шардами)
+    if name == "app":
+        shards = shard_config_from_env()
+        if shards is None:
+            raise RuntimeError("router.py needs BURA_SHARDS (see sharding.py)")
+        app = globals()["app"] = create_app(Router(shards))
+        return app
+    raise AttributeError(name)
@@ -0,0 +1,236 @@
+"""Таймеры сервера: иерархическое колесо таймеров и дедлайны комнат.
+
+``TimingWheel`` - единая служба таймеров по монотонным часам. Таймеры
+адресуются ключом (``("room", room_id)``, ``("reconnect", room_id, player_id)``
+и т.п.), взвод и отмена стоят O(1). Колесо продвигается одной задачей с
+фиксированным шагом ``tick``, поэтому точность и расход CPU не зависят от
+числа комнат; без таймеров задача спит.
+
+``RoomTimers`` держит в колесе по одному таймеру на комнату - на ближайший
+дедлайн (``Room.next_timer_at``: конец хода или конец показа взятки, после
+которого начинается следующий раунд). Когда таймер срабатывает, вызывается
+``on_fire(room_id)``; обработчик применяет переход (``Room.advance_timers``),
+рассылает результат и взводит таймер заново.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+Callback = Callable[[], Any]
+
+
+class _Timer:
+    __slots__ = ("key", "due", "callback", "level", "slot")
+
+    def __init__(self, key: Hashable, due: int, callback: Callback):
+        self.key = key
+        self.due = due
+        self.callback = callback
+        self.level = 0
+        self.slot = 0
+
+
+class TimingWheel:
+    """Иерархическое колесо таймеров с шагом ``tick`` секунд.
+
+    Уровень ``i`` делит будущее на ``levels[i]`` ячеек по ``span_i`` тиков
+    (``span_0 = 1``, ``span_{i+1} = span_i * levels[i]``). Таймер лежит в
+    самом мелком уровне, куда помещается его срок; когда младший уровень
+    проходит полный круг, ячейка старшего уровня раскладывается заново.
+    С параметрами по умолчанию (50 мс, 256/64/64/64) колесо покрывает
+    больше 40 суток; более дальние сроки ограничиваются верхним уровнем и
+    перекладываются при каждом его обороте.
+    """
+
+    def __init__(
+        self,
+        tick: float = 0.05,
+        levels: Sequence[int] = (256, 64, 64, 64),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tick = tick
+        self.clock = clock
+        self._sizes = tuple(levels)
+        spans = [1]
+        for size in self._sizes[:-1]:
+            spans.append(spans[-1] * size)
+        self._spans = tuple(spans)
+        self._capacity = self._spans[-1] * self._sizes[-1]
+        self._wheel: List[List[Dict[Hashable, _Timer]]] = [
+            [{} for _ in range(size)] for size in self._sizes
+        ]
+        self._timers: Dict[Hashable, _Timer] = {}
+        self._current = self._tick_at(clock())
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._driver: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def _tick_at(self, now: float) -> int:
+        return int(now / self.tick)
+
+    # ------------------------------------------------------------------
+    # Arm / cancel
+    # ------------------------------------------------------------------
+    def arm(self, key: Hashable, delay: float, callback: Callback):
+        """Взвести таймер ``key`` через ``delay`` секунд (заменяет прежний)."""
+        self.cancel(key)
+        if not self._timers:
+            # Пустое колесо можно сразу перевести на текущее время
+            self._current = max(self._current, self._tick_at(self.clock()))
+        ticks = max(1, math.ceil(delay / self.tick))
+        timer = _Timer(key, self._current + ticks, callback)
+        self._timers[key] = timer
+        self._place(timer)
+        self._ensure_driver()
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        self._wheel[timer.level][timer.slot].pop(key, None)
+        return True
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """Сколько секунд осталось до срабатывания таймера ``key``."""
+        timer = self._timers.get(key)
+        if timer is None:
+            return None
+        return max(0.0, timer.due * self.tick - self.clock())
+
+    def _place(self, timer: _Timer):
+        ticks = timer.due - self._current
+        due = timer.due if ticks < self._capacity else self._current + self._capacity - 1
+        ticks = due - self._current
+        level = 0
+        while level < len(self._sizes) - 1 and ticks >= self._spans[level + 1]:
+            level += 1
+        timer.level = level
+        timer.slot = (due // self._spans[level]) % self._sizes[level]
+        self._wheel[level][timer.slot][timer.key] = timer
+
+    # ------------------------------------------------------------------
+    # Advancing
+    # ------------------------------------------------------------------
+    def advance(self, now: Optional[float] = None) -> int:
+        """Продвинуть колесо до ``now`` и вызвать наступившие таймеры."""
+        target = self._tick_at(self.clock() if now is None else now)
+        fired = 0
+        while self._current < target:
+            if not self._timers:
+                self._current = target
+                break
+            self._current += 1
+            self._cascade()
+            slot = self._wheel[0][self._current % self._sizes[0]]
+            if not slot:
+                continue
+            due = [timer for timer in slot.values() if timer.due <= self._current]
+            for timer in due:
+                del slot[timer.key]
+                del self._timers[timer.key]
+            for timer in due:
+                fired += 1
+                self._run(timer.callback)
+        return fired
+
+    def _cascade(self):
+        for level in range(1, len(self._sizes)):
+            span = self._spans[level]
+            if self._current % span:
+                break
+            idx = (self._current // span) % self._sizes[level]
+            slot = self._wheel[level][idx]
+            if not slot:
+                continue
+            self._wheel[level][idx] = {}
+            for timer in slot.values():
+                self._place(timer)
+
+    def _run(self, callback: Callback):
+        try:
+            result = callback()
+        except Exception as exc:  # один упавший таймер не должен ронять остальные
+            print(f"[Timers] Timer callback failed: {exc!r}")
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result, loop=self._loop)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    # ------------------------------------------------------------------
+    # Driver task
+    # ------------------------------------------------------------------
+    def _ensure_driver(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Без цикла событий колесо продвигают вызовами advance()
+            return
+        if self._driver is not None and not self._driver.done() and not self._loop.is_closed():
+            if loop is self._loop:
+                self._wake.set()
+            else:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._driver = loop.create_task(self._drive())
+
+    async def _drive(self):
+        while True:
+            if not self._timers:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            next_at = (self._current + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_at - self.clock()))
+            self.advance()
+
+
+class RoomTimers:
+    """Таймеры ближайших дедлайнов комнат поверх ``TimingWheel``."""
+
+    def __init__(self, wheel: TimingWheel, on_fire: Callable[[str], Awaitable[None]]):
+        self.wheel = wheel
+        self.on_fire = on_fire
+        # room_id -> дедлайн (time.time()), на который взведён таймер
+        self._deadlines: Dict[str, float] = {}
+
+    def arm(self, room) -> None:
+        """Взвести (или перевзвести) таймер комнаты на её ближайший дедлайн.
+
+        Дедлайны комнаты хранятся по ``time.time()`` (их видят клиенты), в
+        колесо передаётся только оставшееся время.
+        """
+        at = room.next_timer_at()
+        key = ("room", room.id)
+        if at is not None and self._deadlines.get(room.id) == at and key in self.wheel:
+            return
+        self.cancel(room.id)
+        if at is None:
+            return
+        self._deadlines[room.id] = at
+        room_id = room.id
+        self.wheel.arm(key, at - time.time(), lambda: self._fire(room_id))
+
+    def cancel(self, room_id: str) -> None:
+        self._deadlines.pop(room_id, None)
+        self.wheel.cancel(("room", room_id))
+
+    def deadline(self, room_id: str) -> Optional[float]:
+        return self._deadlines.get(room_id)
+
+    def _fire(self, room_id: str):
+        self._deadlines.pop(room_id, None)
+        return self.on_fire(room_id)
@@ -0,0 +1,150 @@
+"""Шардирование комнат по процессам.
+
+Комнаты живут в памяти процесса (``ROOMS``, ``hub``), поэтому в шардированном
+режиме каждый воркер владеет частью комнат: владелец комнаты определяется
+консистентным хешированием ``room_id`` по кольцу шардов (``HashRing``).
+Воркер создаёт комнаты только с id, которые принадлежат ему самому, а
+``router.py`` направляет REST- и WebSocket-запросы комнаты её владельцу и
+собирает лобби со всех шардов.
+
+Воркер узнаёт о шардировании из окружения:
+
+* ``BURA_SHARDS`` - базовые URL всех воркеров через запятую
+  (``http://127.0.0.1:8001,http://127.0.0.1:8002``); порядок задаёт номера шардов;
+* ``BURA_SHARD_INDEX`` - номер этого воркера в списке.
+
+Без ``BURA_SHARDS`` сервер работает одним процессом, как раньше.
+
+Запуск на одной машине (роутер на 8000, воркеры на 8001..8000+N)::
+
+    python sharding.py --workers 4 --port 8000
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import os
+import signal
+import subprocess
+import sys
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Максимальное время ожидания long-poll запроса состояния, секунд; по нему
+# воркер ограничивает ``wait``, а роутер - таймаут запроса к воркеру
+STATE_LONG_POLL_MAX_SEC = 30.0
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Кольцо консистентного хеширования с виртуальными узлами.
+
+    Каждый узел занимает ``vnodes`` точек на кольце; ключ принадлежит первой
+    точке по часовой стрелке. При добавлении или удалении узла переезжает
+    только ~1/N ключей.
+    """
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 64):
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        self.nodes = tuple(nodes)
+        points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}#{replica}"), node) for node in self.nodes for replica in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        idx = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[idx]
+
+
+@dataclass(frozen=True)
+class ShardConfig:
+    """Список воркеров и номер текущего; ``index`` = ``None`` у роутера."""
+
+    urls: Tuple[str, ...]
+    index: Optional[int] = None
+    ring: HashRing = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.index is not None and not 0 <= self.index < len(self.urls):
+            raise ValueError(f"Shard index {self.index} is out of range for {len(self.urls)} shards")
+        # Узлы кольца - номера шардов: смена адресов не перемещает комнаты
+        object.__setattr__(self, "ring", HashRing([str(idx) for idx in range(len(self.urls))]))
+
+    def shard_of(self, room_id: str) -> int:
+        return int(self.ring.owner(room_id))
+
+    def url_of(self, room_id: str) -> str:
+        return self.urls[self.shard_of(room_id)]
+
+    def owns(self, room_id: str) -> bool:
+        return self.index is None or self.shard_of(room_id) == self.index
+
+
+def shard_config_from_env(environ: Optional[Dict[str, str]] = None) -> Optional[ShardConfig]:
+    """Конфигурация шардов из ``BURA_SHARDS``/``BURA_SHARD_INDEX`` или ``None``."""
+    environ = os.environ if environ is None else environ
+    urls = tuple(url.strip().rstrip("/") for url in environ.get("BURA_SHARDS", "").split(",") if url.strip())
+    if not urls:
+        return None
+    index = environ.get("BURA_SHARD_INDEX")
+    return ShardConfig(urls, int(index) if index not in (None, "") else None)
+
+
+def new_room_id(owns: Callable[[str], bool] = lambda room_id: True) -> str:
+    """Новый id комнаты, принадлежащий этому шарду (в среднем N попыток)."""
+    while True:
+        room_id = str(uuid.uuid4())[:8]
+        if owns(room_id):
+            return room_id
+
+
+# ---------- запуск на одной машине ----------
+def main():
+    parser = argparse.ArgumentParser(description="Run N backend workers behind the shard router")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    urls = [f"http://127.0.0.1:{args.port + 1 + idx}" for idx in range(args.workers)]
+    env = {**os.environ, "BURA_SHARDS": ",".join(urls)}
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port + 1 + idx)],
+            env={**env, "BURA_SHARD_INDEX": str(idx)},
+        )
+        for idx in range(args.workers)
+    ]
+    router = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "router:app", "--host", args.host, "--port", str(args.port)],
+        env=env,
+    )
+    processes = [router, *workers]
+
+    def _stop(*_):
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        # Падение любого процесса останавливает весь набор
+        os.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _stop()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Хранилище снимков комнат и шина событий между узлами.
+
+``RoomStore`` описывает, что нужно кластеру (см. cluster.py): запись снимка
+комнаты с версией, чтение, удаление и публикацию/подписку на события.
+
+* ``MemoryStore`` - по умолчанию: один процесс, состояние только в памяти,
+  как и раньше. Он не общий (``shared = False``), поэтому кластер его не
+  использует и лишней работы на каждое изменение нет.
+* ``RedisStore`` - Redis (или совместимый сервер) по протоколу RESP без
+  сторонних клиентов: снимки лежат в хешах ``<prefix>room:<id>``, список
+  комнат - в множестве ``<prefix>rooms``, события идут через PUBLISH/SUBSCRIBE
+  в канал ``<prefix>events``.
+
+Выбор - переменная ``BURA_STORE_URL`` (``memory://`` или ``redis://host:port/db``).
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from encoding import dumps_bytes
+
+Handler = Callable[[dict], Any]
+
+
+class RoomStore(ABC):
+    """Интерфейс хранилища; реализации - ``MemoryStore`` и ``RedisStore``.
+
+    Хранилище без какого-либо из методов не создаётся (``TypeError``).
+    """
+
+    # Хранилище видно другим узлам: имеет смысл писать снимки и события
+    shared = False
+
+    @abstractmethod
+    async def save_room(self, room_id: str, version: int, snapshot: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def load_room(self, room_id: str) -> Optional[Tuple[int, dict]]:
+        """``(версия, снимок)`` или ``None``, если комнаты нет."""
+
+    @abstractmethod
+    async def delete_room(self, room_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def room_ids(self) -> Set[str]:
+        ...
+
+    @abstractmethod
+    async def publish(self, event: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def subscribe(self, handler: Handler) -> None:
+        """Вызывать ``handler(event)`` на каждое опубликованное событие."""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStore(RoomStore):
+    """Хранилище в памяти процесса; события получают подписчики этого же процесса."""
+
+    def __init__(self):
+        self._rooms: Dict[str, Tuple[int, dict]] = {}
+        self._handlers: List[Handler] = []
+
+    async def save_room(self, room_id: str, version: int, snapshot: dict) -> None:
+        current = self._rooms.get(room_id)
+        if current is None or current[0] < version:
+            self._rooms[room_id] = (version, snapshot)
+
+    async def load_room(self, room_id: str) -> Optional[Tuple[int, dict]]:
+        return self._rooms.get(room_id)
+
+    async def delete_room(self, room_id: str) -> None:
+        self._rooms.pop(room_id, None)
+
+    async def room_ids(self) -> Set[str]:
+        return set(self._rooms)
+
+    async def publish(self, event: dict) -> None:
+        for handler in list(self._handlers):
+            await _call(handler, event)
+
+    async def subscribe(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+
+
+# ---------- RESP ----------
+class RespError(Exception):
+    """Ошибка, которую вернул сервер (``-ERR ...``)."""
+
+
+def encode_command(*args: Any) -> bytes:
+    """Команда RESP: массив bulk-строк."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode()
+        else:
+            data = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Один ответ RESP2; ошибка сервера возвращается как ``RespError``."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        return RespError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        size = int(body)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(body)
+        if size < 0:
+            return None
+        return [await read_reply(reader) for _ in range(size)]
+    raise ConnectionError(f"Malformed RESP reply: {line!r}")
+
+
+class RespConnection:
+    """Соединение для команд; запросы выполняются по одному под блокировкой."""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None):
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._roundtrip(reader, writer, "AUTH", self.password)
+        if self.db:
+            await self._roundtrip(reader, writer, "SELECT", self.db)
+        return reader, writer
+
+    @staticmethod
+    async def _roundtrip(reader, writer, *args: Any) -> Any:
+        writer.write(encode_command(*args))
+        await writer.drain()
+        reply = await read_reply(reader)
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def execute(self, *args: Any) -> Any:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                self._reader, self._writer = await self.open()
+            try:
+                return await self._roundtrip(self._reader, self._writer, *args)
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                # Соединение оборвалось - следующий запрос откроет новое
+                self._writer.close()
+                self._writer = None
+                raise
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RedisStore(RoomStore):
+    shared = True
+
+    # Пауза перед повторной подпиской после обрыва, секунд
+    resubscribe_delay = 1.0
+
+    def __init__(self, url: str, prefix: str = "bura:"):
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        self.conn = RespConnection(parsed.hostname or "127.0.0.1", parsed.port or 6379, db, parsed.password)
+        self.prefix = prefix
+        self.channel = prefix + "events"
+        self._handlers: List[Handler] = []
+        self._listener: Optional[asyncio.Task] = None
+
+    def _room_key(self, room_id: str) -> str:
+        return f"{self.prefix}room:{room_id}"
+
+    async def save_room(self, room_id: str, version: int, snapshot: dict) -> None:
+        await self.conn.execute("HSET", self._room_key(room_id), "version", version, "state", dumps_bytes(snapshot))
+        await self.conn.execute("SADD", self.prefix + "rooms", room_id)
+
+    async def load_room(self, room_id: str) -> Optional[Tuple[int, dict]]:
+        version, state = await self.conn.execute("HMGET", self._room_key(room_id), "version", "state")
+        if version is None or state is None:
+            return None
+        return int(version), json.loads(state)
+
+    async def delete_room(self, room_id: str) -> None:
+        await self.conn.execute("DEL", self._room_key(room_id))
+        await self.conn.execute("SREM", self.prefix + "rooms", room_id)
+
+    async def room_ids(self) -> Set[str]:
+        return {room_id.decode() for room_id in await self.conn.execute("SMEMBERS", self.prefix + "rooms")}
+
+    async def publish(self, event: dict) -> None:
+        await self.conn.execute("PUBLISH", self.channel, dumps_bytes(event))
+
+    async def subscribe(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+        if self._listener is None or self._listener.done():
+            ready = asyncio.get_running_loop().create_future()
+            self._listener = asyncio.get_running_loop().create_task(self._listen(ready))
+            await ready
+
+    async def _listen(self, ready: asyncio.Future):
+        # Подписка занимает отдельное соединение: в режиме SUBSCRIBE оно
+        # принимает только сообщения канала
+        while True:
+            writer = None
+            try:
+                reader, writer = await self.conn.open()
+                writer.write(encode_command("SUBSCRIBE", self.channel))
+                await writer.drain()
+                await read_reply(reader)  # подтверждение подписки
+                if not ready.done():
+                    ready.set_result(None)
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        event = json.loads(reply[2])
+                        for handler in list(self._handlers):
+                            await _call(handler, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if not ready.done():
+                    ready.set_exception(exc)
+                    return
+                print(f"[Store] Subscription lost: {exc!r}")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.resubscribe_delay)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.conn.close()
+
+
+async def _call(handler: Handler, event: dict):
+    try:
+        result = handler(event)
+        if inspect.isawaitable(result):
+            await result
+    except Exception as exc:  # один обработчик не должен ломать остальные
+        print(f"[Store] Event handler failed: {exc!r}")
+
+
+def store_from_env(environ: Optional[Dict[str, str]] = None) -> RoomStore:
+    environ = os.environ if environ is None else environ
+    url = environ.get("BURA_STORE_URL", "memory://")
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryStore()
+    if scheme == "redis":
+        return RedisStore(url, prefix=environ.get("BURA_STORE_PREFIX", "bura:"))
+    raise ValueError(f"Unsupported BURA_STORE_URL scheme: {scheme!r}")
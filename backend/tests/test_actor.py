@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from actor import RoomActor, RoomActors
+from game import Room, VARIANTS
+from models import Player, TableConfig
+
+
+def _room() -> Room:
+    return Room("actor", "Actor", VARIANTS["classic_2p"], TableConfig(max_players=2))
+
+
+def test_commands_run_in_order_and_batch_into_one_commit():
+    commits = []
+
+    async def on_commit(room):
+        commits.append(room.version)
+
+    async def scenario():
+        room = _room()
+        actor = RoomActor(room, on_commit)
+        applied = []
+
+        def command(name):
+            def apply(r):
+                applied.append(name)
+                r.touch()
+                return name
+            return apply
+
+        results = await asyncio.gather(*(actor.submit(command(idx)) for idx in range(5)))
+        assert results == list(range(5))
+        assert applied == list(range(5))
+        # Все пять команд пришли за один тик - одна рассылка
+        assert commits == [room.version]
+
+        await actor.submit(lambda r: None)  # без изменений - без рассылки
+        assert len(commits) == 1
+        actor.close()
+
+    asyncio.run(scenario())
+
+
+def test_command_errors_reach_the_caller_and_actor_keeps_running():
+    async def on_commit(room):
+        pass
+
+    async def scenario():
+        actors = RoomActors(on_commit)
+        room = _room()
+        with pytest.raises(ValueError):
+            await actors.submit(room, lambda r: r.play_cards("nobody", []))
+        await actors.submit(room, lambda r: r.add_player(Player(id="A", name="A")))
+        assert room.player("A") is not None
+        actor = actors.get(room)
+        actors.discard(room.id)
+        with pytest.raises(LookupError):
+            await actor.submit(lambda r: None)
+
+    asyncio.run(scenario())
+
+
+def test_full_mailbox_makes_senders_wait():
+    async def on_commit(room):
+        pass
+
+    async def scenario():
+        actor = RoomActor(_room(), on_commit)
+        actor.mailbox_size = 2
+        gate = asyncio.Event()
+
+        async def blocked(room):
+            await gate.wait()
+
+        first = asyncio.ensure_future(actor.submit(blocked))
+        await asyncio.sleep(0.01)
+        senders = [asyncio.ensure_future(actor.submit(lambda r: None)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        # Два места в ящике заняты, остальные отправители ждут
+        assert actor._mailbox.full()
+        assert not any(sender.done() for sender in senders)
+
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(first, *senders), timeout=1)
+        actor.close()
+
+    asyncio.run(scenario())
@@ -1,6 +1,8 @@
 import os, importlib
 from fastapi.testclient import TestClient
 
+from cards import card_index, iter_mask, mask_of
+from game import CARD_MODELS
 from models import Card
 
 os.environ.setdefault("ORIGIN", "http://localhost:5173")
@@ -92,6 +94,20 @@ def test_ws_invalid_action_returns_error_without_disconnect():
         repeat_error = ws.receive_json()
         assert repeat_error["type"] == "error"
 
+        # Испорченная команда отклоняется разбором, соединение остаётся
+        ws.send_json({"type": "play_cards", "cards": ["c_as"]})
+        malformed = ws.receive_json()
+        assert malformed == {"type": "error", "error": "Missing player_id"}
+
+        # Нехэшируемые type и id - тоже ошибка разбора, а не обрыв обработчика
+        ws.send_json({"type": "play", "player_id": "userA", "cards": [{"id": [1]}]})
+        assert ws.receive_json() == {"type": "error", "error": "Unknown card"}
+        ws.send_json({"type": [1]})
+        assert ws.receive_json() == {"type": "error", "error": "Invalid message type"}
+        # Обработчик жив: сокет по-прежнему зарегистрирован в хабе
+        assert len(app_mod.hub.rooms[room_id]) == 1
+        assert list(app_mod.hub.ws_player.values()) == ["userA"]
+
 
 def _make_card(suit: str, rank: int, idx: int) -> Card:
     return Card(id=f"test_{suit}_{rank}_{idx}", suit=suit, rank=rank)
@@ -115,18 +131,20 @@ def test_request_early_turn_via_ws():
     assert start_resp.status_code == 200
 
     room = app_mod.ROOMS[room_id]
-    room.hands["userA"] = [
+    hand_a = [
         _make_card("♥", 14, 1),
         _make_card("♣", 14, 1),
         _make_card("♥", 10, 1),
         _make_card("♦", 10, 1),
     ]
-    room.hands["userB"] = [
+    hand_b = [
         _make_card("♠", 6, 1),
         _make_card("♠", 7, 1),
         _make_card("♠", 8, 1),
         _make_card("♠", 9, 2),
     ]
+    room.hands["userA"] = mask_of(card_index(card.suit, card.rank) for card in hand_a)
+    room.hands["userB"] = mask_of(card_index(card.suit, card.rank) for card in hand_b)
     room.turn_idx = room._player_index("userB")
     room._refresh_deadline()
 
@@ -139,9 +157,9 @@ def test_request_early_turn_via_ws():
             "type": "request_early_turn",
             "player_id": "userA",
             "cards": [
-                room.hands["userA"][0].model_dump(mode="json"),
-                room.hands["userA"][1].model_dump(mode="json"),
-                room.hands["userA"][2].model_dump(mode="json"),
+                hand_a[0].model_dump(mode="json"),
+                hand_a[1].model_dump(mode="json"),
+                hand_a[2].model_dump(mode="json"),
                 _make_card("♠", 10, 2).model_dump(mode="json"),
             ],
         })
@@ -151,7 +169,7 @@ def test_request_early_turn_via_ws():
         ws.send_json({
             "type": "request_early_turn",
             "player_id": "userA",
-            "cards": [card.model_dump(mode="json") for card in room.hands["userA"]],
+            "cards": [CARD_MODELS[i].model_dump(mode="json") for i in iter_mask(room.hands["userA"])],
             "roundId": room.round_id,
         })
         event_message = ws.receive_json()
@@ -162,3 +180,273 @@ def test_request_early_turn_via_ws():
         state_update = ws.receive_json()
         assert state_update["type"] == "state"
         assert state_update["payload"]["turn_player_id"] == "userA"
+
+
+def test_ws_state_matches_rest_state_for_each_viewer():
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    create_resp = client.post(
+        "/api/game/create",
+        json={"variant_key": "classic_2p", "room_name": "Fanout"},
+        headers=headers_a,
+    )
+    room_id = create_resp.json()["room_id"]
+    headers_b = {"x-user-id": "userB", "x-user-name": "User B", "x-user-avatar": ""}
+    client.post("/api/game/join", json={"room_id": room_id}, headers=headers_b)
+    client.post(f"/api/game/start/{room_id}")
+
+    with client.websocket_connect(f"/ws/{room_id}?player_id=userA") as ws_a:
+        ws_a.receive_json()
+        with client.websocket_connect(f"/ws/{room_id}?player_id=userB") as ws_b:
+            for ws, user in ((ws_a, "userA"), (ws_b, "userB")):
+                message = ws.receive_json()
+                assert message["type"] == "state"
+                payload = message["payload"]
+                rest = client.get(f"/api/game/state/{room_id}", headers={"x-user-id": user}).json()
+                payload.pop("tablePlayers")
+                rest.pop("tablePlayers")
+                assert payload == rest
+                assert payload["me"]["id"] == user
+
+
+def test_ws_delta_mode_sends_patches_after_ack():
+    from delta import apply_patch
+
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    create_resp = client.post(
+        "/api/game/create",
+        json={"variant_key": "classic_2p", "room_name": "Delta"},
+        headers=headers_a,
+    )
+    room_id = create_resp.json()["room_id"]
+
+    with client.websocket_connect(f"/ws/{room_id}?player_id=userA&mode=delta") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "state"
+        assert snapshot["seq"] == 1
+        ws.send_json({"type": "ack", "seq": 1})
+
+        headers_b = {"x-user-id": "userB", "x-user-name": "User B", "x-user-avatar": ""}
+        client.post("/api/game/join", json={"room_id": room_id}, headers=headers_b)
+
+        patch = ws.receive_json()
+        assert patch["type"] == "patch"
+        assert patch["seq"] == 2
+        assert patch["base"] == 1
+        assert "players" in patch["set"]
+        assert "cards" not in patch["set"]
+
+        state = apply_patch(snapshot["payload"], patch)
+        rest = client.get(f"/api/game/state/{room_id}", headers=headers_a).json()
+        state.pop("tablePlayers")
+        rest.pop("tablePlayers")
+        assert state == rest
+
+        ws.send_json({"type": "resync"})
+        full = ws.receive_json()
+        assert full["type"] == "state"
+        assert full["seq"] == 3
+
+
+def test_cards_catalog_etag():
+    r = client.get("/api/cards/catalog")
+    assert r.status_code == 200
+    data = r.json()
+    assert len(data["cards"]) == 36
+    assert data["cards"][0]["imageUrl"].startswith("/cards/")
+    etag = r.headers["etag"]
+    assert etag == f'"{data["version"]}"'
+
+    cached = client.get("/api/cards/catalog", headers={"if-none-match": etag})
+    assert cached.status_code == 304
+
+
+def test_compact_state_refers_to_cards_by_id():
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    create_resp = client.post(
+        "/api/game/create",
+        json={"variant_key": "classic_2p", "room_name": "Compact"},
+        headers=headers_a,
+    )
+    room_id = create_resp.json()["room_id"]
+    headers_b = {"x-user-id": "userB", "x-user-name": "User B", "x-user-avatar": ""}
+    client.post("/api/game/join", json={"room_id": room_id}, headers=headers_b)
+    client.post(f"/api/game/start/{room_id}")
+
+    full = client.get(f"/api/game/state/{room_id}", headers=headers_a)
+    compact = client.get(f"/api/game/state/{room_id}?format=compact", headers=headers_a)
+    assert compact.status_code == 200
+    data = compact.json()
+    catalog = client.get("/api/cards/catalog").json()
+
+    assert "cards" not in data
+    assert data["cardsVersion"] == catalog["version"]
+    assert data["hands"] == [card["id"] for card in full.json()["hands"]]
+    assert isinstance(data["trump_card"], str)
+    assert len(compact.content) < len(full.content) // 2
+
+
+def test_state_etag_and_long_poll_timeout():
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    create_resp = client.post(
+        "/api/game/create",
+        json={"variant_key": "classic_2p", "room_name": "Poll"},
+        headers=headers_a,
+    )
+    room_id = create_resp.json()["room_id"]
+
+    first = client.get(f"/api/game/state/{room_id}", headers=headers_a)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    version = int(first.headers["x-room-version"])
+
+    cached = client.get(f"/api/game/state/{room_id}", headers={**headers_a, "if-none-match": etag})
+    assert cached.status_code == 304
+
+    idle = client.get(f"/api/game/state/{room_id}?since={version}&wait=0.2", headers=headers_a)
+    assert idle.status_code == 304
+
+    headers_b = {"x-user-id": "userB", "x-user-name": "User B", "x-user-avatar": ""}
+    client.post("/api/game/join", json={"room_id": room_id}, headers=headers_b)
+    changed = client.get(f"/api/game/state/{room_id}?since={version}&wait=5", headers=headers_a)
+    assert changed.status_code == 200
+    assert int(changed.headers["x-room-version"]) > version
+    assert len(changed.json()["players"]) == 2
+
+
+def test_fast_encoder_matches_stdlib_json():
+    import json
+    from pydantic_core import to_json
+
+    from encoding import dumps, dumps_bytes
+    from game import ROOMS
+
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    room_id = client.post(
+        "/api/game/create",
+        json={"variant_key": "classic_2p", "room_name": "Кодирование ♠"},
+        headers=headers_a,
+    ).json()["room_id"]
+    client.post("/api/game/join", json={"room_id": room_id}, headers={"x-user-id": "userB"})
+    client.post(f"/api/game/start/{room_id}")
+
+    room = ROOMS[room_id]
+    payload = room.state_payload("userA")
+    expected = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    assert dumps(payload) == expected
+    assert to_json(payload).decode() == expected
+    state = room.to_state("userA")
+    assert dumps_bytes(state) == state.model_dump_json(by_alias=True).encode()
+
+    resp = client.get(f"/api/game/state/{room_id}", headers=headers_a)
+    assert resp.content.decode() == dumps(resp.json())
+
+
+def test_ws_msgpack_subprotocol():
+    from encoding import MSGPACK_SUBPROTOCOL, pack, unpack
+
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    room_id = client.post(
+        "/api/game/create",
+        json={"variant_key": "classic_2p", "room_name": "Binary"},
+        headers=headers_a,
+    ).json()["room_id"]
+    client.post("/api/game/join", json={"room_id": room_id}, headers={"x-user-id": "userB"})
+    client.post(f"/api/game/start/{room_id}")
+
+    with client.websocket_connect(
+        f"/ws/{room_id}?player_id=userA", subprotocols=[MSGPACK_SUBPROTOCOL]
+    ) as ws:
+        assert ws.accepted_subprotocol == MSGPACK_SUBPROTOCOL
+        message = unpack(ws.receive_bytes())
+        assert message["type"] == "state"
+        rest = client.get(f"/api/game/state/{room_id}?format=compact", headers=headers_a).json()
+        message["payload"].pop("tablePlayers")
+        rest.pop("tablePlayers")
+        assert message["payload"] == rest
+        assert all(isinstance(card, str) for card in message["payload"]["hands"])
+
+        ws.send_bytes(pack({"type": "declare", "player_id": "userA", "combo": "unknown"}))
+        error = unpack(ws.receive_bytes())
+        assert error["type"] == "error"
+
+        ws.send_bytes(b"\xc1")
+        assert unpack(ws.receive_bytes())["type"] == "error"
+        # Текстовый кадр в MessagePack-соединении - ошибка, но не обрыв
+        ws.send_text('{"type": "resync"}')
+        assert unpack(ws.receive_bytes()) == {"type": "error", "error": "Expected binary MessagePack frame"}
+
+        current = message["payload"]["turn_player_id"]
+        hand = client.get(
+            f"/api/game/state/{room_id}?format=compact", headers={"x-user-id": current}
+        ).json()["hands"]
+        ws.send_bytes(pack({"type": "play_cards", "player_id": current, "cards": hand[:1]}))
+        update = unpack(ws.receive_bytes())
+        assert update["type"] == "state"
+        assert len(update["payload"]["table_cards"]) == 1
+
+    with client.websocket_connect("/ws/lobby", subprotocols=[MSGPACK_SUBPROTOCOL]) as lobby:
+        rooms = unpack(lobby.receive_bytes())
+        assert rooms["type"] == "rooms"
+        assert any(room["room_id"] == room_id for room in rooms["payload"])
+
+    with client.websocket_connect(f"/ws/{room_id}?player_id=userA") as ws:
+        assert ws.accepted_subprotocol is None
+        assert ws.receive_json()["type"] == "state"
+        ws.send_bytes(pack({"type": "resync"}))
+        assert ws.receive_json() == {"type": "error", "error": "Expected text JSON frame"}
+        ws.send_json({"type": "declare", "player_id": "userA", "combo": "unknown"})
+        assert ws.receive_json()["type"] == "error"
+    assert room_id not in app_mod.hub.rooms and not app_mod.hub.outboxes
+
+
+def test_rooms_filters_and_pagination():
+    host = {"x-user-id": "pager", "x-user-name": "Pager", "x-user-avatar": ""}
+    created = [
+        client.post(
+            "/api/game/create",
+            json={"variant_key": "classic_3p", "room_name": f"Page {idx}"},
+            headers=host,
+        ).json()["room_id"]
+        for idx in range(5)
+    ]
+
+    seen = []
+    cursor = None
+    while True:
+        query = "variant=classic_3p&not_started=true&limit=2"
+        if cursor is not None:
+            query += f"&cursor={cursor}"
+        resp = client.get(f"/api/rooms?{query}")
+        assert resp.status_code == 200
+        page = resp.json()
+        assert len(page) <= 2
+        assert all(room["variant"]["key"] == "classic_3p" and not room["started"] for room in page)
+        seen.extend(room["room_id"] for room in page)
+        cursor = resp.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert [room_id for room_id in seen if room_id in created] == created
+
+    everything = client.get("/api/rooms").json()
+    assert isinstance(everything, list)
+    assert client.get("/api/rooms?limit=0").status_code == 422
+
+
+def test_moves_endpoint_lists_the_current_players_moves():
+    headers_a = {"x-user-id": "userA", "x-user-name": "User A", "x-user-avatar": ""}
+    headers_b = {"x-user-id": "userB", "x-user-name": "User B", "x-user-avatar": ""}
+    room_id = client.post(
+        "/api/game/create", json={"variant_key": "classic_2p", "room_name": "Moves"}, headers=headers_a
+    ).json()["room_id"]
+    client.post("/api/game/join", json={"room_id": room_id}, headers=headers_b)
+    assert client.get(f"/api/game/moves/{room_id}", headers=headers_a).json()["moves"] == []
+    client.post(f"/api/game/start/{room_id}", headers=headers_a)
+
+    headers = headers_a if app_mod.ROOMS[room_id].current_player_id() == "userA" else headers_b
+    resp = client.get(f"/api/game/moves/{room_id}", headers=headers)
+    assert resp.status_code == 200
+    moves = resp.json()["moves"]
+    assert moves and all(move["kind"] in ("lead", "throw") for move in moves)
+    cached = client.get(f"/api/game/moves/{room_id}", headers={**headers, "if-none-match": resp.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get("/api/game/moves/missing", headers=headers).status_code == 404
@@ -0,0 +1,44 @@
+import pytest
+
+from commands import Declare, PlayCards, RequestEarlyTurn, decode_command
+from game import CARD_INDEX, CARD_MODELS
+from models import Card
+
+
+def test_decode_resolves_cards_by_id_without_pydantic(monkeypatch):
+    def no_validation(*args, **kwargs):
+        raise AssertionError("model_validate on the command path")
+
+    monkeypatch.setattr(Card, "model_validate", no_validation)
+    ace = CARD_INDEX["c_as"]
+    full = CARD_MODELS[ace].model_dump(by_alias=True)
+
+    assert decode_command({"type": "play_cards", "player_id": "A", "cards": ["c_as"], "roundId": "r_1", "trickIndex": 2}) == PlayCards("A", (ace,), "r_1", 2)
+    assert decode_command({"type": "play", "player_id": "A", "card": full}) == PlayCards("A", (ace,))
+    # Полная форма без известного id разбирается по масти и рангу
+    assert decode_command({"type": "play", "player_id": "A", "cards": [{"id": "x", "suit": "♠", "rank": 14}]}).cards == (ace,)
+    assert decode_command({"type": "declare", "player_id": "A", "combo": "bura"}) == Declare("A", "bura")
+    early = decode_command({"type": "request_early_turn", "player_id": "A", "cards": ["c_as", "c_ah", "c_ad", "c_ac"]})
+    assert isinstance(early, RequestEarlyTurn) and len(early.cards) == 4
+    assert decode_command({"type": "ping"}) is None
+
+
+@pytest.mark.parametrize(
+    "message, error",
+    [
+        ({"type": "play_cards", "cards": ["c_as"]}, "Missing player_id"),
+        ({"type": "play_cards", "player_id": "A", "cards": "c_as"}, "Must play one or more cards"),
+        ({"type": "play_cards", "player_id": "A", "cards": ["c_as"] * 5}, "Too many cards"),
+        ({"type": "play_cards", "player_id": "A", "cards": ["c_zz"]}, "Unknown card"),
+        ({"type": "play_cards", "player_id": "A", "cards": [{"suit": "♠", "rank": "A"}]}, "Unknown card"),
+        ({"type": "play", "player_id": "A", "cards": [{"id": [1]}]}, "Unknown card"),
+        ({"type": [1]}, "Invalid message type"),
+        ({"player_id": "A"}, "Invalid message type"),
+        ({"type": "play_cards", "player_id": "A", "cards": ["c_as"], "trickIndex": "1"}, "Invalid trickIndex"),
+        ({"type": "declare", "player_id": "A", "combo": 1}, "Unknown combination"),
+        ({"type": "request_early_turn", "player_id": "A", "cards": ["c_as"]}, "Нужно выбрать ровно 4 карты"),
+    ],
+)
+def test_decode_rejects_malformed_commands(message, error):
+    with pytest.raises(ValueError, match=error):
+        decode_command(message)
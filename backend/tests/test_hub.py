@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from game import ROOMS, Room, VARIANTS
+
+
+def test_timing_wheel_fires_in_order_across_levels():
+    from scheduler import TimingWheel
+
+    clock = [0.0]
+    wheel = TimingWheel(tick=0.1, levels=(8, 4, 4), clock=lambda: clock[0])
+    fired = []
+    delays = {"a": 0.05, "b": 0.7, "c": 2.5, "d": 9.0, "e": 30.0}
+    for key, delay in delays.items():
+        wheel.arm(key, delay, lambda key=key: fired.append((key, round(clock[0], 1))))
+    wheel.arm("cancelled", 1.0, lambda: fired.append(("cancelled", clock[0])))
+    assert wheel.cancel("cancelled")
+    wheel.arm("b", 0.8, lambda: fired.append(("b", round(clock[0], 1))))  # перевзвод
+
+    while clock[0] < 40:
+        clock[0] += 0.1
+        wheel.advance()
+    assert [key for key, _ in fired] == ["a", "b", "c", "d", "e"]
+    expected = {"a": 0.1, "b": 0.8, "c": 2.5, "d": 9.0, "e": 30.0}
+    assert all(abs(at - expected[key]) < 0.11 for key, at in fired)
+    assert len(wheel) == 0
+
+
+def test_hub_reconnect_deadlines_use_timer_wheel(monkeypatch):
+    import main
+    from models import Player, TableConfig
+    from scheduler import TimingWheel
+
+    clock = [100.0]
+
+    async def scenario():
+        hub = main.Hub(TimingWheel(clock=lambda: clock[0]))
+        room = Room("grace", "Grace", VARIANTS["classic_2p"], TableConfig(max_players=2))
+        monkeypatch.setitem(ROOMS, room.id, room)
+        for pid in ("A", "B"):
+            room.add_player(Player(id=pid, name=pid))
+        hub._mark_disconnected(room.id, "A")
+        hub._mark_disconnected(room.id, "B")
+        assert hub.is_player_disconnected(room.id, "A")
+        assert hub._clear_disconnected(room.id, "B")  # B переподключился
+        assert ("reconnect", room.id, "B") not in hub.timers
+
+        clock[0] += hub.reconnect_timeout_sec - 1
+        hub.timers.advance()
+        await asyncio.sleep(0)
+        assert room.player("A") is not None
+
+        clock[0] += 2
+        hub.timers.advance()
+        await asyncio.sleep(0.01)
+        return room, hub
+
+    room, hub = asyncio.run(scenario())
+    assert room.player("A") is None and room.player("B") is not None
+    assert hub.disconnected_players == {}
+
+
+def test_room_timers_apply_turn_timeout_and_next_round(monkeypatch):
+    import game
+    import main
+    from models import Player, TableConfig
+
+    monkeypatch.setattr(game, "REVEAL_DELAY_SECONDS", 0.05)
+
+    async def scenario():
+        room = Room("timers", "Timers", VARIANTS["classic_2p"], TableConfig(max_players=2))
+        monkeypatch.setitem(ROOMS, room.id, room)
+        for pid in ("A", "B"):
+            room.add_player(Player(id=pid, name=pid))
+        room.start()
+        offender = room.current_player_id()
+        first_round = room.round_number
+        room.turn_deadline = time.time() + 0.05
+        await main.broadcast_room(room.id)
+        assert main.room_timers.deadline(room.id) == room.turn_deadline
+
+        await asyncio.sleep(0.3)
+        main.room_timers.cancel(room.id)
+        return room, offender, first_round
+
+    room, offender, first_round = asyncio.run(scenario())
+    assert room.scores[offender] == 6
+    assert room.round_number == first_round + 1
+    assert room.round_active
+
+
+def test_evicted_room_leaves_no_hub_entries(monkeypatch):
+    import main
+    from models import Player, TableConfig
+
+    async def scenario():
+        room = Room("stale", "Stale", VARIANTS["classic_2p"], TableConfig(max_players=2))
+        for pid in ("A", "B"):
+            room.add_player(Player(id=pid, name=pid))
+        room.start()
+        ROOMS[room.id] = room
+        main.hub._mark_disconnected(room.id, "A")
+        await main.evict_room(room.id, "orphaned")
+        main.room_timers.cancel(room.id)
+
+    asyncio.run(scenario())
+    assert "stale" not in ROOMS and "stale" not in main.actors
+    assert "stale" not in main.hub.disconnected_players
+    assert ("reconnect", "stale", "A") not in main.hub.timers
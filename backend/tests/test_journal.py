@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+
+from game import Room, VARIANTS
+from journal import JOURNAL_FILE, SNAPSHOT_FILE, RoomJournal
+from models import Player, TableConfig
+
+
+def _room(room_id: str) -> Room:
+    room = Room(room_id, room_id, VARIANTS["classic_2p"], TableConfig(max_players=2))
+    room.add_player(Player(id="A", name="A"))
+    return room
+
+
+def test_journal_replays_latest_room_images(tmp_path):
+    journal = RoomJournal(str(tmp_path))
+    assert journal.open() == []
+    first, second = _room("r1"), _room("r2")
+    journal.record(first)
+    first.add_player(Player(id="B", name="B"))
+    first.start()
+    journal.record(first)
+    journal.record(second)
+    journal.removed("r2")
+    assert journal.flush()
+    journal.close()
+
+    reopened = RoomJournal(str(tmp_path))
+    restored = [Room.restore(data) for data in reopened.open()]
+    reopened.close()
+    assert [room.id for room in restored] == ["r1"]
+    assert restored[0].version == first.version
+    assert restored[0].state_payload("A") == first.state_payload("A")
+
+
+def test_journal_compacts_into_snapshot_and_skips_torn_tail(tmp_path):
+    journal = RoomJournal(str(tmp_path))
+    journal.snapshot_bytes = 1  # свернуть после первой же группы
+    journal.open()
+    room = _room("r1")
+    for _ in range(3):
+        room.touch()
+        journal.record(room)
+        assert journal.flush()
+    journal.close()
+    # После сворачивания в снимке одна комната, журнал пуст
+    with open(tmp_path / SNAPSHOT_FILE, "rb") as fh:
+        assert len(fh.readlines()) == 1
+    assert os.path.getsize(tmp_path / JOURNAL_FILE) == 0
+
+    # Сбой посреди записи оставил оборванную строку
+    with open(tmp_path / JOURNAL_FILE, "ab") as fh:
+        fh.write(b'{"room_id": "r1", "vers')
+    reopened = RoomJournal(str(tmp_path))
+    images = reopened.open()
+    reopened.close()
+    assert [Room.restore(data).version for data in images] == [room.version]
+
+
+def test_journal_snapshots_each_changed_room_once_per_window(tmp_path, monkeypatch):
+    snapshots = []
+    snapshot = Room.snapshot
+    monkeypatch.setattr(Room, "snapshot", lambda room: snapshots.append(room.id) or snapshot(room))
+    journal = RoomJournal(str(tmp_path))
+    journal.open()
+    room = _room("busy")
+
+    async def scenario():
+        for _ in range(5):
+            room.touch()
+            journal.record(room)
+        # record только отмечает комнату, образ снимается в конце окна
+        assert snapshots == []
+        await asyncio.sleep(journal.group_window * 4)
+        assert snapshots == ["busy"]
+
+    asyncio.run(scenario())
+    assert journal.flush()
+    journal.close()
+    reopened = RoomJournal(str(tmp_path))
+    assert [data["version"] for data in reopened.open()] == [room.version]
+    reopened.close()
+
+
+def test_restored_turn_deadline_skips_server_downtime(tmp_path, monkeypatch):
+    import main
+
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    room = _room("late")
+    room.add_player(Player(id="B", name="B"))
+    room.start()
+    room.match_id = None
+    remaining = room.turn_deadline - clock[0]
+    journal = RoomJournal(str(tmp_path))
+    journal.open()
+    journal.record(room)
+    assert journal.flush()
+    journal.close()
+
+    # Сервер лежал дольше, чем оставалось на ход
+    clock[0] += 10 * remaining
+    monkeypatch.setattr(main, "journal", RoomJournal(str(tmp_path)))
+    main.restore_rooms()
+    try:
+        restored = main.ROOMS["late"]
+        assert restored.turn_deadline == clock[0] + remaining
+        restored._check_timeout()
+        assert restored.round_active and set(restored.scores.values()) == {0}
+    finally:
+        main.journal.close()
+        main.ROOMS.pop("late", None)
+        main.room_timers.cancel("late")
+        main.reaper.forget("late")
+        asyncio.run(main.hub.drop_room("late"))
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+from game import ROOMS, Room, VARIANTS
+from lobby import LobbyFilter, page_rooms, room_changes
+from models import Player, TableConfig
+from outbox import Outbox
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes):
+        raise AssertionError("unexpected binary frame")
+
+
+def _room(room_id: str, variant: str = "classic_2p", players: int = 1) -> Room:
+    room = Room(room_id, room_id, VARIANTS[variant], TableConfig(max_players=VARIANTS[variant].players_max))
+    for idx in range(players):
+        room.add_player(Player(id=f"{room_id}-{idx}", name="P"))
+    return room
+
+
+def test_filter_events_follow_membership():
+    waiting = LobbyFilter(not_started=True, free_seats=True)
+    room = _room("f1")
+    before = dict(room.lobby_entry())
+    room.add_player(Player(id="f1-x", name="X"))
+    after = room.lobby_entry()
+
+    changes = room_changes({"f1": before}, {"f1": after})
+    assert waiting.events(changes) == [{"type": "room_removed", "room_id": "f1"}]
+    assert LobbyFilter().events(changes) == [{"type": "room_updated", "payload": after}]
+    assert LobbyFilter(variant="classic_3p").events(changes) == []
+    assert LobbyFilter().events(room_changes({}, {"f1": after})) == [{"type": "room_added", "payload": after}]
+
+
+def test_page_rooms_cursor_survives_removals():
+    rooms = [_room(f"p{idx}", players=idx % 3) for idx in range(7)]
+    first, cursor = page_rooms(rooms, LobbyFilter(), limit=3)
+    assert [entry["room_id"] for entry in first] == ["p0", "p1", "p2"]
+    rest = [room for room in rooms if room.id != "p3"]
+    second, cursor = page_rooms(rest, LobbyFilter(), cursor=cursor, limit=3)
+    assert [entry["room_id"] for entry in second] == ["p4", "p5", "p6"]
+    assert cursor is None
+
+    free, _ = page_rooms(rooms, LobbyFilter(free_seats=True), limit=10)
+    assert all(entry["players"] < entry["players_max"] for entry in free)
+
+
+def test_hub_sends_events_to_event_subscribers(monkeypatch):
+    import main
+
+    async def scenario():
+        hub = main.Hub()
+        events_ws, list_ws, other_ws = RecordingSocket(), RecordingSocket(), RecordingSocket()
+        subs = {
+            events_ws: (LobbyFilter(not_started=True), True),
+            list_ws: (LobbyFilter(), False),
+            other_ws: (LobbyFilter(variant="classic_3p"), True),
+        }
+        hub._lobby_pushed = {entry["room_id"]: entry for entry in main.list_rooms_summary()}
+        for ws, sub in subs.items():
+            hub.outboxes[ws] = Outbox(ws, hub.evict)
+            hub.lobby[ws] = None
+            hub.lobby_subs[ws] = sub
+
+        room = _room("ev1")
+        monkeypatch.setitem(ROOMS, "ev1", room)
+        hub.send_lobby()
+        await asyncio.sleep(0.01)
+        room.add_player(Player(id="ev1-b", name="B"))
+        room.start()
+        hub.send_lobby()
+        hub.send_lobby()  # без изменений ничего не отправляется
+        await asyncio.sleep(0.01)
+        for outbox in hub.outboxes.values():
+            outbox.close()
+        return events_ws.sent, list_ws.sent, other_ws.sent
+
+    events, lists, other = asyncio.run(scenario())
+    assert [event["type"] for event in events] == ["room_added", "room_removed"]
+    assert events[0]["payload"]["room_id"] == "ev1"
+    assert len(lists) == 2 and all(message["type"] == "rooms" for message in lists)
+    assert lists[-1]["payload"][-1]["started"] is True
+    assert other == []
+
+
+def test_hub_filters_lobby_once_per_distinct_filter(monkeypatch):
+    import main
+
+    calls = []
+    apply, events = LobbyFilter.apply, LobbyFilter.events
+    monkeypatch.setattr(LobbyFilter, "apply", lambda self, entries: calls.append(("apply", self)) or apply(self, entries))
+    monkeypatch.setattr(LobbyFilter, "events", lambda self, changes: calls.append(("events", self)) or events(self, changes))
+    waiting, everything = LobbyFilter(not_started=True), LobbyFilter()
+
+    async def scenario():
+        hub = main.Hub()
+        hub._lobby_pushed = {}
+        sockets = {}
+        for idx in range(6):
+            ws = RecordingSocket()
+            sockets[ws] = waiting if idx % 2 else everything
+            hub.outboxes[ws] = Outbox(ws, hub.evict)
+            hub.lobby[ws] = None
+            hub.lobby_subs[ws] = (sockets[ws], False)
+        monkeypatch.setitem(ROOMS, "shared", _room("shared"))
+        hub.send_lobby()
+        await asyncio.sleep(0.01)
+        for outbox in hub.outboxes.values():
+            outbox.close()
+        return sockets
+
+    sockets = asyncio.run(scenario())
+    assert sorted(calls, key=repr) == sorted(
+        [("apply", waiting), ("apply", everything), ("events", waiting), ("events", everything)], key=repr
+    )
+    for ws, lobby_filter in sockets.items():
+        assert len(ws.sent) == 1 and ws.sent[0]["payload"] == lobby_filter.apply(main.lobby_rooms())
@@ -0,0 +1,163 @@
+import asyncio
+
+from game import ROOMS, Room, VARIANTS
+from lobby import LobbyFilter
+from outbox import STATE_KEY, Outbox
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, data: str):
+        await self.gate.wait()
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes):
+        await self.send_text(data)
+
+
+async def _settle():
+    await asyncio.sleep(0.01)
+
+
+def test_outbox_coalesces_state_and_keeps_event_order():
+    async def scenario():
+        ws = FakeSocket()
+        ws.gate.clear()
+        outbox = Outbox(ws, on_evict=lambda _: asyncio.sleep(0))
+        outbox.push("first", key=STATE_KEY)
+        await _settle()  # писатель взял "first" и ждёт сокет
+        outbox.push("state-1", key=STATE_KEY)
+        outbox.push("event")
+        outbox.push("state-2", key=STATE_KEY)
+        ws.gate.set()
+        await _settle()
+        outbox.close()
+        return ws.sent
+
+    assert asyncio.run(scenario()) == ["first", "event", "state-2"]
+
+
+def test_outbox_evicts_stalled_consumer():
+    async def scenario():
+        ws = FakeSocket()
+        ws.gate.clear()
+        evicted = []
+
+        async def on_evict(sock):
+            evicted.append(sock)
+
+        outbox = Outbox(ws, on_evict)
+        outbox.send_timeout = 0.01
+        outbox.push("stuck")
+        await asyncio.sleep(0.05)
+        await _settle()
+        return outbox, evicted, ws
+
+    outbox, evicted, ws = asyncio.run(scenario())
+    assert evicted == [ws]
+    assert outbox.closed
+    assert outbox.push("late") is False
+
+
+def test_outbox_evicts_on_overflow():
+    async def scenario():
+        ws = FakeSocket()
+        ws.gate.clear()
+        evicted = []
+
+        async def on_evict(sock):
+            evicted.append(sock)
+
+        outbox = Outbox(ws, on_evict)
+        outbox.max_pending = 3
+        results = [outbox.push(f"event-{i}") for i in range(5)]
+        await _settle()
+        return results, evicted
+
+    results, evicted = asyncio.run(scenario())
+    assert results == [True, True, True, False, False]
+    assert len(evicted) == 1
+
+
+def _add_room(monkeypatch, room_id: str) -> Room:
+    room = Room(room_id, room_id, VARIANTS["classic_2p"])
+    monkeypatch.setitem(ROOMS, room_id, room)
+    return room
+
+
+def test_hub_broadcast_does_not_wait_for_slow_socket(monkeypatch):
+    import main
+
+    _add_room(monkeypatch, "slow-lobby")
+
+    async def scenario():
+        hub = main.Hub()
+        slow, fast = FakeSocket(), FakeSocket()
+        slow.gate.clear()
+        for ws in (slow, fast):
+            hub.outboxes[ws] = Outbox(ws, hub.evict)
+            hub.lobby[ws] = None
+        hub.send_lobby()
+        await _settle()
+        sent = list(fast.sent), list(slow.sent), hub.lobby_frame(LobbyFilter(), False)
+        for outbox in hub.outboxes.values():
+            outbox.close()
+        return sent
+
+    fast_sent, slow_sent, frame = asyncio.run(scenario())
+    assert fast_sent == [frame]
+    assert slow_sent == []
+
+
+def test_lobby_broadcasts_are_coalesced(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "LOBBY_BROADCAST_DELAY_SEC", 0.02)
+
+    async def scenario():
+        hub = main.Hub()
+        ws = FakeSocket()
+        hub.outboxes[ws] = Outbox(ws, hub.evict)
+        hub.lobby[ws] = None
+        hub._lobby_pushed = {}
+        for idx in range(10):
+            _add_room(monkeypatch, f"burst-{idx}")
+            hub.schedule_lobby()
+        await asyncio.sleep(0.05)
+        hub.schedule_lobby()  # список не изменился - повторной рассылки нет
+        await asyncio.sleep(0.05)
+        hub.outboxes[ws].close()
+        return ws.sent, hub.lobby_frame(LobbyFilter(), False)
+
+    sent, frame = asyncio.run(scenario())
+    assert sent == [frame]
+
+
+def test_lobby_flush_builds_room_list_once(monkeypatch):
+    import main
+
+    builds = []
+    original = main.lobby_rooms
+    monkeypatch.setattr(main, "lobby_rooms", lambda: builds.append(1) or original())
+
+    async def scenario():
+        hub = main.Hub()
+        hub._lobby_pushed = {}
+        sockets = [FakeSocket() for _ in range(5)]
+        for ws in sockets:
+            hub.outboxes[ws] = Outbox(ws, hub.evict)
+            hub.lobby[ws] = None
+        _add_room(monkeypatch, "once")
+        hub.send_lobby()
+        await _settle()
+        for outbox in hub.outboxes.values():
+            outbox.close()
+        return [ws.sent for ws in sockets]
+
+    sent = asyncio.run(scenario())
+    assert len(builds) == 1
+    assert all(frames == sent[0] for frames in sent) and len(sent[0]) == 1
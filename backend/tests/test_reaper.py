@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from game import Room, RoomRegistry, VARIANTS
+from models import Player, TableConfig
+from reaper import RoomReaper
+from scheduler import TimingWheel
+
+
+def _room(room_id: str) -> Room:
+    room = Room(room_id, room_id, VARIANTS["classic_2p"], TableConfig(max_players=2))
+    room.add_player(Player(id=f"{room_id}-a", name="A"))
+    return room
+
+
+def _reaper(monkeypatch, clock, **limits):
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    rooms = RoomRegistry()
+    wheel = TimingWheel(tick=1.0, clock=lambda: clock[0])
+    evicted = []
+
+    async def on_evict(room_id, reason):
+        evicted.append((room_id, reason))
+        rooms.pop(room_id)
+        reaper.forget(room_id)
+
+    reaper = RoomReaper(rooms, wheel, on_evict, has_sockets=lambda room_id: False, **limits)
+    return rooms, wheel, reaper, evicted
+
+
+def test_reaper_evicts_rooms_after_their_idle_ttl(monkeypatch):
+    clock = [1000.0]
+    rooms, wheel, reaper, evicted = _reaper(monkeypatch, clock, lobby_ttl=60, finished_ttl=10, orphan_ttl=30)
+
+    async def scenario():
+        for room_id in ("lobby", "finished", "orphan"):
+            rooms[room_id] = _room(room_id)
+        rooms["finished"].match_over = True
+        rooms["orphan"].started = True
+        for room in list(rooms.values()):
+            reaper.track(room)
+
+        for _ in range(40):
+            clock[0] += 1
+            wheel.advance()
+            await asyncio.sleep(0)
+            if clock[0] == 1020:
+                # Активность продлевает срок стола в лобби
+                rooms["lobby"].touch()
+                reaper.track(rooms["lobby"])
+        assert evicted == [("finished", "finished"), ("orphan", "orphaned")]
+
+        for _ in range(50):
+            clock[0] += 1
+            wheel.advance()
+            await asyncio.sleep(0)
+        assert evicted[-1] == ("lobby", "lobby_idle")
+        assert rooms == {} and len(wheel) == 0
+
+    asyncio.run(scenario())
+
+
+def test_reaper_caps_room_count_by_least_recent_activity(monkeypatch):
+    clock = [1000.0]
+    rooms, wheel, reaper, evicted = _reaper(monkeypatch, clock, max_rooms=2)
+
+    async def scenario():
+        for room_id in ("a", "b", "c"):
+            clock[0] += 1
+            rooms[room_id] = _room(room_id)
+            reaper.track(rooms[room_id])
+            if room_id == "b":
+                # "a" снова активна - дольше всех не менялась "b"
+                rooms["a"].touch()
+                reaper.track(rooms["a"])
+        clock[0] += 1
+        wheel.advance()
+        await asyncio.sleep(0)
+        assert evicted == [("b", "capacity")]
+        assert sorted(rooms) == ["a", "c"]
+
+    asyncio.run(scenario())
@@ -1,8 +1,26 @@
+import asyncio
+import itertools
+import json
+import random
 import time
+
 import pytest
 
-from game import Room, VARIANTS
-from models import Card, Player
+from cards import DECK_SIZE, NO_TRUMP, card_index, iter_mask, mask_of, mask_points, max_beat_count, trump_index
+from game import CARD_MODELS, Room, VARIANTS
+from models import Card, Player, TableConfig
+
+
+def idx(card: Card) -> int:
+    return card_index(card.suit, card.rank)
+
+
+def cards_mask(*cards: Card) -> int:
+    return mask_of(idx(card) for card in cards)
+
+
+def hand_cards(room: Room, player_id: str) -> list[Card]:
+    return [CARD_MODELS[i] for i in iter_mask(room.hands[player_id])]
 
 
 def make_room(two_players: bool = True) -> Room:
@@ -17,9 +35,9 @@ def make_room(two_players: bool = True) -> Room:
     # simplify deterministic state
     room.deck = []
     room.trump = "♣"
-    room.trump_card = Card(suit="♣", rank=6)
-    room.hands = {pid: [] for pid in player_ids}
-    room.taken_cards = {pid: [] for pid in player_ids}
+    room.trump_card = idx(Card(suit="♣", rank=6))
+    room.hands = {pid: 0 for pid in player_ids}
+    room.taken_cards = {pid: 0 for pid in player_ids}
     room.discard_pile = []
     room.round_summary = {}
     room.turn_idx = 0
@@ -29,8 +47,8 @@ def make_room(two_players: bool = True) -> Room:
 
 def test_trick_resolution_and_owner_switch():
     room = make_room()
-    room.hands["A"] = [Card(suit="♠", rank=14), Card(suit="♠", rank=13), Card(suit="♦", rank=6)]
-    room.hands["B"] = [Card(suit="♣", rank=10), Card(suit="♣", rank=9), Card(suit="♦", rank=7)]
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=14), Card(suit="♠", rank=13), Card(suit="♦", rank=6))
+    room.hands["B"] = cards_mask(Card(suit="♣", rank=10), Card(suit="♣", rank=9), Card(suit="♦", rank=7))
 
     room.play_cards("A", [Card(suit="♠", rank=14), Card(suit="♠", rank=13)])
     assert room.current_trick is not None
@@ -38,15 +56,15 @@ def test_trick_resolution_and_owner_switch():
 
     room.play_cards("B", [Card(suit="♣", rank=10), Card(suit="♣", rank=9)])
     assert room.current_trick is None  # trick finished (2 players)
-    assert room.taken_cards["B"] and len(room.taken_cards["B"]) == 4
+    assert room.taken_cards["B"] and room.taken_cards["B"].bit_count() == 4
     assert room.last_trick_winner_id == "B"
     assert room.turn_idx == room._player_index("B")
 
 
 def test_partial_response_keeps_owner():
     room = make_room()
-    room.hands["A"] = [Card(suit="♠", rank=12), Card(suit="♠", rank=11), Card(suit="♥", rank=6)]
-    room.hands["B"] = [Card(suit="♣", rank=10), Card(suit="♠", rank=6), Card(suit="♦", rank=7)]
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=12), Card(suit="♠", rank=11), Card(suit="♥", rank=6))
+    room.hands["B"] = cards_mask(Card(suit="♣", rank=10), Card(suit="♠", rank=6), Card(suit="♦", rank=7))
 
     room.play_cards("A", [Card(suit="♠", rank=12), Card(suit="♠", rank=11)])
     assert room.current_trick is not None
@@ -55,101 +73,101 @@ def test_partial_response_keeps_owner():
     room.play_cards("B", [Card(suit="♣", rank=10), Card(suit="♠", rank=6)])
     assert room.current_trick is None
     assert room.last_trick_winner_id == "A"
-    assert room.taken_cards["A"] and len(room.taken_cards["A"]) == 4
+    assert room.taken_cards["A"] and room.taken_cards["A"].bit_count() == 4
 
 
 def test_ten_outranks_face_cards():
     room = make_room()
-    assert room._beats(Card(suit="♠", rank=10), Card(suit="♠", rank=13))
-    assert room._beats(Card(suit="♠", rank=14), Card(suit="♠", rank=10))
-    assert not room._beats(Card(suit="♠", rank=13), Card(suit="♠", rank=10))
+    assert room._beats(idx(Card(suit="♠", rank=10)), idx(Card(suit="♠", rank=13)))
+    assert room._beats(idx(Card(suit="♠", rank=14)), idx(Card(suit="♠", rank=10)))
+    assert not room._beats(idx(Card(suit="♠", rank=13)), idx(Card(suit="♠", rank=10)))
 
 
 def test_leader_can_throw_four_combo():
     room = make_room()
-    room.hands["A"] = [
+    room.hands["A"] = cards_mask(
         Card(suit="♠", rank=14),
         Card(suit="♥", rank=14),
         Card(suit="♦", rank=14),
         Card(suit="♣", rank=14),
-    ]
-    room.hands["B"] = [
+    )
+    room.hands["B"] = cards_mask(
         Card(suit="♠", rank=9),
         Card(suit="♥", rank=9),
         Card(suit="♦", rank=9),
         Card(suit="♣", rank=9),
-    ]
+    )
 
-    room.play_cards("A", list(room.hands["A"]))
+    room.play_cards("A", hand_cards(room, "A"))
     assert room.current_trick is not None
     assert room.current_trick.required_count == 4
 
 
 def test_leader_can_throw_ace_and_tens_combo():
     room = make_room()
-    room.hands["A"] = [
+    room.hands["A"] = cards_mask(
         Card(suit="♠", rank=14),
         Card(suit="♥", rank=10),
         Card(suit="♦", rank=10),
         Card(suit="♣", rank=10),
-    ]
-    room.hands["B"] = [
+    )
+    room.hands["B"] = cards_mask(
         Card(suit="♠", rank=9),
         Card(suit="♥", rank=9),
         Card(suit="♦", rank=9),
         Card(suit="♣", rank=9),
-    ]
+    )
 
-    room.play_cards("A", list(room.hands["A"]))
+    room.play_cards("A", hand_cards(room, "A"))
     assert room.current_trick is not None
     assert room.current_trick.required_count == 4
 
 
 def test_invalid_four_combo_rejected():
     room = make_room()
-    room.hands["A"] = [
+    room.hands["A"] = cards_mask(
         Card(suit="♠", rank=14),
         Card(suit="♥", rank=13),
         Card(suit="♦", rank=12),
         Card(suit="♣", rank=11),
-    ]
-    room.hands["B"] = [
+    )
+    room.hands["B"] = cards_mask(
         Card(suit="♠", rank=9),
         Card(suit="♥", rank=9),
         Card(suit="♦", rank=9),
         Card(suit="♣", rank=9),
-    ]
+    )
 
     with pytest.raises(ValueError):
-        room.play_cards("A", list(room.hands["A"]))
+        room.play_cards("A", hand_cards(room, "A"))
 
 
 def test_four_of_a_kind_non_special_rejected():
     room = make_room()
-    room.hands["A"] = [
+    room.hands["A"] = cards_mask(
         Card(suit="♠", rank=13),
         Card(suit="♥", rank=13),
         Card(suit="♦", rank=13),
         Card(suit="♣", rank=13),
-    ]
-    room.hands["B"] = [
+    )
+    room.hands["B"] = cards_mask(
         Card(suit="♠", rank=9),
         Card(suit="♥", rank=9),
         Card(suit="♦", rank=9),
         Card(suit="♣", rank=9),
-    ]
+    )
 
     with pytest.raises(ValueError):
-        room.play_cards("A", list(room.hands["A"]))
+        room.play_cards("A", hand_cards(room, "A"))
 
 
 def test_reveal_delay_keeps_board_visible():
     room = make_room()
-    room.hands["A"] = [Card(suit="♠", rank=14), Card(suit="♠", rank=13)]
-    room.hands["B"] = [Card(suit="♣", rank=10), Card(suit="♣", rank=9)]
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=14), Card(suit="♠", rank=13))
+    room.hands["B"] = cards_mask(Card(suit="♣", rank=10), Card(suit="♣", rank=9))
 
-    room.play_cards("A", list(room.hands["A"]))
-    room.play_cards("B", list(room.hands["B"]))
+    room.play_cards("A", hand_cards(room, "A"))
+    room.play_cards("B", hand_cards(room, "B"))
 
     assert room.reveal_until_ts is not None
     state = room.to_state("A")
@@ -158,13 +176,15 @@ def test_reveal_delay_keeps_board_visible():
 
     room.reveal_until_ts = time.time() - 1
     room.to_state("A")
+    assert room.reveal_snapshot is not None  # чтение не применяет таймеры
+    room.advance_timers()
     assert room.reveal_snapshot is None
 
 
 def test_board_state_includes_card_metadata():
     room = make_room()
-    room.hands["A"] = [Card(suit="♠", rank=14), Card(suit="♠", rank=13)]
-    room.hands["B"] = [Card(suit="♣", rank=10), Card(suit="♣", rank=9)]
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=14), Card(suit="♠", rank=13))
+    room.hands["B"] = cards_mask(Card(suit="♣", rank=10), Card(suit="♣", rank=9))
 
     room.play_cards("A", [Card(suit="♠", rank=14)])
     room.play_cards("B", [Card(suit="♣", rank=10)])
@@ -183,8 +203,8 @@ def test_board_state_includes_card_metadata():
 def test_penalties_and_round_summary():
     room = make_room()
     room.taken_cards = {
-        "A": [Card(suit="♠", rank=14), Card(suit="♠", rank=10)],
-        "B": [],
+        "A": cards_mask(Card(suit="♠", rank=14), Card(suit="♠", rank=10)),
+        "B": 0,
     }
     room.round_active = True
     points = room._calculate_round_result()
@@ -211,8 +231,8 @@ def test_match_finishes_when_penalties_reach_twelve():
     room = make_room()
     room.scores = {"A": 0, "B": 8}
     room.taken_cards = {
-        "A": [Card(suit="♠", rank=14), Card(suit="♠", rank=10)],
-        "B": [],
+        "A": cards_mask(Card(suit="♠", rank=14), Card(suit="♠", rank=10)),
+        "B": 0,
     }
     room.round_active = True
 
@@ -276,13 +296,13 @@ def test_round_draw_no_penalties():
 
 def test_declare_combination():
     room = make_room()
-    room.hands["A"] = [
+    room.hands["A"] = cards_mask(
         Card(suit="♣", rank=14),
         Card(suit="♣", rank=13),
         Card(suit="♣", rank=12),
         Card(suit="♣", rank=11),
-    ]
-    room.declared_combos = {"A": set()}
+    )
+    room.declared_combos = {"A": 0}
 
     room.declare_combination("A", "bura")
     assert len(room.announcements) == 1
@@ -296,14 +316,14 @@ def test_declare_combination():
 
 def test_declare_after_first_trick_rejected():
     room = make_room()
-    room.hands["A"] = [Card(suit="♠", rank=9)]
-    room.hands["B"] = [
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=9))
+    room.hands["B"] = cards_mask(
         Card(suit="♣", rank=14),
         Card(suit="♣", rank=13),
         Card(suit="♣", rank=12),
         Card(suit="♣", rank=11),
         Card(suit="♠", rank=6),
-    ]
+    )
 
     room.play_cards("A", [Card(suit="♠", rank=9)])
     room.play_cards("B", [Card(suit="♠", rank=6)])
@@ -324,19 +344,313 @@ def test_draw_up_from_deck_round_robin_distribution():
         Card(suit="♣", rank=9),
         Card(suit="♠", rank=10),
     ]
-    room.deck = list(deck_cards)
-    room.card_catalog = {card.id: card for card in deck_cards}
-    room.hands["A"] = []
-    room.hands["B"] = []
-    room.hands["C"] = []
+    room.deck = [idx(card) for card in deck_cards]
+    room.hands["A"] = 0
+    room.hands["B"] = 0
+    room.hands["C"] = 0
 
     room._draw_up_from_deck("B")
 
-    assert [card.id for card in room.hands["B"]] == [deck_cards[0].id, deck_cards[3].id]
-    assert [card.id for card in room.hands["C"]] == [deck_cards[1].id, deck_cards[4].id]
-    assert [card.id for card in room.hands["A"]] == [deck_cards[2].id]
+    assert room.hands["B"] == cards_mask(deck_cards[0], deck_cards[3])
+    assert room.hands["C"] == cards_mask(deck_cards[1], deck_cards[4])
+    assert room.hands["A"] == cards_mask(deck_cards[2])
     assert room.deck == []
 
     state = room.to_state("C")
     assert state.hand_counts == {"A": 1, "B": 2, "C": 2}
     assert state.deck_count == 0
+
+
+def test_card_engine_masks_and_points():
+    ace = idx(Card(suit="♠", rank=14))
+    ten = idx(Card(suit="♠", rank=10))
+    king = idx(Card(suit="♠", rank=13))
+    assert ace > ten > king  # higher index means stronger card within a suit
+
+    assert mask_points(cards_mask(Card(suit="♠", rank=14), Card(suit="♥", rank=10), Card(suit="♣", rank=6))) == 21
+    assert list(iter_mask(mask_of([ten, ace, king]))) == [king, ten, ace]
+
+
+def test_mask_counts_and_points_match_a_recount():
+    from cards import CARD_RANK, CARD_SUIT_INDEX, CARD_VALUE, RANK_MASKS, SUIT_MASKS, mask_count
+
+    rng = random.Random(23)
+    for _ in range(200):
+        pile = rng.sample(range(DECK_SIZE), rng.randint(0, DECK_SIZE))
+        mask = mask_of(pile)
+        assert mask_points(mask) == sum(CARD_VALUE[card] for card in pile)
+        for suit, suit_mask in enumerate(SUIT_MASKS):
+            assert mask_count(mask & suit_mask) == sum(CARD_SUIT_INDEX[card] == suit for card in pile)
+        for rank, rank_mask in RANK_MASKS.items():
+            assert mask_count(mask & rank_mask) == sum(CARD_RANK[card] == rank for card in pile)
+
+
+def _brute_force_beat_count(room: Room, challenger, owner_cards) -> int:
+    best = 0
+    for perm in itertools.permutations(challenger):
+        best = max(best, sum(room._beats(a, b) for a, b in zip(perm, owner_cards)))
+    return best
+
+
+def test_matching_resolver_agrees_with_exhaustive_search():
+    rng = random.Random(7)
+    room = make_room()
+    for trump in ("♠", "♥", "♦", "♣", None):
+        room.trump = trump
+        for _ in range(200):
+            size = rng.randint(1, 4)
+            drawn = rng.sample(range(DECK_SIZE), size * 2)
+            owner, challenger = drawn[:size], drawn[size:]
+            assert room._max_beat_count(challenger, owner) == _brute_force_beat_count(room, challenger, owner)
+
+
+def test_max_beat_count_without_trump():
+    spade_ace = idx(Card(suit="♠", rank=14))
+    spade_six = idx(Card(suit="♠", rank=6))
+    heart_ace = idx(Card(suit="♥", rank=14))
+    assert max_beat_count([spade_ace], [spade_six], NO_TRUMP) == 1
+    assert max_beat_count([heart_ace], [spade_six], NO_TRUMP) == 0
+
+
+def test_rooms_share_frozen_card_catalog():
+    room_a = make_room()
+    room_b = make_room()
+    room_a._start_new_round(initial=False)
+    room_b._start_new_round(initial=False)
+
+    state_a = room_a.to_state("A")
+    state_b = room_b.to_state("B")
+    assert state_a.cards[0] is state_b.cards[0]
+    assert all(card is CARD_MODELS[idx(card)] for card in state_a.hands)
+
+    with pytest.raises(ValueError):
+        CARD_MODELS[0].rank = 7
+
+
+@pytest.mark.parametrize("visibility", ["open", "faceDown"])
+def test_state_payload_matches_full_state(visibility):
+    room = make_room(two_players=False)
+    room.config = room.config.model_copy(update={"discard_visibility": visibility})
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=14), Card(suit="♥", rank=6))
+    room.hands["B"] = cards_mask(Card(suit="♦", rank=7), Card(suit="♥", rank=7))
+    room.hands["C"] = cards_mask(Card(suit="♠", rank=6), Card(suit="♥", rank=8))
+    room.play_cards("A", [Card(suit="♠", rank=14)])
+    room.play_cards("B", [Card(suit="♦", rank=7)])
+
+    for viewer in ("A", "B", "C", None):
+        expected = room.to_state(viewer).model_dump(by_alias=True)
+        actual = room.state_payload(viewer)
+        expected.pop("tablePlayers")
+        actual.pop("tablePlayers")
+        assert actual == expected
+
+
+def test_state_payload_cached_until_room_changes():
+    room = make_room()
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=14), Card(suit="♠", rank=13))
+    room.hands["B"] = cards_mask(Card(suit="♣", rank=10), Card(suit="♣", rank=9))
+    room.touch()
+
+    version = room.version
+    first = room.state_payload("A")
+    assert room.public_payload() is room.public_payload()
+    assert room.viewer_payload("A") is room.viewer_payload("A")
+    assert room.version == version
+
+    room.play_cards("A", [Card(suit="♠", rank=14)])
+    assert room.version > version
+    second = room.state_payload("A")
+    assert second["hands"] != first["hands"]
+    assert second["trick"]["plays"][0]["player_id"] == "A"
+
+
+def test_wait_for_change_wakes_on_touch():
+    room = make_room()
+
+    async def scenario():
+        since = room.version
+        waiter = asyncio.create_task(room.wait_for_change(since, timeout=5))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        room.touch()
+        return await asyncio.wait_for(waiter, timeout=1)
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_lobby_entry_cached_until_players_or_start_change():
+    room = Room("lobby", "Lobby", VARIANTS["classic_2p"])
+    room.add_player(Player(id="A", name="A"))
+    entry = room.lobby_entry()
+    assert entry["players"] == 1 and entry["started"] is False
+    room.touch()
+    assert room.lobby_entry() is entry
+
+    room.add_player(Player(id="B", name="B"))
+    assert room.lobby_entry()["players"] == 2
+    room.start()
+    assert room.lobby_entry()["started"] is True
+
+
+def test_room_registry_indexes_follow_membership():
+    from game import RoomRegistry
+
+    registry = RoomRegistry()
+    room = Room("idx", "Index", VARIANTS["classic_2p"], TableConfig(max_players=2))
+    registry["idx"] = room
+    room.add_player(Player(id="A", name="Alice"))
+    assert registry.open_rooms("classic_2p") == [room]
+
+    room.add_player(Player(id="B", name="Bob"))
+    assert registry.open_rooms() == []
+    assert room._player_index("B") == 1 and room._player_seat("B") == 1
+
+    # переподключение под новым id с тем же именем
+    room.add_player(Player(id="B2", name="Bob"))
+    assert room._player_index("B2") == 1 and registry.open_rooms() == []
+
+    room.remove_player("B2")
+    assert registry.open_rooms("classic_2p") == [room]
+    registry.pop("idx")
+    assert registry.open_rooms() == []
+
+
+def test_finished_match_reopens_room_in_registry():
+    from game import RoomRegistry
+
+    registry = RoomRegistry()
+    room = Room("done", "Done", VARIANTS["classic_2p"], TableConfig(max_players=3))
+    registry["done"] = room
+    for pid in ("A", "B"):
+        room.add_player(Player(id=pid, name=pid))
+    room.start()
+    room.match_id = None
+    assert registry.open_rooms() == []
+
+    room.scores = {"A": 0, "B": 12}
+    room._finalize_round({}, [])
+    assert room.match_over and room.is_open()
+    assert registry.open_rooms("classic_2p") == [room]
+    assert [r for r in registry.values() if r.is_open()] == registry.open_rooms()
+
+
+def test_snapshot_restores_the_same_state_for_every_viewer():
+    room = Room("snap", "Snap", VARIANTS["with_draw"], TableConfig(max_players=3))
+    for pid in ("a", "b", "c"):
+        room.add_player(Player(id=pid, name=pid))
+    room.start()
+    leader = room.current_player_id()
+    room.play_cards(leader, [room._hand_cards(leader)[0]])
+
+    restored = Room.restore(json.loads(json.dumps(room.snapshot())))
+    assert restored.version == room.version
+    for viewer in (None, "a", "b", "c"):
+        assert restored.state_payload(viewer) == room.state_payload(viewer)
+    assert restored.player("b").name == "b"
+
+
+def test_room_state_matches_models_and_reports_footprint():
+    import footprint
+    from game import CARD_CATALOG_PAYLOAD
+
+    room = footprint.mid_round_room()
+    room.config.discard_visibility = "open"
+    room.touch()
+    leader = room.players[0].id
+    for viewer in (None, leader):
+        expected = room.to_state(viewer).model_dump(by_alias=True, exclude={"table_players"})
+        payload = room.state_payload(viewer)
+        assert {key: value for key, value in payload.items() if key != "tablePlayers"} == expected
+    # Каталог карт один на все комнаты
+    assert room.public_payload()["cards"] is CARD_CATALOG_PAYLOAD["cards"]
+    with pytest.raises(AttributeError):
+        room.scratch = 1  # __slots__
+
+    for build in footprint.SCENARIOS.values():
+        assert footprint.room_footprint(build, count=3) > 0
+
+
+def _accepted(room: Room, player_id: str, cards: tuple[int, ...], early: bool) -> bool:
+    probe = Room.restore(room.snapshot())
+    try:
+        if early:
+            probe.request_early_turn(player_id, list(cards))
+        else:
+            probe.play_cards(player_id, list(cards))
+    except ValueError:
+        return False
+    return True
+
+
+def _assert_moves_match_room(room: Room):
+    for player in room.players:
+        moves = room.legal_moves(player.id)
+        listed = {(kind == "early_turn", mask) for kind, mask, _ in moves}
+        hand = list(iter_mask(room.hands[player.id]))
+        for count in range(1, 5):
+            for cards in itertools.combinations(hand, count):
+                for early in (False, True):
+                    expected = (early, mask_of(cards)) in listed
+                    assert _accepted(room, player.id, cards, early) == expected, (player.id, cards, early)
+        for kind, mask, outcome in moves:
+            if kind == "response":
+                trick = room.current_trick
+                beaten = max_beat_count(list(iter_mask(mask)), trick.owner_cards, trump_index(room.trump))
+                assert outcome == ("beat" if beaten == trick.required_count else "partial" if beaten else "discard")
+
+
+def test_legal_moves_match_what_the_room_accepts(monkeypatch):
+    rng = random.Random(3)
+    # Раздача тоже от rng, чтобы ходы не зависели от порядка тестов
+    monkeypatch.setattr("game.random", rng)
+    room = Room("moves", "Moves", VARIANTS["with_draw"], TableConfig(max_players=3))
+    for pid in ("a", "b", "c"):
+        room.add_player(Player(id=pid, name=pid))
+    room.start()
+    room.match_id = None
+    seen = set()
+    for _ in range(12):
+        while room.reveal_until_ts is not None:
+            room.reveal_until_ts = time.time() - 1
+            room.advance_timers()
+        _assert_moves_match_room(room)
+        player_id = room.current_player_id()
+        kind, mask, outcome = rng.choice(room.legal_moves(player_id))
+        seen.add(outcome)
+        room.play_cards(player_id, list(iter_mask(mask)))
+    assert seen == {"lead", "beat", "partial", "discard"}
+
+    # Заход и досрочный ход четырьмя картами
+    room = make_room()
+    room.hands["A"] = mask_of(card_index("♥", rank) for rank in (6, 7, 8, 9))
+    room.hands["B"] = mask_of([card_index("♠", 10), card_index("♥", 10), card_index("♦", 14), card_index("♣", 10)])
+    room.touch()
+    _assert_moves_match_room(room)
+    assert [kind for kind, _, _ in room.legal_moves("A")].count("throw") == 1
+    assert [kind for kind, _, _ in room.legal_moves("B")] == ["early_turn"]
+
+
+def card_id(suit: str, rank: int) -> str:
+    return CARD_MODELS[card_index(suit, rank)].id
+
+
+def test_moves_payload_cached_per_version():
+    room = make_room()
+    room.hands["A"] = cards_mask(Card(suit="♠", rank=6), Card(suit="♠", rank=7), Card(suit="♥", rank=14))
+    room.hands["B"] = cards_mask(Card(suit="♠", rank=8), Card(suit="♥", rank=6), Card(suit="♦", rank=6))
+    room.touch()
+
+    payload = room.moves_payload("A")
+    assert room.moves_payload("A") is payload
+    assert sorted((move["kind"], tuple(move["cards"])) for move in payload["moves"]) == sorted(
+        [("lead", (card_id("♠", 6),)), ("lead", (card_id("♠", 7),)), ("lead", (card_id("♥", 14),)),
+         ("lead", (card_id("♠", 6), card_id("♠", 7)))]
+    )
+    assert room.moves_payload("B")["moves"] == []
+
+    room.play_cards("A", [Card(suit="♠", rank=7)])
+    replies = room.moves_payload("B")
+    assert replies["version"] == room.version and replies["trick_index"] == 1
+    assert {move["cards"][0]: move["outcome"] for move in replies["moves"]} == {
+        card_id("♠", 8): "beat", card_id("♥", 6): "discard", card_id("♦", 6): "discard",
+    }
@@ -0,0 +1,117 @@
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, Query, Response
+from fastapi.testclient import TestClient
+
+from lobby import LobbyFilter
+from router import LobbyAggregator, Router, create_app
+from sharding import HashRing, ShardConfig, new_room_id, shard_config_from_env
+
+URLS = ("http://shard-0", "http://shard-1", "http://shard-2")
+
+
+def test_hash_ring_is_balanced_and_moves_few_keys():
+    keys = [f"room-{idx}" for idx in range(4000)]
+    four = HashRing(["0", "1", "2", "3"])
+    owners = [four.owner(key) for key in keys]
+    same = HashRing(["0", "1", "2", "3"])
+    assert owners == [same.owner(key) for key in keys]
+    for node in four.nodes:
+        assert 0.15 < owners.count(node) / len(keys) < 0.35
+
+    five = HashRing(["0", "1", "2", "3", "4"])
+    moved = [new for new, owner in zip(map(five.owner, keys), owners) if new != owner]
+    # Переезжают только ключи нового узла (в идеале 1/5)
+    assert len(moved) / len(keys) < 0.3
+    assert set(moved) == {"4"}
+
+
+def test_worker_creates_only_owned_room_ids():
+    config = shard_config_from_env({"BURA_SHARDS": " http://a:1/, http://b:2", "BURA_SHARD_INDEX": "1"})
+    assert config.urls == ("http://a:1", "http://b:2") and config.index == 1
+    assert shard_config_from_env({}) is None
+    ids = [new_room_id(config.owns) for _ in range(20)]
+    assert all(config.shard_of(room_id) == 1 for room_id in ids)
+
+
+def _fake_shard(idx: int, room_count: int) -> FastAPI:
+    app = FastAPI()
+    entries = [{"room_id": f"s{idx}-{seq}", "seq": seq, "variant": {"key": "classic_2p"}} for seq in range(1, room_count + 1)]
+
+    @app.get("/api/rooms")
+    async def rooms(response: Response, cursor: Optional[int] = Query(None), limit: Optional[int] = Query(None)):
+        rest = [entry for entry in entries if cursor is None or entry["seq"] > cursor]
+        if limit is None:
+            return rest
+        if len(rest) > limit:
+            response.headers["X-Next-Cursor"] = str(rest[limit - 1]["seq"])
+        return rest[:limit]
+
+    @app.post("/api/game/join")
+    async def join():
+        return {"shard": idx}
+
+    @app.post("/api/game/start/{room_id}")
+    async def start(room_id: str):
+        return {"shard": idx, "room_id": room_id}
+
+    @app.get("/api/variants")
+    async def variants():
+        return {"shard": idx}
+
+    return app
+
+
+def _router_client() -> TestClient:
+    sizes = (3, 0, 2)
+    transports = [httpx.ASGITransport(app=_fake_shard(idx, size)) for idx, size in enumerate(sizes)]
+    return TestClient(create_app(Router(ShardConfig(URLS), transports=transports)))
+
+
+def test_router_sends_room_requests_to_the_owner():
+    config = ShardConfig(URLS)
+    client = _router_client()
+    for room_id in ("alpha", "beta", "gamma", "delta"):
+        owner = config.shard_of(room_id)
+        assert client.post("/api/game/join", json={"room_id": room_id}).json() == {"shard": owner}
+        assert client.post(f"/api/game/start/{room_id}").json() == {"shard": owner, "room_id": room_id}
+    # Запросы без комнаты расходятся по кругу
+    assert {client.get("/api/variants").json()["shard"] for _ in range(3)} == {0, 1, 2}
+
+
+def test_router_aggregates_room_pages_across_shards():
+    client = _router_client()
+    everything = [entry["room_id"] for entry in client.get("/api/rooms").json()]
+    assert everything == ["s0-1", "s0-2", "s0-3", "s2-1", "s2-2"]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = client.get("/api/rooms", params=params)
+        seen.extend(entry["room_id"] for entry in resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == everything
+
+
+def test_lobby_aggregator_merges_shard_events():
+    lobby = LobbyAggregator(2)
+    entry = lambda room_id, players: {
+        "room_id": room_id,
+        "variant": {"key": "classic_2p"},
+        "players": players,
+        "players_max": 2,
+        "started": False,
+    }
+    assert lobby.apply(0, {"type": "rooms", "payload": [entry("a", 1)]}) == [("a", None, entry("a", 1))]
+    lobby.apply(1, {"type": "rooms", "payload": [entry("b", 1)]})
+    assert [room["room_id"] for room in lobby.rooms()] == ["a", "b"]
+
+    changes = lobby.apply(1, {"type": "room_updated", "payload": entry("b", 2)})
+    assert LobbyFilter(free_seats=True).events(changes) == [{"type": "room_removed", "room_id": "b"}]
+    assert lobby.apply(0, {"type": "room_removed", "room_id": "a"}) == [("a", entry("a", 1), None)]
+    # Шард пропал - его комнаты уходят из лобби
+    assert lobby.apply(1, {"type": "rooms", "payload": []}) == [("b", entry("b", 2), None)]
+    assert lobby.rooms() == []
@@ -0,0 +1,225 @@
+import asyncio
+
+import pytest
+
+from cluster import Cluster
+from game import Room, VARIANTS
+from models import Player, TableConfig
+from store import MemoryStore, RedisStore, RoomStore, encode_command, read_reply, store_from_env
+
+
+class RespStandIn:
+    """Минимальный сервер с протоколом Redis: хеши, множества и pub/sub."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+        self.subscribers = {}
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"redis://127.0.0.1:{port}/0"
+
+    async def stop(self):
+        self.server.close()
+        for writers in self.subscribers.values():
+            for writer in writers:
+                writer.close()
+
+    @staticmethod
+    def _write(writer, reply):
+        if reply is None:
+            writer.write(b"$-1\r\n")
+        elif isinstance(reply, int):
+            writer.write(b":%d\r\n" % reply)
+        elif isinstance(reply, bytes):
+            writer.write(b"$%d\r\n%s\r\n" % (len(reply), reply))
+        elif isinstance(reply, list):
+            writer.write(b"*%d\r\n" % len(reply))
+            for item in reply:
+                RespStandIn._write(writer, item)
+        else:
+            writer.write(b"+%s\r\n" % reply.encode())
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                args = await read_reply(reader)
+                command, *rest = args
+                command = command.upper()
+                if command == b"SUBSCRIBE":
+                    self.subscribers.setdefault(rest[0], []).append(writer)
+                    self._write(writer, [b"subscribe", rest[0], 1])
+                elif command == b"PUBLISH":
+                    receivers = self.subscribers.get(rest[0], [])
+                    for subscriber in receivers:
+                        self._write(subscriber, [b"message", rest[0], rest[1]])
+                    self._write(writer, len(receivers))
+                elif command == b"HSET":
+                    fields = self.hashes.setdefault(rest[0], {})
+                    fields.update(zip(rest[1::2], rest[2::2]))
+                    self._write(writer, len(rest[1:]) // 2)
+                elif command == b"HMGET":
+                    fields = self.hashes.get(rest[0], {})
+                    self._write(writer, [fields.get(name) for name in rest[1:]])
+                elif command == b"DEL":
+                    self._write(writer, int(self.hashes.pop(rest[0], None) is not None))
+                elif command == b"SADD":
+                    self.sets.setdefault(rest[0], set()).update(rest[1:])
+                    self._write(writer, 1)
+                elif command == b"SREM":
+                    self.sets.get(rest[0], set()).difference_update(rest[1:])
+                    self._write(writer, 1)
+                elif command == b"SMEMBERS":
+                    self._write(writer, sorted(self.sets.get(rest[0], set())))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+
+def _room() -> Room:
+    room = Room("shared", "Shared", VARIANTS["classic_2p"], TableConfig(max_players=2))
+    room.add_player(Player(id="A", name="A"))
+    return room
+
+
+def test_store_from_env_defaults_to_memory():
+    assert isinstance(store_from_env({}), MemoryStore)
+    assert isinstance(store_from_env({"BURA_STORE_URL": "redis://localhost:6379/2"}), RedisStore)
+    with pytest.raises(ValueError):
+        store_from_env({"BURA_STORE_URL": "etcd://localhost"})
+    assert encode_command("SET", "k", 1) == b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\n1\r\n"
+
+
+def test_partial_store_fails_at_construction():
+    class NoPubSub(RoomStore):
+        async def save_room(self, room_id, version, snapshot):
+            pass
+
+        async def load_room(self, room_id):
+            return None
+
+        async def delete_room(self, room_id):
+            pass
+
+        async def room_ids(self):
+            return set()
+
+    with pytest.raises(TypeError, match="publish"):
+        NoPubSub()
+
+
+def test_redis_store_round_trip_and_pubsub():
+    async def scenario():
+        server = RespStandIn()
+        store = RedisStore(await server.start(), prefix="t:")
+        received = []
+        await store.subscribe(received.append)
+
+        await store.save_room("r1", 3, {"node": "n1", "room": {"x": 1}})
+        assert await store.load_room("r1") == (3, {"node": "n1", "room": {"x": 1}})
+        assert await store.room_ids() == {"r1"}
+        await store.publish({"type": "ping"})
+        await asyncio.sleep(0.05)
+        assert received == [{"type": "ping"}]
+
+        await store.delete_room("r1")
+        assert await store.load_room("r1") is None and await store.room_ids() == set()
+        await store.close()
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cluster_replicates_rooms_and_forwards_commands():
+    async def scenario():
+        server = RespStandIn()
+        url = await server.start()
+        changed, commands = [], []
+
+        async def on_changed(room_id):
+            changed.append(room_id)
+
+        async def on_event(room_id, message):
+            pass
+
+        async def on_command(room_id, command):
+            commands.append((room_id, command))
+            if command.get("bad"):
+                raise ValueError("Not your turn")
+            return "done"
+
+        owner = Cluster(RedisStore(url), "owner", on_room_changed=on_changed, on_room_event=on_event, on_command=on_command)
+        other = Cluster(RedisStore(url), "other", on_room_changed=on_changed, on_room_event=on_event, on_command=on_command)
+        await owner.start()
+        await other.start()
+
+        room = _room()
+        await owner.room_committed(room, ["A"])
+        await asyncio.sleep(0.05)
+        assert changed == ["shared"]
+        assert other.owner_of("shared") == "owner"
+        assert other.remote_entries() == [room.lobby_entry()]
+        assert "A" in other.disconnected_of("shared")
+
+        replica = await other.replica("shared")
+        assert replica.state_payload("A") == room.state_payload("A")
+        assert await other.replica("shared") is replica  # версия не менялась
+
+        assert await other.forward("shared", {"type": "start"}) == "done"
+        with pytest.raises(ValueError, match="Not your turn"):
+            await other.forward("shared", {"bad": True})
+        assert [command for _, command in commands] == [{"type": "start"}, {"bad": True}]
+
+        await owner.room_removed("shared")
+        await asyncio.sleep(0.05)
+        assert other.owner_of("shared") is None and "shared" not in other.replicas
+        with pytest.raises(LookupError):
+            await other.forward("shared", {"type": "start"})
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_long_poll_on_other_node_wakes_on_owner_commit(monkeypatch):
+    import main
+
+    async def scenario():
+        server = RespStandIn()
+        url = await server.start()
+
+        async def ignore(*args):
+            return None
+
+        owner = Cluster(RedisStore(url), "owner", on_room_changed=ignore, on_room_event=ignore, on_command=ignore)
+        other = Cluster(RedisStore(url), "other", on_room_changed=ignore, on_room_event=ignore, on_command=ignore)
+        await owner.start()
+        await other.start()
+        monkeypatch.setattr(main, "cluster", other)
+
+        room = _room()
+        await owner.room_committed(room, [])
+        await asyncio.sleep(0.05)
+        since = room.version
+
+        async def poll():
+            return await main.game_state("shared", x_user_id="A", if_none_match=None, fmt="full", since=since, wait=5.0)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waiter = asyncio.ensure_future(poll())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        room.add_player(Player(id="B", name="B"))
+        await owner.room_committed(room, [])
+        response = await asyncio.wait_for(waiter, 1.0)
+        assert loop.time() - started < 1.0
+        assert response.status_code == 200
+        assert int(response.headers["x-room-version"]) == room.version > since
+        await server.stop()
+
+    asyncio.run(scenario())
@@ -54,6 +54,31 @@ export async function getState(room_id: string, x_user_id?: string): Promise<any
   return await res.json()
 }
 
+/**
+ * Long-poll состояния: сервер держит запрос, пока версия комнаты не станет
+ * больше `since` (не дольше `waitSec` секунд). При `since = null` отвечает сразу.
+ * `state = null` означает, что за время ожидания ничего не изменилось (304).
+ */
+export async function pollState(
+  room_id: string,
+  x_user_id: string,
+  since: number | null,
+  waitSec: number,
+  signal?: AbortSignal
+): Promise<{ state: any | null; version: number | null }> {
+  const query = since === null ? '' : `?since=${since}&wait=${waitSec}`
+  const res = await fetch(`${API_BASE}/api/game/state/${room_id}${query}`, {
+    headers: { 'x-user-id': x_user_id },
+    cache: 'no-store',
+    signal,
+  })
+  const header = res.headers.get('x-room-version')
+  const version = header !== null ? Number(header) : since
+  if (res.status === 304) return { state: null, version }
+  if (!res.ok) throw new Error('Failed to load game state')
+  return { state: await res.json(), version }
+}
+
 /** Старт игры */
 export async function startGame(room_id: string): Promise<void> {
   const res = await fetch(`${API_BASE}/api/game/start/${room_id}`, { method: 'POST' })
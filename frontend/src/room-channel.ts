@@ -1,9 +1,12 @@
 /**
  * Надёжный канал комнаты:
  * - WebSocket с авто-переподключением, ping/keepalive
- * - гарантированный поллинг на случай сна/блокировки WS (iOS WebView)
+ * - гарантированный long-poll на случай сна/блокировки WS (iOS WebView)
  */
-import { getState } from './api'
+import { getState, pollState } from './api'
+
+/** Сколько сервер держит long-poll запрос состояния, секунд */
+const LONG_POLL_WAIT_SEC = 25
 
 type GameState = Record<string, unknown>
 type Listener = (state: GameState) => void
@@ -37,24 +40,41 @@ export function createRoomChannel(opts: {
   let ws: WebSocket | null = null
   let closed = false
   let reconnectAttempts = 0
-  let pollTimer: ReturnType<typeof setInterval> | null = null
+  let pollController: AbortController | null = null
+  let pollVersion: number | null = null
   let pingTimer: ReturnType<typeof setInterval> | null = null
   let reconnectTimer: ReturnType<typeof setTimeout> | null = null
 
   const url = `${wsBase.replace(/\/$/,'')}/ws/${roomId}?player_id=${encodeURIComponent(playerId)}`
 
   function startPolling() {
-    stopPolling()
-    pollTimer = setInterval(async () => {
+    if (pollController) return
+    const controller = new AbortController()
+    pollController = controller
+    void pollLoop(controller)
+  }
+  async function pollLoop(controller: AbortController) {
+    // Запрос паркуется на сервере до изменения комнаты, поэтому обновления
+    // приходят сразу, а простаивающий клиент почти не нагружает сервер
+    while (!controller.signal.aborted) {
       try {
-        const st = await getState(roomId, playerId)
-        onState(st)
+        const { state, version } = await pollState(roomId, playerId, pollVersion, LONG_POLL_WAIT_SEC, controller.signal)
+        if (controller.signal.aborted) break
+        pollVersion = version
+        if (state) onState(state)
       } catch (err) {
+        if (controller.signal.aborted) break
         console.error('[RoomChannel] Polling failed:', err)
+        await new Promise(resolve => setTimeout(resolve, pollInterval))
       }
-    }, pollInterval)
+    }
+  }
+  function stopPolling() {
+    if (pollController) {
+      pollController.abort()
+      pollController = null
+    }
   }
-  function stopPolling() { if (pollTimer) { clearInterval(pollTimer); pollTimer = null } }
   function stopReconnect() { if (reconnectTimer) { clearTimeout(reconnectTimer); reconnectTimer = null } }
 
   function startPing() {